@@ -0,0 +1,78 @@
+# 多主题分析基准测试: 逐个主题调用 get_literature_analysis 与一次批量查询的对比
+# 用法: python benchmarks/bench_batch_analysis.py [主题数] [每个主题的文献数]
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import crud
+import literature_types
+import models
+import trends
+
+TYPES = ["Review", "Clinical Trial", "Meta-analysis", "Real-world Study", "Phase 3 trial", "Letter", "Guideline"]
+
+
+def build_database(path, topics, per_topic):
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    today = date.today()
+    rng = random.Random(0)
+    with engine.begin() as conn:
+        conn.execute(models.Topic.__table__.insert(), [{"id": i, "name": f"topic {i}", "keywords": []} for i in range(1, topics + 1)])
+        rows = []
+        for topic_id in range(1, topics + 1):
+            for _ in range(per_topic):
+                published = today - timedelta(days=rng.randrange(720))
+                rows.append({
+                    "topic_id": topic_id,
+                    "title": "paper",
+                    "publication_date": datetime.combine(published, datetime.min.time()),
+                    "publication_day": models.to_day_number(published),
+                    "literature_type": rng.choice(TYPES),
+                })
+        conn.execute(models.Literature.__table__.insert(), rows)
+        trends.rebuild_daily_counts(conn)
+        literature_types.backfill(conn)
+    return engine
+
+
+def timed(label, func, runs=3):
+    func()
+    began = time.perf_counter()
+    for _ in range(runs):
+        func()
+    elapsed = (time.perf_counter() - began) / runs * 1000
+    print(f"{label:<28}{elapsed:9.1f} ms")
+    return elapsed
+
+
+def main():
+    topics = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    per_topic = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Building {topics} topics x {per_topic} papers...")
+        engine = build_database(os.path.join(tmp, "bench.db"), topics, per_topic)
+        db = sessionmaker(bind=engine)()
+        topic_ids = list(range(1, topics + 1))
+
+        def per_topic_loop():
+            for topic_id in topic_ids:
+                crud.get_literature_analysis(db, topic_id, limit=0)
+
+        loop = timed("per-topic loop", per_topic_loop)
+        batch = timed("batch (listed ids)", lambda: crud.get_literature_analysis_batch(db, topic_ids))
+        timed("batch (all topics)", lambda: crud.get_literature_analysis_batch(db))
+        print(f"speed-up: {loop / batch:.1f}x")
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
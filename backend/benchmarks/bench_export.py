@@ -0,0 +1,65 @@
+# 文献导出基准测试: 各格式的导出吞吐量 (MB/s) 与内存峰值
+# 内存峰值用 tracemalloc 分别在小主题和大主题上测量，应与文献数量无关
+# 用法: python benchmarks/bench_export.py [文献数量]
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+from sqlalchemy import create_engine
+
+import export
+import models
+
+WORDS = "ibrutinib venetoclax cll btk bcl2 mrd remission relapse cohort trial survival response".split()
+
+
+def build_database(path, sizes):
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(engine)
+    start = datetime(2015, 1, 1)
+    with engine.begin() as conn:
+        for topic_id, size in enumerate(sizes, start=1):
+            for offset in range(0, size, 50000):
+                conn.execute(models.Literature.__table__.insert(), [
+                    {"topic_id": topic_id, "title": " ".join(random.choices(WORDS, k=10)),
+                     "authors": ["Doe J", "Roe R", "Poe P"], "journal_name": "Blood",
+                     "publication_date": start + timedelta(days=random.randrange(3650)),
+                     "keywords": random.sample(WORDS, 4), "summary": " ".join(random.choices(WORDS, k=60)),
+                     "literature_type": "Clinical Trial", "relevance_score": random.random()}
+                    for _ in range(min(50000, size - offset))
+                ])
+    return engine
+
+
+def drain(engine, topic_id, fmt):
+    return sum(len(part) for part in export.stream_export(engine, topic_id, fmt))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    small = 10000
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = build_database(os.path.join(tmp, "bench.db"), [small, count])
+        for fmt in export.STREAMERS:
+            began = time.perf_counter()
+            size = drain(engine, 2, fmt)
+            elapsed = time.perf_counter() - began
+            peaks = []
+            for topic_id in (1, 2):
+                tracemalloc.start()
+                drain(engine, topic_id, fmt)
+                peaks.append(tracemalloc.get_traced_memory()[1] / 1e6)
+                tracemalloc.stop()
+            print(f"{fmt:<8}{size / 1e6:9.1f} MB {size / 1e6 / elapsed:8.1f} MB/s {count / elapsed:10.0f} rows/s   "
+                  f"peak memory {peaks[0]:.1f} MB at {small} rows, {peaks[1]:.1f} MB at {count} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# 关键词路由基准测试: 每个主题逐一做子串匹配与一次扫描的 Aho-Corasick 路由器的对比
+# 旧: 对每篇文献，遍历所有主题的所有关键词，在小写的标题 + 摘要中查找子串 (pubmed_import 原来的做法)
+# 新: keyword_router.KeywordRouter，所有主题的关键词编译为一个自动机，每篇文献按词扫描一次
+# 同时报告自动机的构建时间、修改一个主题 (已知短语 / 新短语) 的代价
+# 用法: python benchmarks/bench_keyword_router.py [主题数] [文献数]
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import keyword_router
+
+SYLLABLES = "ba be bi bo cu da de di fo ga ka ki lo ma me mi na ne no pa pe ri ro sa se ta te ti to va ve xi zo".split()
+COMMON = ("the of and in to with a for was were patients study results treatment group clinical data analysis "
+          "were after from at by on than we this these our between compared significant outcomes").split()
+
+
+def word(rng):
+    return "".join(rng.choices(SYLLABLES, k=rng.randint(2, 4)))
+
+
+def build_corpus(topics, papers):
+    rng = random.Random(0)
+    terms = list({word(rng) for _ in range(300000)})  # ~130k distinct made-up terms
+    topic_terms = terms[:len(terms) // 2]  # papers mostly use terms no topic asks for
+    keywords = {topic_id: [" ".join(rng.choices(topic_terms, k=rng.choice((1, 1, 2, 2, 3)))) for _ in range(rng.randint(3, 6))]
+                for topic_id in range(1, topics + 1)}
+
+    def text(n):
+        return " ".join(rng.choice(terms) if rng.random() < 0.2 else rng.choice(COMMON) for _ in range(n))
+
+    corpus = [{"title": text(14).capitalize(), "summary": text(220) + ".",
+               "keywords": [rng.choice(terms) for _ in range(5)]} for _ in range(papers)]
+    return keywords, corpus
+
+
+def naive(keywords, paper):
+    text = f"{paper['title']} {paper['summary']}".lower()
+    return [topic_id for topic_id, words in keywords.items() if any(keyword in text for keyword in words)]
+
+
+def main():
+    topics = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    papers = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    keywords, corpus = build_corpus(topics, papers)
+    print(f"{topics} topics ({sum(map(len, keywords.values()))} keywords), {papers} papers "
+          f"(~{sum(len(p['summary']) + len(p['title']) for p in corpus) // papers} characters each)")
+
+    sample = corpus[:200]
+    began = time.perf_counter()
+    naive_matches = sum(len(naive(keywords, paper)) for paper in sample)
+    naive_rate = len(sample) / (time.perf_counter() - began)
+    print(f"  substring scan per topic:        {naive_rate:12,.0f} papers/s  ({naive_matches / len(sample):.1f} topics per paper)")
+
+    router = keyword_router.KeywordRouter()
+    began = time.perf_counter()
+    router.sync(keywords)
+    router.route("warm up")
+    print(f"  build automaton:                 {(time.perf_counter() - began) * 1000:12,.0f} ms")
+
+    began = time.perf_counter()
+    assignments = sum(1 for _ in router.route_many(corpus))
+    router_rate = papers / (time.perf_counter() - began)
+    print(f"  keyword router (one pass):       {router_rate:12,.0f} papers/s  ({assignments / papers:.1f} topics per paper)")
+    print(f"  speedup: {router_rate / naive_rate:.0f}x")
+
+    began = time.perf_counter()
+    for topic_id in range(1, 101):
+        router.set_topic(topic_id, keywords[topic_id + 100])
+    print(f"  change a topic (known phrases):  {(time.perf_counter() - began) * 10:12.3f} ms, rebuilds {router.rebuilds}")
+    began = time.perf_counter()
+    router.set_topic(1, keywords[1] + ["entirely new phrase"])
+    router.route("warm up")
+    print(f"  change a topic (new phrase):     {(time.perf_counter() - began) * 1000:12.1f} ms, rebuilds {router.rebuilds}")
+
+
+if __name__ == "__main__":
+    main()
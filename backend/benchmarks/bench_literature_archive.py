@@ -0,0 +1,102 @@
+# 文献冷热分层基准测试: 十年的文献，近一年留在热库，其余移到挂载的归档库
+# 报告归档吞吐量、热库文件大小，以及归档前后常见查询的耗时:
+# 看板第一页 (按日期)、大纲上下文 (近一年)、按相关性排序的一页和全部时间的类型统计 (两个库的 UNION ALL)、归档文献详情
+# 用法: python benchmarks/bench_literature_archive.py [文献数] [主题数]
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import crud
+import literature_archive
+import literature_context
+import migrations
+import models
+
+WORDS = "ibrutinib venetoclax obinutuzumab cll btk bcl2 mrd remission relapse cohort survival response patients".split()
+TYPES = ["Clinical Trial", "Review", "Meta-Analysis", "Cohort study", "Case Report"]
+TODAY = date(2025, 6, 30)
+
+
+def build_database(directory, papers, topics):
+    engine = create_engine(f"sqlite:///{os.path.join(directory, 'medbrief.db')}")
+    literature_archive.attach(engine, os.path.join(directory, "archive.db"))
+    migrations.upgrade(engine)
+    rng = random.Random(0)
+    first = datetime(2015, 7, 1)
+    span = (datetime(2025, 6, 30) - first).days
+    with engine.begin() as conn:
+        conn.execute(models.Topic.__table__.insert(), [{"id": i, "name": f"Topic {i}", "keywords": ["cll"]}
+                                                       for i in range(1, topics + 1)])
+        for start in range(0, papers, 20000):
+            rows = []
+            for _ in range(start, min(start + 20000, papers)):
+                published = first + timedelta(days=rng.randrange(span))
+                literature_type = rng.choice(TYPES)
+                rows.append({"topic_id": rng.randint(1, topics), "title": " ".join(rng.choices(WORDS, k=12)),
+                             "authors": ["Doe J"], "publication_date": published,
+                             "publication_day": models.to_day_number(published), "journal_name": "Blood",
+                             "keywords": rng.sample(WORDS, 6), "summary": " ".join(rng.choices(WORDS, k=180)),
+                             "literature_type": literature_type, "type_code": rng.randrange(6),
+                             "relevance_score": rng.random()})
+            conn.execute(models.Literature.__table__.insert(), rows)
+    return engine
+
+
+def timed(fn, repeat=20):
+    fn()
+    began = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - began) / repeat * 1000
+
+
+def measure(session_factory, archived_id):
+    db = session_factory()
+    try:
+        context_start = TODAY - timedelta(days=365)
+        return {
+            "dashboard page (date)": timed(lambda: crud.get_literature_analysis(db, 1, limit=20)),
+            "outline context (1 year)": timed(lambda: literature_context.pack_topic(db, 1, context_start, TODAY)),
+            "relevance page": timed(lambda: crud.get_literature_analysis(db, 1, limit=20, order_by="relevance")),
+            "archived paper detail": timed(lambda: crud.get_literature(db, archived_id)),
+        }
+    finally:
+        db.close()
+
+
+def main():
+    papers = int(sys.argv[1]) if len(sys.argv) > 1 else 400000
+    topics = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = build_database(tmp, papers, topics)
+        session_factory = sessionmaker(bind=engine)
+        with engine.connect() as connection:
+            archived_id = connection.exec_driver_sql(
+                "SELECT MIN(id) FROM literature WHERE topic_id = 1 AND publication_date < '2020-01-01'").scalar()
+        size = lambda name: os.path.getsize(os.path.join(tmp, name)) / 2 ** 20
+        print(f"{papers} papers over 10 years, {topics} topics; single table {size('medbrief.db'):.0f} MiB")
+        before = measure(session_factory, archived_id)
+
+        began = time.perf_counter()
+        result = literature_archive.archive_literature(
+            engine, literature_archive.ArchiveSettings(hot_days=365, batch_size=5000), today=TODAY)
+        elapsed = time.perf_counter() - began
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.exec_driver_sql("VACUUM main")  # only to report the hot working set; freed pages are reused anyway
+        print(f"archived {result.moved} papers in {result.batches} batches, {result.moved / elapsed:,.0f} papers/s; "
+              f"hot {size('medbrief.db'):.0f} MiB, archive {size('archive.db'):.0f} MiB")
+        after = measure(session_factory, archived_id)
+        for label in before:
+            print(f"  {label:<26} single table {before[label]:7.2f} ms, tiered {after[label]:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
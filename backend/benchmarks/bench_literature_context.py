@@ -0,0 +1,101 @@
+# 大纲 Agent 文献上下文基准测试
+# 1) 打包耗时: 一个主题 N 篇文献 (含重复)，挑选、去重、压缩并装进预算
+# 2) 提示词 token 数与 Agent 延迟: 对比只发主题 (Agent 自行检索)、不同预算的打包上下文、以及不设预算直接附上最相关 50 篇的完整摘要
+# Agent 用 stubs.LocalOutlineAgent 的延迟模型: 固定 1.5 s + 每 1k 提示词 token 0.4 s，
+# 提示词中的文献不足 20 篇时每缺 5 篇一轮 6 s 的检索 (参数按单次检索+阅读的典型耗时选取)
+# 用法: python benchmarks/bench_literature_context.py [文献数]
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import literature_context
+import migrations
+import models
+from stubs import LocalOutlineAgent
+
+WORDS = "ibrutinib venetoclax obinutuzumab cll btk bcl2 mrd remission relapse cohort survival response patients".split()
+TYPES = ["Clinical Trial", "Randomized Controlled Trial", "Review", "Meta-Analysis", "Cohort study", "Case Report"]
+TOPIC = "慢性淋巴细胞白血病最新研究进展"
+END = date(2025, 6, 30)
+DUMP = 50  # papers pasted whole when there is no budget
+
+
+def build_database(path, papers):
+    engine = create_engine(f"sqlite:///{path}")
+    migrations.upgrade(engine)
+    rng = random.Random(0)
+    rows = []
+    for i in range(papers):
+        title = " ".join(rng.choices(WORDS, k=12)).capitalize()
+        summary = " ".join(rng.choices(WORDS, k=60)) + f". Response rate was {rng.randint(40, 95)}% (P<0.05). " \
+                  + " ".join(rng.choices(WORDS, k=120)) + ". Conclusions: " + " ".join(rng.choices(WORDS, k=25)) + "."
+        row = {"topic_id": 1, "title": title, "authors": ["Doe J"], "journal_name": "Blood", "keywords": [],
+               "publication_date": datetime(2022, 1, 1) + timedelta(days=rng.randrange(1277)),
+               "summary": summary, "literature_type": rng.choice(TYPES), "relevance_score": rng.random(),
+               "pmid": str(30000000 + i)}
+        rows.append(row)
+        if rng.random() < 0.1:  # the same paper fetched again, or a near-identical record
+            rows.append(dict(row, relevance_score=row["relevance_score"] * 0.99))
+    with engine.begin() as conn:
+        conn.execute(models.Topic.__table__.insert(), [{"id": 1, "name": "CLL", "keywords": ["cll"]}])
+        conn.execute(models.Literature.__table__.insert(), rows)
+    return engine
+
+
+def call_agent(agent, prompt):
+    request = urllib.request.Request(agent.url, data=json.dumps({"prompt": prompt, "metadata": {}}).encode(),
+                                     headers={"Content-Type": "application/json"})
+    began = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        json.loads(response.read())
+    return time.perf_counter() - began
+
+
+def main():
+    papers = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    start = END - timedelta(days=365)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = build_database(os.path.join(tmp, "bench.db"), papers)
+        db = sessionmaker(bind=engine)()
+        settings = literature_context.ContextSettings()
+        literature_context.pack_topic(db, 1, start, END, settings)
+        began = time.perf_counter()
+        for _ in range(20):
+            context = literature_context.pack_topic(db, 1, start, END, settings)
+        elapsed = (time.perf_counter() - began) / 20 * 1000
+        print(f"{papers} papers: packing {elapsed:.1f} ms ({context.candidates} candidates, "
+              f"{context.duplicates} duplicates, {len(context.literature_ids)} packed, {context.skipped} over budget)")
+
+        literature = models.Literature
+        rows = (db.query(literature.title, literature.summary)
+                .filter(literature.topic_id == 1, literature.publication_date >= datetime(start.year, start.month, start.day))
+                .order_by(literature.relevance_score.desc()).limit(DUMP)
+                .all())
+        prompts = [("topic only", TOPIC)]
+        for budget in (1000, 2000, 4000):
+            packed = literature_context.pack_topic(db, 1, start, END, literature_context.ContextSettings(token_budget=budget))
+            prompts.append((f"packed, {budget} budget", literature_context.outline_prompt(TOPIC, packed)))
+        prompts.append((f"top {DUMP} abstracts, no budget", TOPIC + "\n\n" + "\n".join(
+            f"{n}. {title} | {summary}" for n, (title, summary) in enumerate(rows, 1))))
+        db.close()
+
+    with LocalOutlineAgent(latency=1.5, seconds_per_1k_tokens=0.4, research_latency=6.0) as agent:
+        for label, prompt in prompts:
+            seconds = call_agent(agent, prompt)
+            sent = agent.requests[-1]
+            print(f"  {label:<30} {sent['prompt_tokens']:7d} prompt tokens, {sent['papers']:4d} papers, "
+                  f"{sent['research_rounds']} research rounds, agent {seconds:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
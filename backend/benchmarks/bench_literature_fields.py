@@ -0,0 +1,78 @@
+# 文献列表稀疏字段基准测试: 100 行一页的响应大小、从数据库读出的字节数和耗时
+# 全部字段 (默认) 与只选列表行显示的字段、以及附带截断到 200 字的摘要对比
+# 数据: 每篇文献约 1,800 字的摘要、5-34 位作者、8 个关键词 (与种子数据中最长的记录相当)
+# 用法: python benchmarks/bench_literature_fields.py [文献数]
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import crud
+import migrations
+import models
+import schemas
+
+WORDS = "ibrutinib venetoclax obinutuzumab cll btk bcl2 mrd remission relapse cohort survival response patients".split()
+PAGE = 100
+LIST_FIELDS = ["title", "publication_date", "journal_name", "literature_type", "relevance_score"]
+
+
+def build_database(path, papers):
+    engine = create_engine(f"sqlite:///{path}")
+    migrations.upgrade(engine)
+    rng = random.Random(0)
+    start = datetime(2015, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(models.Topic.__table__.insert(), [{"id": 1, "name": "CLL", "keywords": ["cll"]}])
+        conn.execute(models.Literature.__table__.insert(), [
+            {"topic_id": 1, "title": " ".join(rng.choices(WORDS, k=14)).capitalize(),
+             "authors": [f"Author{rng.randrange(10000)}, {rng.choice('ABCDEFGH')}." for _ in range(rng.randint(5, 34))],
+             "publication_date": start + timedelta(days=rng.randrange(3650)), "journal_name": "Blood",
+             "keywords": rng.sample(WORDS, 8), "summary": " ".join(rng.choices(WORDS, k=200)),
+             "literature_type": "Clinical Trial", "relevance_score": rng.random()}
+            for _ in range(papers)
+        ])
+    return engine
+
+
+def fetched_bytes(items):
+    # What the query handed to Python, measured on the selected values
+    return sum(len(str(value)) for item in items for value in item.model_dump(exclude_unset=True).values())
+
+
+def main():
+    papers = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = build_database(os.path.join(tmp, "bench.db"), papers)
+        db = sessionmaker(bind=engine)()
+        print(f"{papers} papers, {PAGE}-row pages")
+        baseline = None
+        for label, fields, summary_length in [
+            ("all fields (default)", None, None),
+            ("list fields", LIST_FIELDS, None),
+            ("list fields + 200-char summary", LIST_FIELDS + ["summary"], 200),
+        ]:
+            rng = random.Random(1)
+            analysis = crud.get_literature_analysis(db, 1, limit=PAGE, fields=fields, summary_length=summary_length)
+            began = time.perf_counter()
+            for _ in range(50):
+                analysis = crud.get_literature_analysis(db, 1, skip=rng.randrange(papers - PAGE), limit=PAGE,
+                                                        fields=fields, summary_length=summary_length)
+                payload = schemas.LiteratureAnalysis.model_validate(analysis).model_dump_json(exclude_unset=True)
+            elapsed = (time.perf_counter() - began) / 50 * 1000
+            size, read = len(payload), fetched_bytes(analysis.literature)
+            baseline = baseline or (size, read, elapsed)
+            print(f"  {label:<32} payload {size / 1024:7.1f} KiB ({baseline[0] / size:4.1f}x smaller), "
+                  f"rows read {read / 1024:7.1f} KiB ({baseline[1] / read:4.1f}x), {elapsed:6.2f} ms")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
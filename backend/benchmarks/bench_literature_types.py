@@ -0,0 +1,98 @@
+# 文献类型统计基准测试: 按自由文本 ilike 计数与按规范类型代码分组的对比
+# 旧: 总数、两次 literature_type ilike '%...%' 计数、按原始 literature_type 分组，共四次扫描主题的文献
+# 新: 在 (topic_id, type_code) 复合索引上一次分组，统计与分布都由它得出
+# 同时报告回填 (literature_types.backfill) 的速度
+# 用法: python benchmarks/bench_literature_types.py [主题数] [每个主题的文献数]
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+import literature_types
+import models
+
+TYPES = ["Review", "Clinical Trial", "Meta-analysis", "Real-world Study", "Phase 3 trial", "Letter", "Guideline",
+         "Randomized Controlled Trial", "Systematic Review and Meta-Analysis", "Retrospective Study", "Case Report"]
+WORDS = "ibrutinib venetoclax cll btk bcl2 mrd remission relapse cohort survival response".split()
+
+
+def build_database(path, topics, per_topic):
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    rng = random.Random(0)
+    start = datetime(2015, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(models.Topic.__table__.insert(), [{"id": i, "name": f"topic {i}", "keywords": []}
+                                                       for i in range(1, topics + 1)])
+        for topic_id in range(1, topics + 1):
+            conn.execute(models.Literature.__table__.insert(), [
+                {"topic_id": topic_id, "title": " ".join(rng.choices(WORDS, k=8)),
+                 "summary": " ".join(rng.choices(WORDS, k=60)), "literature_type": rng.choice(TYPES),
+                 "publication_date": start + timedelta(days=rng.randrange(3650))}
+                for _ in range(per_topic)
+            ])
+    return engine
+
+
+def old_stats(db, topic_id):
+    literature = models.Literature
+    base_query = db.query(literature).filter(literature.topic_id == topic_id)
+    total = base_query.count()
+    trials = base_query.filter(literature.literature_type.ilike("%clinical trial%")).count()
+    meta = base_query.filter(literature.literature_type.ilike("%meta-analysis%")).count()
+    distribution = (db.query(literature.literature_type, func.count(literature.id))
+                    .filter(literature.topic_id == topic_id).group_by(literature.literature_type).all())
+    return total, trials, meta, len(distribution)
+
+
+def new_stats(db, topic_id):
+    rows = (db.query(models.Literature.type_code, func.count()).filter(models.Literature.topic_id == topic_id)
+            .group_by(models.Literature.type_code).all())
+    counts = dict(rows)
+    return (sum(counts.values()), counts.get(literature_types.CLINICAL_TRIAL, 0),
+            counts.get(literature_types.META_ANALYSIS, 0), len(literature_types.counts_by_label(rows)))
+
+
+def timed(label, func, topics, runs=20):
+    rng = random.Random(1)
+    func(1)
+    began = time.perf_counter()
+    for _ in range(runs):
+        func(rng.randint(1, topics))
+    elapsed = (time.perf_counter() - began) / runs * 1000
+    print(f"  {label:<34}{elapsed:9.2f} ms per topic")
+    return elapsed
+
+
+def main():
+    topics = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    per_topic = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{topics} topics x {per_topic} papers")
+        engine = build_database(os.path.join(tmp, "bench.db"), topics, per_topic)
+
+        began = time.perf_counter()
+        with engine.begin() as conn:
+            literature_types.backfill(conn)
+        print(f"  backfill: {topics * per_topic / (time.perf_counter() - began):,.0f} rows/s")
+        for index in models.Literature.__table__.indexes:
+            index.create(bind=engine, checkfirst=True)
+        with engine.connect() as conn:
+            conn.exec_driver_sql("ANALYZE")
+
+        db = sessionmaker(bind=engine)()
+        before = timed("ilike counts + raw-type group by", lambda t: old_stats(db, t), topics)
+        after = timed("type_code group by (index only)", lambda t: new_stats(db, t), topics)
+        print(f"  speedup: {before / after:.1f}x")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
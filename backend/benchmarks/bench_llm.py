@@ -0,0 +1,68 @@
+# LLM 差异摘要基准测试: 对一个主题的推送历史 (N 份连续的 PPT) 生成相邻两份之间的差异摘要
+# 使用本地 OpenAI 兼容替身 (stubs.LocalOpenAIServer)，每个请求固定延迟，比较:
+# - 串行: 与原 compare_ppts 相同，每对 PPT 一个阻塞请求，无缓存
+# - 并发: llm_client 并发 + 限流，长 PPT 分块摘要后合并 (每份 PPT 的分块摘要在相邻两次对比间复用)
+# - 再次运行: 全部由持久化缓存返回
+# 用法: python benchmarks/bench_llm.py [PPT 数量] [每个请求的延迟秒数]
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+import compare_ppts
+from llm_client import LLMClient, LLMSettings
+from stubs import LocalOpenAIServer
+
+SLIDES = 120
+
+
+def deck_text(version):
+    return "\n".join(f"Slide {i}: cohort {version}-{i} reported a response rate of {(version * i) % 100}% "
+                     f"with a median follow-up of {i} months" for i in range(SLIDES))
+
+
+async def run(server, decks, concurrency, cache_path, chunk_chars):
+    settings = LLMSettings(base_url=server.base_url, api_key="bench", concurrency=concurrency,
+                           requests_per_second=50, cache_path=cache_path)
+    async with LLMClient(settings) as llm:
+        if concurrency == 1:
+            # One blocking request per pair, one pair after the other
+            for i in range(1, len(decks)):
+                await compare_ppts.compare_ppt_content_async(llm, decks[i - 1], decks[i], f"deck_{i - 1}.pptx",
+                                                             f"deck_{i}.pptx", chunk_chars)
+        else:
+            await asyncio.gather(*(
+                compare_ppts.compare_ppt_content_async(llm, decks[i - 1], decks[i], f"deck_{i - 1}.pptx",
+                                                       f"deck_{i}.pptx", chunk_chars)
+                for i in range(1, len(decks))
+            ))
+        return llm.requests_sent
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+    decks = [deck_text(version) for version in range(count)]
+    print(f"{count} decks of {len(decks[0])} characters, {count - 1} comparisons, {latency:.1f} s per request")
+
+    with LocalOpenAIServer(latency=latency) as server, tempfile.TemporaryDirectory() as workdir:
+        cache_path = os.path.join(workdir, "llm_cache.db")
+        runs = [
+            ("serial, whole decks", 1, None, 10 ** 9),
+            ("concurrent, chunked", 8, cache_path, compare_ppts.CHUNK_CHARS),
+            ("concurrent, cached", 8, cache_path, compare_ppts.CHUNK_CHARS),
+        ]
+        for label, concurrency, path, chunk_chars in runs:
+            began = time.perf_counter()
+            requests = asyncio.run(run(server, decks, concurrency, path, chunk_chars))
+            print(f"  {label:22s} {time.perf_counter() - began:7.2f} s, {requests:4d} requests, "
+                  f"max {server.max_active} in flight")
+            server.max_active = 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# PPT 推送基准测试: 一个周期内向数千个接收人推送的吞吐量
+# 使用本地 SMTP 替身与 Webhook 接收端，对比 逐个接收人串行发送 / 连接池 + 批量 + 并发 两种方式
+# 用法: python benchmarks/bench_notifications.py [接收人数量]
+import asyncio
+import os
+import smtplib
+import sys
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+import notifications
+from stubs import LocalSMTPServer, LocalWebhookReceiver
+
+
+def report(label, count, elapsed):
+    print(f"{label:<38}{count / elapsed:9.0f} recipients/s ({elapsed:.2f} s)")
+
+
+def serial_email(settings, job):
+    notifier = notifications.Notifier(settings)
+    message = notifier._email(job)
+    for recipient in job.recipients:
+        with smtplib.SMTP(settings.smtp_host, settings.smtp_port) as connection:
+            connection.send_message(message, to_addrs=[recipient])
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    recipients = [f"user{i}@example.com" for i in range(count)]
+    with LocalSMTPServer() as smtp, LocalWebhookReceiver() as webhook:
+        settings = notifications.NotificationSettings(smtp_host=smtp.host, smtp_port=smtp.port, webhook_url=webhook.url,
+                                                      email_rate=0, webhook_rate=0)
+        email = notifications.PushJob(1, "Benchmark", "deck.pptx", recipients, "email")
+        app_push = notifications.PushJob(2, "Benchmark", "deck.pptx", recipients, "app_push")
+
+        began = time.perf_counter()
+        serial_email(settings, email)
+        report("email, one connection per recipient", count, time.perf_counter() - began)
+
+        async def fan_out(jobs):
+            notifier = notifications.Notifier(settings)
+            try:
+                return await notifier.deliver_all(jobs)
+            finally:
+                await notifier.close()
+
+        began = time.perf_counter()
+        deliveries = asyncio.run(fan_out([email, app_push]))
+        assert {delivery.status for delivery in deliveries.values()} == {"success"}, deliveries
+        report("email + app_push, pooled and batched", count * 2, time.perf_counter() - began)
+
+
+if __name__ == "__main__":
+    main()
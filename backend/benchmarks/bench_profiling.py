@@ -0,0 +1,71 @@
+# 单请求剖析的开销基准测试
+# 1. 关闭时 (默认): 中间件不挂载，请求路径与没有剖析功能时完全相同
+# 2. 开启但请求未要求剖析: 中间件只检查请求头和查询字符串，这里对一个空的 ASGI 应用测量每次调用增加的时间
+# 3. 被剖析的请求: 在临时数据库上对主题文献分析端点测量延迟，以及剖析结果中的样本数和 SQL 语句数
+# 用法: python benchmarks/bench_profiling.py [调用次数]
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+os.chdir(tempfile.mkdtemp())  # main.py opens medbrief.db and serves PPT/ from the working directory
+os.makedirs("PPT")
+
+from fastapi.testclient import TestClient
+
+import main
+import profiling
+from database import engine
+
+
+async def empty_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def per_call(app, calls):
+    scope = {"type": "http", "method": "GET", "path": "/topics/1", "query_string": b"skip=0&limit=10",
+             "headers": [(b"host", b"localhost"), (b"accept", b"application/json"), (b"user-agent", b"bench")]}
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    async def run():
+        began = time.perf_counter()
+        for _ in range(calls):
+            await app(scope, receive, send)
+        return (time.perf_counter() - began) / calls * 1e6
+
+    return asyncio.run(run())
+
+
+def main_():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    settings = profiling.ProfilingSettings(enabled=True, token="bench", directory=os.path.join(os.getcwd(), "profiles"))
+    bare = per_call(empty_app, calls)
+    wrapped = per_call(profiling.ProfilingMiddleware(empty_app, engine, settings), calls)
+    print(f"  empty ASGI app:                       {bare:8.2f} us per call")
+    print(f"  + middleware, profiling not requested: {wrapped:8.2f} us per call (+{wrapped - bare:.2f} us)")
+
+    client = TestClient(profiling.ProfilingMiddleware(main.app, engine, settings))
+    topic_id = client.post("/topics/", json={"name": "Bench", "keywords": ["cll"]}).json()["id"]
+    url = f"/topics/{topic_id}/literature-analysis"
+    for label, headers in [("plain request", {}), ("profiled request", {"X-Profile": "1", "X-Profile-Token": "bench"})]:
+        client.get(url, headers=headers)
+        began = time.perf_counter()
+        for _ in range(50):
+            response = client.get(url, headers=headers)
+        print(f"  {label + ':':<38}{(time.perf_counter() - began) / 50 * 1000:8.2f} ms")
+    report = client.get(f"/profiles/{response.headers['x-profile-id']}", headers={"X-Profile-Token": "bench"}).json()
+    samples = sum(len(profile["samples"]) for profile in report["profiles"] if profile["type"] == "sampled")
+    print(f"  last profile: {samples} stack samples, {len(report['sql'])} SQL statements")
+
+
+if __name__ == "__main__":
+    main_()
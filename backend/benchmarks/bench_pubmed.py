@@ -0,0 +1,78 @@
+# PubMed 抓取基准测试: 从本地 E-utilities 替身 (每个请求固定延迟) 抓取一个主题的文献并写入临时数据库
+# - 串行: 一次一个请求，每次 efetch 20 篇 (逐页抓取的常见写法)
+# - 并发: pubmed.EutilsClient，每次 efetch 200 篇，每个主机 3 个并发请求，边下载边解析，边抓取边批量写入
+# 两种方式都不限流 (替身不计费)，报告每秒入库的文献数
+# 用法: python benchmarks/bench_pubmed.py [文献数] [每个请求的延迟秒数]
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import models
+import pubmed
+import similarity
+from stubs import LocalEutilsServer
+
+WORDS = "ibrutinib venetoclax cll btk bcl2 mrd remission relapse cohort survival response patients".split()
+TYPES = [["Journal Article"], ["Journal Article", "Randomized Controlled Trial"], ["Review"], ["Meta-Analysis"]]
+
+
+def make_articles(count, today):
+    rng = random.Random(0)
+    return [{
+        "pmid": str(30000000 + i),
+        "title": "CLL " + " ".join(rng.choices(WORDS, k=10)),
+        "abstract": " ".join(rng.choices(WORDS, k=200)),
+        "journal": "Blood",
+        "publication_date": today - timedelta(days=rng.randrange(400)),
+        "entrez_date": today - timedelta(days=rng.randrange(300)),
+        "authors": [("Doe", "J"), ("Roe", "RA")],
+        "publication_types": rng.choice(TYPES),
+        "keywords": rng.sample(WORDS, 3),
+    } for i in range(count)]
+
+
+async def run(server, workdir, label, settings):
+    engine = create_engine(f"sqlite:///{os.path.join(workdir, label + '.db')}")
+    models.Base.metadata.create_all(bind=engine)
+    similarity.INDEX_DIRECTORY = os.path.join(workdir, label + "-index")
+    db = sessionmaker(bind=engine)()
+    topic = models.Topic(name="CLL", keywords=["CLL"])
+    db.add(topic)
+    db.commit()
+
+    server.max_active = 0
+    started = time.perf_counter()
+    async with pubmed.EutilsClient(settings) as client:
+        result = await pubmed.fetch_topic(db, topic.id, client)
+        requests = client.requests_sent
+    elapsed = time.perf_counter() - started
+    db.close()
+    print(f"  {label:<12}{elapsed:7.2f} s, {result.inserted / elapsed:8.0f} records/s, {requests:4d} requests, "
+          f"max {server.max_active} in flight")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+    today = date.today()
+    print(f"{count} papers, {latency:.2f} s per request")
+    with LocalEutilsServer(make_articles(count, today), latency=latency) as server, \
+            tempfile.TemporaryDirectory() as workdir:
+        common = dict(base_url=server.base_url, requests_per_second=0, lookback_days=365)
+        asyncio.run(run(server, workdir, "serial", pubmed.EutilsSettings(
+            concurrency=1, batch_size=20, insert_batch_size=20, **common)))
+        asyncio.run(run(server, workdir, "concurrent", pubmed.EutilsSettings(
+            concurrency=3, batch_size=200, insert_batch_size=1000, **common)))
+
+
+if __name__ == "__main__":
+    main()
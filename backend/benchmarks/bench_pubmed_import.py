@@ -0,0 +1,110 @@
+# PubMed 基线导入基准测试: 生成与真实基线文件规模相近的 gzip XML (每个文件 30000 篇，约 100 MB 未压缩)，
+# 用 pubmed_import.import_dumps 导入临时数据库，报告每秒解析的文章数和解析进程的峰值内存；
+# 对照: 用 ElementTree.parse 一次性解析整个文件时的耗时和内存
+# 每个文件由一个进程解析，吞吐量随 CPU 核数线性增加
+# 用法: python benchmarks/bench_pubmed_import.py [文件数] [每个文件的文章数] [进程数]
+import gzip
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import models
+import pubmed
+import pubmed_import
+import similarity
+from stubs import pubmed_article_xml
+
+WORDS = ("patients cohort survival response remission relapse trial randomized therapy outcome risk "
+         "ibrutinib venetoclax leukemia lymphoma marker expression analysis clinical").split()
+
+
+def write_dump(path, first_pmid, count, rng):
+    with gzip.open(path, "wt", encoding="utf-8", compresslevel=6) as out:
+        out.write("<?xml version='1.0'?>\n<PubmedArticleSet>\n")
+        for i in range(count):
+            out.write(pubmed_article_xml({
+                "pmid": str(first_pmid + i), "journal": "Journal of Studies",
+                "publication_date": date(2000 + rng.randrange(25), rng.randrange(1, 13), rng.randrange(1, 29)),
+                # About 3% of the articles mention the benchmark topic, as in a real topic backfill
+                "title": ("okapi " if rng.random() < 0.03 else "") + " ".join(rng.choices(WORDS, k=12)), "abstract": " ".join(rng.choices(WORDS, k=400)),
+                "authors": [("Doe", "J"), ("Roe", "RA"), ("Poe", "E")],
+                "publication_types": rng.choice([["Journal Article"], ["Review"], ["Clinical Trial"]]),
+                "keywords": rng.sample(WORDS, 4),
+            }))
+            out.write("\n")
+        out.write("</PubmedArticleSet>\n")
+
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def parse_whole(path):
+    with gzip.open(path, "rb") as stream:
+        tree = ET.parse(stream)
+    records = [pubmed.parse_article(article) for article in tree.getroot().iter("PubmedArticle")]
+    return len(records), _peak_rss_mb()
+
+
+def parse_streaming(path):
+    with pubmed_import.open_dump(path) as stream:
+        count = sum(1 for _ in pubmed_import.iter_articles(stream))
+    return count, _peak_rss_mb()
+
+
+def in_fresh_process(function, path):
+    # A new process per measurement, so peak memory is not carried over
+    with ProcessPoolExecutor(1) as pool:
+        began = time.perf_counter()
+        count, peak = pool.submit(function, path).result()
+        return count, time.perf_counter() - began, peak
+
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    per_file = int(sys.argv[2]) if len(sys.argv) > 2 else 30000
+    processes = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count()
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as workdir:
+        paths = []
+        for n in range(files):
+            path = os.path.join(workdir, f"pubmed25n{n + 1:04d}.xml.gz")
+            write_dump(path, 10_000_000 + n * per_file, per_file, rng)
+            paths.append(path)
+        print(f"{files} files x {per_file} articles, {os.path.getsize(paths[0]) / 1e6:.1f} MB gzipped each, "
+              f"{processes} processes")
+
+        engine = create_engine(f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+        models.Base.metadata.create_all(bind=engine)
+        similarity.INDEX_DIRECTORY = os.path.join(workdir, "index")
+        session_factory = sessionmaker(bind=engine)
+        db = session_factory()
+        db.add(models.Topic(name="okapi", keywords=["okapi"]))
+        db.commit()
+        db.close()
+
+        began = time.perf_counter()
+        result = pubmed_import.import_dumps(session_factory, paths, processes=processes, report=lambda line: None)
+        elapsed = time.perf_counter() - began
+        peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+        print(f"  import_dumps: {elapsed:.1f} s, {result.articles / elapsed:,.0f} articles/s, "
+              f"{result.inserted:,} papers imported, worker peak {peak:.0f} MB")
+
+        for label, function in [("ElementTree.parse", parse_whole), ("iterparse + clear", parse_streaming)]:
+            count, elapsed, peak = in_fresh_process(function, paths[0])
+            print(f"  one file, {label:<18}{elapsed:7.1f} s, {count / elapsed:8.0f} articles/s, peak {peak:6.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# 相关度打分基准测试: 纯向量化打分吞吐量，以及写入临时 SQLite 库后按批次打分的吞吐量
+# 用法: python benchmarks/bench_relevance.py [文献数]
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+import models
+import relevance
+
+KEYWORDS = ["CLL", "Ibrutinib", "Venetoclax", "BTK inhibitors", "Minimal Residual Disease"]
+VOCABULARY = (
+    "leukemia lymphoma chronic lymphocytic ibrutinib venetoclax acalabrutinib zanubrutinib btk inhibitors "
+    "bcl-2 minimal residual disease mrd survival progression-free outcome cohort trial randomized phase "
+    "patients treatment therapy response resistance mutation tp53 ighv del17p obinutuzumab rituximab "
+    "safety toxicity cardiac infection real-world retrospective analysis meta-analysis review"
+).split()
+
+
+def synthetic_text(rng):
+    title = " ".join(rng.choices(VOCABULARY, k=12))
+    summary = " ".join(rng.choices(VOCABULARY, k=180))
+    return title, summary, rng.sample(VOCABULARY, 5)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rng = random.Random(0)
+    documents = [synthetic_text(rng) for _ in range(count)]
+
+    scorer = relevance.TopicScorer(KEYWORDS)
+    texts = [relevance.document_text(*doc) for doc in documents]
+    began = time.perf_counter()
+    for start in range(0, count, relevance.BATCH_SIZE):
+        scorer.observe_and_score(texts[start:start + relevance.BATCH_SIZE])
+    elapsed = time.perf_counter() - began
+    print(f"scoring only : {count / elapsed * 60:,.0f} papers/min ({elapsed:.1f} s)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        models.Base.metadata.create_all(bind=engine)
+        # The first half is already scored (frozen statistics), the second half is ingested
+        half = count // 2
+        seeded = relevance.TopicScorer(KEYWORDS)
+        for start in range(0, half, relevance.BATCH_SIZE):
+            seeded.observe(texts[start:min(start + relevance.BATCH_SIZE, half)])
+        seeded.freeze()
+        with engine.begin() as conn:
+            conn.execute(models.Topic.__table__.insert(), [{"id": 1, "name": "bench", "keywords": KEYWORDS,
+                                                            "relevance_stats": seeded.stats(), "literature_count": count}])
+            conn.execute(models.Literature.__table__.insert(), [
+                {"topic_id": 1, "title": title, "summary": summary, "keywords": keywords,
+                 "publication_date": datetime(2025, 1, 1)}
+                for title, summary, keywords in documents
+            ])
+        with engine.begin() as conn:
+            began = time.perf_counter()
+            relevance.score_literature(conn, 1, list(range(half + 1, count + 1)))
+            elapsed = time.perf_counter() - began
+        print(f"ingestion path: {(count - half) / elapsed * 60:,.0f} papers/min ({elapsed:.1f} s, read + score + update)")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
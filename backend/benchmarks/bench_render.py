@@ -0,0 +1,59 @@
+# PPT 渲染基准测试: 每分钟渲染的 PPT 数量
+# 对比 每次从磁盘加载模板 / 内存缓存模板 / 进程池 三种方式
+# 用法: python benchmarks/bench_render.py [PPT 数量]
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+import ppt_renderer
+
+# 用仓库中的示例 PPT 作为模板，体积接近真实模板
+SAMPLE_DECK = os.path.join(BACKEND, "PPT", "慢性淋巴细胞白血病最新研究进展_1-3月.pptx")
+
+
+def sample_markdown(slides=12):
+    parts = ["# 慢性淋巴细胞白血病最新研究进展\n2025 年第二季度"]
+    for i in range(1, slides):
+        bullets = "\n".join(f"- 要点 {j}：BTK 抑制剂与 BCL-2 抑制剂联合治疗的最新数据\n  - 细节 {j}" for j in range(5))
+        parts.append(f"## 第 {i} 部分\n{bullets}")
+    return "\n\n---\n\n".join(parts)
+
+
+def report(label, count, elapsed):
+    print(f"{label:<34}{count / elapsed * 60:8.0f} decks/min ({elapsed:.2f} s)")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    markdown = sample_markdown()
+    with tempfile.TemporaryDirectory() as tmp:
+        template_dir = os.path.join(tmp, "templates")
+        os.makedirs(template_dir)
+        shutil.copy(SAMPLE_DECK, os.path.join(template_dir, "bench.pptx"))
+        ppt_renderer.TEMPLATE_DIRECTORY = template_dir
+        slides = ppt_renderer.parse_slides(markdown)
+
+        began = time.perf_counter()
+        for i in range(count):
+            ppt_renderer._templates.clear()  # force a reload from disk
+            ppt_renderer.build_presentation(slides, "bench").save(os.path.join(tmp, f"reload_{i}.pptx"))
+        report("template reloaded per deck", count, time.perf_counter() - began)
+
+        began = time.perf_counter()
+        for i in range(count):
+            ppt_renderer.build_presentation(slides, "bench").save(os.path.join(tmp, f"cached_{i}.pptx"))
+        report("cached template, one process", count, time.perf_counter() - began)
+
+        jobs = [ppt_renderer.RenderJob(markdown, os.path.join(tmp, f"pool_{i}.pptx"), "bench") for i in range(count)]
+        began = time.perf_counter()
+        ppt_renderer.render_decks(jobs)
+        report(f"process pool ({os.cpu_count()} workers)", count, time.perf_counter() - began)
+
+
+if __name__ == "__main__":
+    main()
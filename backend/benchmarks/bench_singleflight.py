@@ -0,0 +1,65 @@
+# 相同请求合并基准测试: 报告发出后许多收件人同时打开同一个主题看板
+# N 个线程 (相当于线程池中的 N 个同步请求) 同时请求同一个主题的文献分析，
+# 对比每个请求各自查询与经 singleflight 合并的总耗时、单个请求的最长等待和实际执行的查询次数
+# 用法: python benchmarks/bench_singleflight.py [并发请求数] [文献数]
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+import crud
+import singleflight
+from bench_batch_analysis import build_database
+
+
+def burst(session_factory, requests, coalesce):
+    flights = singleflight.Group("bench")
+    start = threading.Barrier(requests)
+    latencies = []
+
+    def request():
+        db = session_factory()
+        try:
+            start.wait()
+            began = time.perf_counter()
+            compute = lambda: crud.get_literature_analysis(db, topic_id=1, limit=100)
+            flights.do((1, 0, 100), compute) if coalesce else compute()
+            latencies.append(time.perf_counter() - began)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=request) for _ in range(requests)]
+    began = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - began, max(latencies), flights.stats()
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    papers = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = build_database(os.path.join(tmp, "bench.db"), 1, papers)
+        statements = []
+        event.listen(engine, "before_cursor_execute", lambda *args: statements.append(1))
+        session_factory = sessionmaker(bind=engine)
+        print(f"{requests} concurrent requests for one topic's analysis ({papers} papers)")
+        burst(session_factory, 2, False)
+        for label, coalesce in [("independent", False), ("coalesced", True)]:
+            statements.clear()
+            total, slowest, stats = burst(session_factory, requests, coalesce)
+            print(f"  {label:<12} {total * 1000:8.0f} ms total, slowest request {slowest * 1000:8.0f} ms, "
+                  f"{len(statements):4d} SQL statements"
+                  + (f", {stats.executions} computed / {stats.coalesced} coalesced" if coalesce else ""))
+
+
+if __name__ == "__main__":
+    main()
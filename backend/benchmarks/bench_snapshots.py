@@ -0,0 +1,86 @@
+# 分析快照基准测试: 一个大主题上冻结一次快照的耗时与大小，以及读取/对比历史状态的耗时
+# 对照: 在实时数据上重新计算同样的统计、分布和趋势 (crud.get_literature_analysis 的查询部分)
+# 用法: python benchmarks/bench_snapshots.py [文献数]
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import crud
+import literature_types
+import models
+import snapshots
+import trends
+
+TYPES = ["Review", "Clinical Trial", "Meta-analysis", "Real-world Study", "Phase 3 trial", "Letter", "Guideline"]
+
+
+def build_database(path, papers):
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    rng = random.Random(0)
+    start = datetime(2015, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(models.Topic.__table__.insert(), [{"id": 1, "name": "topic", "keywords": []}])
+        published = [start + timedelta(days=rng.randrange(3650)) for _ in range(papers)]
+        conn.execute(models.Literature.__table__.insert(), [
+            {"topic_id": 1, "title": f"paper {i}", "literature_type": rng.choice(TYPES),
+             "publication_date": day, "publication_day": models.to_day_number(day)}
+            for i, day in enumerate(published)
+        ])
+        trends.rebuild_daily_counts(conn)
+        literature_types.backfill(conn)
+    return engine
+
+
+def timed(label, func, runs=20):
+    func()
+    began = time.perf_counter()
+    for _ in range(runs):
+        result = func()
+    print(f"  {label:<36}{(time.perf_counter() - began) / runs * 1000:9.2f} ms")
+    return result
+
+
+def main():
+    papers = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    window = {"granularity": "month", "start_date": date(2015, 1, 1), "end_date": date(2024, 12, 31)}
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"one topic, {papers} papers")
+        engine = build_database(os.path.join(tmp, "bench.db"), papers)
+        db = sessionmaker(bind=engine)()
+
+        ids = []
+        for cutoff in (papers // 2, papers):
+            record = models.UpdateRecord(topic_id=1, timestamp=datetime.utcnow(), status="success",
+                                         to_literature_id=cutoff)
+            db.add(record)
+            db.flush()
+            began = time.perf_counter()
+            snapshot = snapshots.capture(db, record)
+            db.commit()
+            ids.append(snapshot.id)
+            print(f"  capture at {cutoff:>7} papers: {(time.perf_counter() - began) * 1000:7.1f} ms, "
+                  f"{len(snapshot.analysis) + len(snapshot.literature_ids):,} bytes "
+                  f"({len(snapshot.analysis):,} analysis, {len(snapshot.literature_ids):,} ids)")
+
+        def live():
+            crud.get_literature_analysis(db, 1, limit=0)
+            crud.get_literature_trend(db, 1, **window)
+
+        timed("live stats + trend (recomputed)", live)
+        timed("snapshot view", lambda: crud.get_snapshot_analysis(db, 1, ids[1], **window))
+        diff = timed("snapshot diff", lambda: crud.diff_snapshots(db, 1, ids[0], ids[1], **window))
+        print(f"  diff: {len(diff.added_literature_ids)} papers added")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# 主题删除基准测试: 删除大主题期间，并发写入者每次提交需要等待多久
+# 一个写线程不断向另一个主题逐条插入文献 (每条一个事务)，同时删除大主题:
+# 对比一次性在单个事务中删除全部行，与 topic_deletion.purge_topic 的分批删除，报告删除方每个事务持有写锁的时间、
+# 写入者的提交延迟 p50 / p99 / 最大值，以及删除耗时和回收的数据库文件大小。
+# 注意写入者的延迟包含 SQLite busy handler 的退避等待 (1, 2, 5, 10, 15, 20, 25 ... ms)，会高于删除方的持锁时间
+# 用法: python benchmarks/bench_topic_deletion.py [大主题文献数量]
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+import numpy as np
+from sqlalchemy import create_engine, event
+
+import migrations
+import models
+import similarity
+import topic_deletion
+import trends
+
+WORDS = "ibrutinib venetoclax cll btk bcl2 mrd remission relapse cohort trial survival response".split()
+
+
+def build_database(path, size):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False, "timeout": 60})
+    migrations.upgrade(engine)
+    start = datetime(2015, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(models.Topic.__table__.insert(), [
+            {"id": 1, "name": "Large", "keywords": ["cll"]}, {"id": 2, "name": "Busy", "keywords": ["cll"]},
+        ])
+        for offset in range(0, size, 50000):
+            conn.execute(models.Literature.__table__.insert(), [
+                {"topic_id": 1, "title": " ".join(random.choices(WORDS, k=10)), "authors": ["Doe J"],
+                 "publication_date": start + timedelta(days=random.randrange(3650)),
+                 "publication_day": None, "keywords": random.sample(WORDS, 4),
+                 "summary": " ".join(random.choices(WORDS, k=60)), "literature_type": "Review"}
+                for _ in range(min(50000, size - offset))
+            ])
+        conn.exec_driver_sql(
+            "UPDATE literature SET publication_day = CAST(julianday(date(publication_date)) - 2440587.5 AS INTEGER)")
+        trends.rebuild_daily_counts(conn)
+    return engine
+
+
+def mark_deleted(engine):
+    with engine.begin() as conn:
+        conn.execute(models.Topic.__table__.update().where(models.Topic.id == 1).values(deleted_at=datetime.utcnow()))
+
+
+def delete_at_once(engine, topic_id):
+    with engine.begin() as conn:
+        for table in (models.Literature, models.LiteratureDailyCount, models.UpdateRecord, models.ReportSection):
+            conn.execute(table.__table__.delete().where(table.__table__.c.topic_id == topic_id))
+        conn.execute(models.Topic.__table__.delete().where(models.Topic.id == topic_id))
+
+
+def run(path, size, delete):
+    engine = build_database(path, size)
+    with engine.connect() as conn:
+        similarity.get_index().refresh(conn)
+    mark_deleted(engine)
+    before = os.path.getsize(path)
+
+    latencies, stop = [], threading.Event()
+    holds, began_at, deleter = [], {}, threading.get_ident()
+
+    @event.listens_for(engine, "begin")
+    def _begin(connection):
+        began_at[threading.get_ident()] = time.perf_counter()
+
+    @event.listens_for(engine, "commit")
+    def _commit(connection):
+        if threading.get_ident() == deleter:
+            holds.append(time.perf_counter() - began_at[deleter])
+
+    def writer():
+        while not stop.is_set():
+            began = time.perf_counter()
+            with engine.begin() as conn:
+                conn.execute(models.Literature.__table__.insert(), {"topic_id": 2, "title": "new paper"})
+            latencies.append(time.perf_counter() - began)
+            time.sleep(0.001)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    time.sleep(0.2)
+    began = time.perf_counter()
+    delete(engine, 1)
+    elapsed = time.perf_counter() - began
+    stop.set()
+    thread.join()
+    engine.dispose()
+
+    ms, hold = np.array(latencies) * 1000, np.array(holds) * 1000
+    print(f"  {delete.__name__:15s} {elapsed:6.1f} s; {len(hold)} delete transactions, p50 {np.percentile(hold, 50):5.1f} ms, "
+          f"p99 {np.percentile(hold, 99):5.1f} ms, longest {hold.max():6.1f} ms; "
+          f"writer latency p50 {np.percentile(ms, 50):6.2f} ms, "
+          f"p99 {np.percentile(ms, 99):7.2f} ms, max {ms.max():8.1f} ms ({len(ms)} commits); "
+          f"file {before / 1e6:.0f} -> {os.path.getsize(path) / 1e6:.0f} MB")
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    print(f"deleting a topic with {size} papers while another thread commits one paper at a time")
+    for delete in (delete_at_once, topic_deletion.purge_topic):
+        with tempfile.TemporaryDirectory() as workdir:
+            similarity.INDEX_DIRECTORY = os.path.join(workdir, "index")
+            run(os.path.join(workdir, "medbrief.db"), size, delete)
+
+
+if __name__ == "__main__":
+    main()
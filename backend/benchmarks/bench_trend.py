@@ -0,0 +1,65 @@
+# 趋势查询基准测试: 在临时 SQLite 库中写入大量文献，测试各粒度、多年窗口下的查询耗时
+# 用法: python benchmarks/bench_trend.py [行数]
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import crud
+import models
+import trends
+
+
+def build_database(path, rows, years=5):
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    end = date(2025, 6, 30)
+    span = years * 365
+    with engine.begin() as conn:
+        conn.execute(models.Topic.__table__.insert(), [{"name": "bench", "keywords": []}])
+        batch = []
+        for i in range(rows):
+            published = end - timedelta(days=random.randrange(span))
+            batch.append({
+                "topic_id": 1,
+                "title": f"paper {i}",
+                "publication_date": datetime.combine(published, datetime.min.time()),
+                "publication_day": models.to_day_number(published),
+                "literature_type": "Review",
+            })
+            if len(batch) == 50_000:
+                conn.execute(models.Literature.__table__.insert(), batch)
+                batch = []
+        if batch:
+            conn.execute(models.Literature.__table__.insert(), batch)
+        # Core inserts skip the ORM events that maintain the rollup
+        trends.rebuild_daily_counts(conn)
+    return engine, end - timedelta(days=span), end
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Building {rows} rows...")
+        engine, start, end = build_database(os.path.join(tmp, "bench.db"), rows)
+        db = sessionmaker(bind=engine)()
+        for granularity in trends.GRANULARITIES:
+            crud.get_literature_trend(db, 1, granularity, start, end)  # warm the page cache
+            runs = 5
+            began = time.perf_counter()
+            for _ in range(runs):
+                points = crud.get_literature_trend(db, 1, granularity, start, end)
+            elapsed = (time.perf_counter() - began) / runs * 1000
+            print(f"{granularity:>8}: {len(points):5d} buckets in {elapsed:7.1f} ms")
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# 多 worker 扩展性基准测试: 1/2/4/8 个 uvicorn worker 下的每秒请求数
+# 在临时目录中生成数据库并启动 uvicorn --workers N，多个客户端进程并发请求主题列表、主题详情与发表趋势；
+# 每轮结束时通过某个 worker 修改主题名称，再检查随后落到各个 worker 的请求是否都读到了新名称 (缓存失效总线)
+# 用法: python benchmarks/bench_workers.py [每轮秒数] [客户端进程数]
+import asyncio
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+import httpx
+from sqlalchemy import create_engine
+
+import migrations
+import models
+import trends
+
+TOPICS = 50
+PAPERS_PER_TOPIC = 2000
+CONNECTIONS_PER_CLIENT = 16
+
+
+def build_database(path):
+    engine = create_engine(f"sqlite:///{path}")
+    migrations.upgrade(engine)
+    start = date(2020, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(models.Topic.__table__.insert(), [
+            {"id": i, "name": f"Topic {i}", "keywords": ["cll"], "notification_channels": ["email"], "template": "default"}
+            for i in range(1, TOPICS + 1)
+        ])
+        for topic_id in range(1, TOPICS + 1):
+            days = [random.randrange(2000) for _ in range(PAPERS_PER_TOPIC)]
+            conn.execute(models.Literature.__table__.insert(), [
+                {"topic_id": topic_id, "title": f"Paper {topic_id}-{i}", "publication_day": day,
+                 "publication_date": start + timedelta(days=day), "literature_type": "Review"}
+                for i, day in enumerate(days)
+            ])
+        trends.rebuild_daily_counts(conn)
+    engine.dispose()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workdir, port, workers):
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", BACKEND, "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=workdir,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/topics/1").status_code == 200:
+                return process
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("server did not start")
+
+
+def random_path():
+    topic_id = random.randint(1, TOPICS)
+    return random.choice(["/topics/", f"/topics/{topic_id}", f"/topics/{topic_id}/trend?granularity=month"])
+
+
+async def _client(base_url, seconds):
+    done = 0
+    deadline = time.perf_counter() + seconds
+
+    async def connection():
+        nonlocal done
+        # A fresh connection per worker slot; the kernel spreads connections over the worker processes
+        async with httpx.AsyncClient(base_url=base_url, limits=httpx.Limits(max_connections=1)) as client:
+            while time.perf_counter() < deadline:
+                response = await client.get(random_path())
+                response.raise_for_status()
+                done += 1
+
+    await asyncio.gather(*(connection() for _ in range(CONNECTIONS_PER_CLIENT)))
+    return done
+
+
+def run_client(args):
+    return asyncio.run(_client(*args))
+
+
+def stale_reads_after_write(base_url, samples=200):
+    name = f"Renamed {time.time()}"
+    httpx.put(f"{base_url}/topics/1", json={"name": name, "keywords": ["cll"]}).raise_for_status()
+    stale = 0
+    for _ in range(samples):
+        # New connection each time, so requests land on different workers
+        if httpx.get(f"{base_url}/topics/1", headers={"Connection": "close"}).json()["name"] != name:
+            stale += 1
+    return stale
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else max(2, os.cpu_count() or 1)
+    print(f"{os.cpu_count()} CPUs, {clients} client processes x {CONNECTIONS_PER_CLIENT} connections, {seconds:.0f} s per run")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.makedirs(os.path.join(workdir, "PPT"))
+        build_database(os.path.join(workdir, "medbrief.db"))
+
+        for workers in (1, 2, 4, 8):
+            port = free_port()
+            base_url = f"http://127.0.0.1:{port}"
+            server = start_server(workdir, port, workers)
+            try:
+                with multiprocessing.Pool(clients) as pool:
+                    began = time.perf_counter()
+                    total = sum(pool.map(run_client, [(base_url, seconds)] * clients))
+                    elapsed = time.perf_counter() - began
+                stale = stale_reads_after_write(base_url)
+                print(f"{workers} workers: {total / elapsed:8.0f} req/s, stale reads after a write: {stale}/200")
+            finally:
+                server.terminate()
+                server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# 跨进程的缓存失效总线，不依赖任何外部服务
+# - 触发器在 topics / literature / ppt_push_records 的每次写入后递增 cache_generations 中对应表的计数，
+#   因此任何进程 (其他 uvicorn worker、导入脚本、批量 Core 语句) 的写入都会被记录
+# - 每个 worker 持有一条专用的 SQLite 连接，用 PRAGMA data_version 判断数据库是否被其他连接提交过;
+#   这是一次内存读取 (微秒级)，只有它变化时才读取计数表
+# - 进程内缓存在使用前调用 generation(表名)，与构建缓存时记录的值不同就重新验证，
+#   所以一次写入提交后，所有 worker 接下来的请求都会看到它
+import os
+import sqlite3
+import threading
+from typing import Dict, Optional
+
+from sqlalchemy import text
+
+import database
+
+TABLES = ("topics", "literature", "ppt_push_records")
+
+
+def install(connection):
+    """Create the counter rows and triggers (SQLite only, idempotent)."""
+    if connection.dialect.name != "sqlite":
+        return
+    for table in TABLES:
+        connection.execute(text("INSERT OR IGNORE INTO cache_generations (name, generation) VALUES (:name, 0)"),
+                           {"name": table})
+        for operation in ("INSERT", "UPDATE", "DELETE"):
+            connection.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS cache_bump_{table}_{operation.lower()} AFTER {operation} ON {table} "
+                f"BEGIN UPDATE cache_generations SET generation = generation + 1 WHERE name = '{table}'; END"
+            ))
+
+
+class InvalidationBus:
+    def __init__(self, path: str):
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._data_version: Optional[int] = None
+        self._generations: Dict[str, int] = {}
+
+    def poll(self) -> Dict[str, int]:
+        with self._lock:
+            data_version = self._connection.execute("PRAGMA data_version").fetchone()[0]
+            if data_version != self._data_version:
+                # Read the counters after data_version: a commit in between is seen now or at the next poll
+                self._data_version = data_version
+                self._generations = dict(self._connection.execute("SELECT name, generation FROM cache_generations"))
+            return self._generations
+
+    def close(self):
+        self._connection.close()
+
+
+_bus: Optional[InvalidationBus] = None
+_bus_pid: Optional[int] = None
+_bus_lock = threading.Lock()
+
+
+def _database_path() -> Optional[str]:
+    url = database.engine.url
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return None
+    return url.database
+
+
+def get_bus() -> Optional[InvalidationBus]:
+    """The bus of this process (a forked worker opens its own connection), or None if unavailable."""
+    global _bus, _bus_pid
+    if _bus is not None and _bus_pid == os.getpid():
+        return _bus
+    with _bus_lock:
+        if _bus is None or _bus_pid != os.getpid():
+            path = _database_path()
+            if path is None:
+                return None
+            _bus, _bus_pid = InvalidationBus(path), os.getpid()
+        return _bus
+
+
+def generation(table: str) -> Optional[int]:
+    """
+    Current write counter of a table. None means no bus (other databases, or the triggers are not installed),
+    in which case callers fall back to their own revalidation.
+    """
+    bus = get_bus()
+    if bus is None:
+        return None
+    try:
+        return bus.poll().get(table)
+    except sqlite3.Error:
+        return None
@@ -1,66 +1,214 @@
+import asyncio
+import hashlib
+import logging
 import os
+import sys
+from typing import List, Optional, Sequence, Tuple, Union
+
 import dotenv
 from pptx import Presentation
-from openai import OpenAI
+
+import models
+import singleflight
+from llm_client import LLMClient, LLMSettings
 dotenv.load_dotenv()
 
+logger = logging.getLogger(__name__)
 
 # --- Configuration ---
-# Make sure to set your OpenAI API key as an environment variable
-client = OpenAI()
+# Make sure to set your OpenAI API key as an environment variable (OPENAI_BASE_URL for other compatible services)
 PPT_DIRECTORY = "PPT"
 PPT_FILE_1 = "慢性淋巴细胞白血病最新研究进展_1-3月.pptx"
 PPT_FILE_2 = "慢性淋巴细胞白血病最新研究进展_4-6月.pptx"
+# Decks longer than this (both texts together, in characters) are summarized chunk by chunk first
+CHUNK_CHARS = 12000
+SYSTEM_PROMPT = "You are a helpful assistant that summarizes differences in documents."
 # --- End Configuration ---
 
+def _deck_text(ppt_path):
+    prs = Presentation(ppt_path)
+    text_runs = []
+    for slide in prs.slides:
+        for shape in slide.shapes:
+            if not shape.has_text_frame:
+                continue
+            for paragraph in shape.text_frame.paragraphs:
+                for run in paragraph.runs:
+                    text_runs.append(run.text)
+    return "\n".join(text_runs)
+
 def extract_text_from_ppt(ppt_path):
     """Extracts all text from a PowerPoint file."""
     try:
-        prs = Presentation(ppt_path)
-        text_runs = []
-        for slide in prs.slides:
-            for shape in slide.shapes:
-                if not shape.has_text_frame:
-                    continue
-                for paragraph in shape.text_frame.paragraphs:
-                    for run in paragraph.runs:
-                        text_runs.append(run.text)
-        return "\n".join(text_runs)
+        return _deck_text(ppt_path)
     except Exception as e:
         return f"Error reading {os.path.basename(ppt_path)}: {e}"
 
+def split_text(text: str, max_chars: int) -> List[str]:
+    """Chunks of at most max_chars, cut at line breaks where possible."""
+    chunks, current, size = [], [], 0
+    for line in text.splitlines():
+        while len(line) > max_chars:
+            chunks.append(line[:max_chars])
+            line = line[max_chars:]
+        if size + len(line) > max_chars and current:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+def _messages(prompt: str):
+    return [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": prompt}]
+
+def _compare_prompt(text1, text2, filename1, filename2):
+    return f"""
+    以下是两个 PowerPoint 演示文稿的文本内容。
+    请仔细阅读并对比它们的内容，提炼并总结它们的主要差异，要求用中文输出。
+
+    文件: {filename1}
+    ---
+    {text1}
+    ---
+
+    文件: {filename2}
+    ---
+    {text2}
+    ---
+
+    请用简洁且结构化的方式，按主题或要点列出它们的关键差异。
+    """
+
+def _summary_prompt(chunk, filename, part, parts):
+    return f"""
+    以下是 PowerPoint 演示文稿 {filename} 的第 {part}/{parts} 部分文本。
+    请用中文按要点提炼这部分涉及的研究主题、关键结论和数据，保留药物、试验和数字等具体信息。
+    ---
+    {chunk}
+    ---
+    """
+
+async def summarize_deck(llm: LLMClient, text: str, filename: str, chunk_chars: int) -> str:
+    """Map step: the key points of each chunk, summarized in parallel and joined in order."""
+    chunks = split_text(text, chunk_chars)
+    if len(chunks) == 1:
+        return text
+    summaries = await asyncio.gather(*(
+        llm.complete(_messages(_summary_prompt(chunk, filename, part, len(chunks))))
+        for part, chunk in enumerate(chunks, start=1)
+    ))
+    return "\n".join(summaries)
+
+async def compare_ppt_content_async(llm: LLMClient, text1, text2, filename1, filename2,
+                                    chunk_chars: Optional[int] = None) -> str:
+    """
+    Compares the text content of two PPTs. Large decks are first reduced to per-chunk key points
+    (map), which are then compared in one request (reduce). Chunk summaries are cached, so a deck
+    that appears in several comparisons is only summarized once.
+    """
+    chunk_chars = chunk_chars or CHUNK_CHARS
+
+    async def compare():
+        reduced1, reduced2 = text1, text2
+        if len(text1) + len(text2) > chunk_chars:
+            reduced1, reduced2 = await asyncio.gather(summarize_deck(llm, text1, filename1, chunk_chars // 2),
+                                                      summarize_deck(llm, text2, filename2, chunk_chars // 2))
+        return await llm.complete(_messages(_compare_prompt(reduced1, reduced2, filename1, filename2)))
+
+    # The same comparison requested again while it runs shares the running one
+    key = (filename1, filename2, hashlib.sha256(text1.encode()).hexdigest(),
+           hashlib.sha256(text2.encode()).hexdigest(), chunk_chars)
+    return await singleflight.group("deck-compare").do_async(key, compare)
+
 def compare_ppt_content(text1, text2, filename1, filename2):
     """Compares the text content of two PPTs using OpenAI's API."""
-    prompt = f"""
-    以下是两个 PowerPoint 演示文稿的文本内容。  
-    请仔细阅读并对比它们的内容，提炼并总结它们的主要差异，要求用中文输出。  
-    
-    文件: {filename1}  
-    ---  
-    {text1}  
-    ---  
-    
-    文件: {filename2}  
-    ---  
-    {text2}  
-    ---  
-    
-    请用简洁且结构化的方式，按主题或要点列出它们的关键差异。
+    async def run():
+        async with LLMClient() as llm:
+            return await compare_ppt_content_async(llm, text1, text2, filename1, filename2)
+    return asyncio.run(run())
+
+async def compare_deck_pairs(llm: LLMClient, pairs: Sequence[Tuple[str, str]],
+                             chunk_chars: Optional[int] = None) -> List[Union[str, BaseException]]:
+    """
+    Difference summaries of (previous deck path, current deck path) pairs, all compared concurrently.
+    A pair that cannot be compared (a deck that cannot be read, a failed request) gets its exception
+    in place of the summary; the other pairs are unaffected.
     """
+    paths = sorted({path for pair in pairs for path in pair})
+    texts = dict(zip(paths, await asyncio.gather(*(asyncio.to_thread(_deck_text, path) for path in paths),
+                                                 return_exceptions=True)))
 
-    response = client.chat.completions.create(
-        model="gpt-4o",  # Or a more advanced model like gpt-4
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant that summarizes differences in documents."},
-            {"role": "user", "content": prompt}
-        ]
-    )
-    return response.choices[0].message.content
+    async def compare(previous, current):
+        for path in (previous, current):
+            if isinstance(texts[path], BaseException):
+                raise texts[path]  # never send a read error to the model as if it were the deck
+        return await compare_ppt_content_async(llm, texts[previous], texts[current], os.path.basename(previous),
+                                               os.path.basename(current), chunk_chars)
+
+    return await asyncio.gather(*(compare(previous, current) for previous, current in pairs), return_exceptions=True)
+
+async def diff_push_history(db, llm: LLMClient, topic_name: Optional[str] = None) -> int:
+    """
+    Store a PPTDiff for every pair of consecutive successful pushes (per topic) that has none yet.
+    Pairs that fail are logged and left without a diff, to be retried on the next run.
+    Returns the number of diffs created.
+    """
+    query = db.query(models.PPTPushRecord).filter(models.PPTPushRecord.status == "success")
+    if topic_name is not None:
+        query = query.filter(models.PPTPushRecord.topic_name == topic_name)
+    diffed = {current_id for (current_id,) in db.query(models.PPTDiff.current_record_id)}
+
+    # Per topic, the latest deck pushed and the deck before it; a deck pushed over several
+    # channels has one record per channel, each compared with the deck before it
+    latest, before, pending = {}, {}, []
+    for record in query.order_by(models.PPTPushRecord.push_time, models.PPTPushRecord.id):
+        previous = latest.get(record.topic_name)
+        if previous is not None and previous.ppt_filename == record.ppt_filename:
+            previous = before.get(record.topic_name)
+        else:
+            before[record.topic_name], latest[record.topic_name] = previous, record
+        if previous is not None and record.id not in diffed:
+            pending.append((previous, record))
+    pending = [(previous, current) for previous, current in pending
+               if all(os.path.exists(os.path.join(PPT_DIRECTORY, r.ppt_filename)) for r in (previous, current))]
+
+    summaries = await compare_deck_pairs(llm, [
+        (os.path.join(PPT_DIRECTORY, previous.ppt_filename), os.path.join(PPT_DIRECTORY, current.ppt_filename))
+        for previous, current in pending
+    ])
+    created = 0
+    for (previous, current), summary in zip(pending, summaries):
+        if isinstance(summary, BaseException):
+            logger.error("Comparing %s with %s failed: %s", previous.ppt_filename, current.ppt_filename, summary)
+            continue
+        db.add(models.PPTDiff(current_record_id=current.id, previous_record_id=previous.id, summary=summary))
+        created += 1
+    db.commit()
+    return created
 
 def main():
-    """Main function to extract text and compare two PPTs."""
-    ppt1_path = os.path.join(PPT_DIRECTORY, PPT_FILE_1)
-    ppt2_path = os.path.join(PPT_DIRECTORY, PPT_FILE_2)
+    """Main function to extract text and compare two PPTs (or, with --history, the push history)."""
+    if sys.argv[1:2] == ["--history"]:
+        from database import SessionLocal
+
+        async def run_history():
+            db = SessionLocal()
+            try:
+                async with LLMClient(LLMSettings.from_env()) as llm:
+                    created = await diff_push_history(db, llm, sys.argv[2] if len(sys.argv) > 2 else None)
+                    print(f"Created {created} PPT diffs ({llm.requests_sent} LLM requests)")
+            finally:
+                db.close()
+        asyncio.run(run_history())
+        return
+
+    if len(sys.argv) == 3:
+        ppt1_path, ppt2_path = sys.argv[1], sys.argv[2]
+    else:
+        ppt1_path = os.path.join(PPT_DIRECTORY, PPT_FILE_1)
+        ppt2_path = os.path.join(PPT_DIRECTORY, PPT_FILE_2)
 
     # Check if files exist
     if not os.path.exists(ppt1_path):
@@ -82,7 +230,8 @@ def main():
         return
 
     print("Comparing PowerPoint content using OpenAI...")
-    comparison_summary = compare_ppt_content(ppt1_text, ppt2_text, PPT_FILE_1, PPT_FILE_2)
+    comparison_summary = compare_ppt_content(ppt1_text, ppt2_text, os.path.basename(ppt1_path),
+                                             os.path.basename(ppt2_path))
 
     print("\n--- Comparison Summary ---")
     print(comparison_summary)
@@ -1,17 +1,35 @@
 
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy.orm import Session, defer
+from sqlalchemy import func, select, true
+from datetime import datetime, timedelta, date
+from typing import List, Optional
 import models
 import schemas
+import trends
+import keyword_router
+import keyword_trends
+import literature_archive
+import literature_types
+import relevance
+import similarity
+import snapshots
+import topic_registry
 
 # --- Topic CRUD ---
 
+def live_topics(db: Session, *entities):
+    """Topics that have not been deleted (deleted topics stay hidden while they are purged)."""
+    return db.query(*(entities or (models.Topic,))).filter(models.Topic.deleted_at.is_(None))
+
 def get_topic(db: Session, topic_id: int):
-    return db.query(models.Topic).filter(models.Topic.id == topic_id).first()
+    return live_topics(db).filter(models.Topic.id == topic_id).first()
 
 def get_topics(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Topic).offset(skip).limit(limit).all()
+    return live_topics(db).offset(skip).limit(limit).all()
+
+def get_topics_by_ids(db: Session, topic_ids: List[int]):
+    return live_topics(db).filter(models.Topic.id.in_(topic_ids)).all()
 
 def create_topic(db: Session, topic: schemas.TopicCreate):
     db_topic = models.Topic(
@@ -28,6 +46,7 @@ def create_topic(db: Session, topic: schemas.TopicCreate):
     db.add(db_topic)
     db.commit()
     db.refresh(db_topic)
+    topic_registry.put(db_topic)
     return db_topic
 
 def update_topic(db: Session, topic_id: int, topic_update: schemas.TopicCreate):
@@ -36,6 +55,7 @@ def update_topic(db: Session, topic_id: int, topic_update: schemas.TopicCreate):
         return None
 
     update_data = topic_update.dict(exclude_unset=True)
+    keywords_changed = "keywords" in update_data and update_data["keywords"] != db_topic.keywords
 
     for key, value in update_data.items():
         if key == "settings":
@@ -48,15 +68,25 @@ def update_topic(db: Session, topic_id: int, topic_update: schemas.TopicCreate):
             setattr(db_topic, key, value)
 
     db_topic.last_updated = datetime.utcnow()
+    if keywords_changed:
+        db.flush()
+        relevance.rescore_topic(db.connection(), topic_id)
     db.commit()
     db.refresh(db_topic)
+    topic_registry.put(db_topic)
     return db_topic
 
 def delete_topic(db: Session, topic_id: int):
+    """
+    Mark the topic deleted, which hides it at once. Its literature, rollups and records are removed
+    afterwards in small batches by topic_deletion.purge_topic.
+    """
     db_topic = get_topic(db, topic_id)
     if db_topic:
-        db.delete(db_topic)
+        db_topic.deleted_at = db_topic.last_updated = datetime.utcnow()
         db.commit()
+        topic_registry.remove(topic_id)
+        keyword_trends.invalidate(topic_id)
         return True
     return False
 
@@ -69,53 +99,80 @@ def get_topic_history(db: Session, topic_id: int):
 def create_literature(db: Session, literature: schemas.Literature, topic_id: int):
     db_literature = models.Literature(**literature.dict(), topic_id=topic_id)
     db.add(db_literature)
+    db.flush()
+    relevance.score_literature(db.connection(), topic_id, [db_literature.id])
     db.commit()
+    similarity.index_new_literature(db.connection())
     db.refresh(db_literature)
     return db_literature
 
-def get_literature_analysis(db: Session, topic_id: int, skip: int = 0, limit: int = 10):
-    base_query = db.query(models.Literature).filter(models.Literature.topic_id == topic_id)
-
-    # Stats
-    total_count = base_query.count()
-    # Assuming high citation is > 50, a real implementation would be more complex
-    # For now, we will return a placeholder value for high_citation_count
-    high_citation_count = 0 # Placeholder
-    clinical_trial_count = base_query.filter(models.Literature.literature_type.ilike("%clinical trial%")).count()
-    meta_analysis_count = base_query.filter(models.Literature.literature_type.ilike("%meta-analysis%")).count()
-
-    stats = schemas.LiteratureAnalysisStats(
-        total_count=total_count,
-        high_citation_count=high_citation_count,
-        clinical_trial_count=clinical_trial_count,
-        meta_analysis_count=meta_analysis_count
+def create_literature_batch(db: Session, literature_items: List[dict], topic_id: int):
+    """
+    Insert many literature rows for one topic in a single transaction and score them as a batch.
+    Items are dicts of models.Literature columns. Returns the new ids.
+    """
+    db_literature = [models.Literature(**item, topic_id=topic_id) for item in literature_items]
+    db.add_all(db_literature)
+    db.flush()
+    literature_ids = [literature.id for literature in db_literature]
+    relevance.score_literature(db.connection(), topic_id, literature_ids)
+    db.commit()
+    similarity.index_new_literature(db.connection())
+    return literature_ids
+
+def _type_stats(type_counts) -> schemas.LiteratureAnalysisStats:
+    # type_counts: (type_code, count) pairs of one topic
+    by_code = {}
+    for code, count in type_counts:
+        by_code[code] = by_code.get(code, 0) + count
+    return schemas.LiteratureAnalysisStats(
+        total_count=sum(by_code.values()),
+        # Assuming high citation is > 50, a real implementation would be more complex
+        # For now, we will return a placeholder value for high_citation_count
+        high_citation_count=0,  # Placeholder
+        clinical_trial_count=by_code.get(literature_types.CLINICAL_TRIAL, 0),
+        meta_analysis_count=by_code.get(literature_types.META_ANALYSIS, 0),
     )
 
-    # Trend Data (e.g., last 6 months)
-    six_months_ago = datetime.utcnow() - timedelta(days=180)
-    trend_data_query = (((db.query(
-            func.strftime('%Y-%m', models.Literature.publication_date).label('month'),
-            func.count(models.Literature.id).label('count')
-        ).filter(models.Literature.topic_id == topic_id)
-                        .filter(models.Literature.publication_date >= six_months_ago)
-                        .group_by(func.strftime('%Y-%m', models.Literature.publication_date)))
-                        .order_by(func.strftime('%Y-%m', models.Literature.publication_date)))
-                        .all())
-    
-    trend_data = [schemas.TrendDataPoint(date=row.month, count=row.count) for row in trend_data_query]
+def _distribution(type_counts) -> List[schemas.DistributionDataPoint]:
+    return [schemas.DistributionDataPoint(type=label, count=count)
+            for label, count in literature_types.counts_by_label(type_counts)]
 
-    # Distribution Data
-    distribution_query = ((db.query(
-            models.Literature.literature_type,
-            func.count(models.Literature.id).label('count')
-        ).filter(models.Literature.topic_id == topic_id)
-                          .group_by(models.Literature.literature_type))
-                          .all())
+def _literature_columns(fields: Optional[List[str]] = None, summary_length: Optional[int] = None,
+                       literature=models.Literature):
+    """
+    Columns of a literature list: the requested fields (all by default) plus id. With summary_length the
+    summary is cut in SQL, so the rest of it is never sent to Python, and summary_truncated tells which were cut.
+    """
+    columns = [literature.id]
+    for name in dict.fromkeys(fields or schemas.LITERATURE_FIELDS):
+        if name == "id":
+            continue
+        if name == "summary" and summary_length is not None:
+            columns.append(func.substr(literature.summary, 1, summary_length).label("summary"))
+            columns.append((func.length(literature.summary) > summary_length).label("summary_truncated"))
+        else:
+            columns.append(getattr(literature, name))
+    return columns
+
+def _literature_items(rows, schema=schemas.LiteratureListItem):
+    # Built from the selected columns only: fields that were not selected stay unset and are not serialized
+    return [schema(**row._asdict()) for row in rows]
 
-    distribution_data = [schemas.DistributionDataPoint(type=row.literature_type, count=row.count) for row in distribution_query]
+def get_literature_analysis(db: Session, topic_id: int, skip: int = 0, limit: int = 10, order_by: str = "date",
+                            fields: Optional[List[str]] = None, summary_length: Optional[int] = None):
+    # Stats and distribution from one grouped pass over the (topic_id, type_code) index of each tier
+    type_counts = literature_archive.grouped_counts(db, ["type_code"], lambda literature: literature.c.topic_id == topic_id)
+    stats = _type_stats(type_counts)
+
+    # Trend Data (last 6 months, monthly buckets)
+    trend_data = get_literature_trend(db, topic_id=topic_id)
+
+    # Distribution Data
+    distribution_data = _distribution(type_counts)
 
     # Literature List
-    literature_list = base_query.order_by(models.Literature.publication_date.desc()).offset(skip).limit(limit).all()
+    literature_list = _literature_items(_literature_page(db, topic_id, skip, limit, order_by, fields, summary_length))
 
     return schemas.LiteratureAnalysis(
         stats=stats,
@@ -124,6 +181,245 @@ def get_literature_analysis(db: Session, topic_id: int, skip: int = 0, limit: in
         literature=literature_list
     )
 
+def _literature_page(db: Session, topic_id: int, skip: int, limit: int, order_by: str,
+                     fields: Optional[List[str]], summary_length: Optional[int]):
+    def page(literature, *extra):
+        if order_by == "relevance":
+            ordering = (literature.relevance_score.desc(), literature.id.desc())
+        else:
+            ordering = (literature.publication_date.desc(),)
+        return (db.query(*_literature_columns(fields, summary_length, literature), *extra)
+                .filter(literature.topic_id == topic_id)
+                .order_by(*ordering).offset(skip).limit(limit).all())
+
+    literature = literature_archive.literature_entity(db)
+    if literature is models.Literature or order_by == "relevance":
+        return page(literature)
+    # Newest first: archived papers all sort after the boundary day, so a full page of the hot table that
+    # ends on or after it is also the page over both tiers (page_day is not a list field and is dropped)
+    rows = page(models.Literature, models.Literature.publication_day.label("page_day"))
+    if len(rows) == limit and rows and (rows[-1].page_day or -1) >= literature_archive.boundary_day(db):
+        return rows
+    return page(literature)
+
+def get_literature(db: Session, literature_id: int):
+    """A paper with all its fields, or None if it does not exist or its topic is deleted."""
+    literature = literature_archive.literature_entity(db)
+    return (db.query(literature).join(models.Topic, models.Topic.id == literature.topic_id)
+            .filter(literature.id == literature_id, models.Topic.deleted_at.is_(None)).first())
+
+def get_similar_literature(db: Session, literature_id: int, k: int = 10,
+                           fields: Optional[List[str]] = None, summary_length: Optional[int] = None):
+    """
+    The k papers across all topics closest to the given one, or None if it does not exist.
+    """
+    literature = literature_archive.literature_entity(db)
+    if db.query(literature.id).filter(literature.id == literature_id).first() is None:
+        return None
+    index = similarity.catch_up(db.connection())
+    matches = index.similar(literature_id, k) or []
+    found = {
+        item.id: item
+        for item in _literature_items(
+            db.query(*_literature_columns(fields, summary_length, literature), literature.topic_id)
+            .join(models.Topic, models.Topic.id == literature.topic_id)
+            .filter(literature.id.in_([i for i, _ in matches]), models.Topic.deleted_at.is_(None)),
+            schemas.SimilarLiterature,
+        )
+    }
+    # Papers deleted since they were indexed, or whose topic is being purged, are skipped
+    return [found[i].model_copy(update={"similarity": score}) for i, score in matches if i in found]
+
+
+def route_literature(db: Session, papers: List[schemas.PaperText], min_score: float = 0.0):
+    router = keyword_router.get_router(db)
+    return [schemas.TopicAssignment(**assignment._asdict())
+            for assignment in router.route_many((paper.model_dump() for paper in papers), min_score)]
+
+def _trend_window(start_date: Optional[date], end_date: Optional[date]):
+    if end_date is None:
+        end_date = datetime.utcnow().date()
+    if start_date is None:
+        start_date = end_date - timedelta(days=trends.DEFAULT_TREND_DAYS)
+    return start_date, end_date
+
+def _daily_counts_query(start_date: date, end_date: date):
+    # One rollup row per topic and publishing day in the window, see models.LiteratureDailyCount
+    rollup = models.LiteratureDailyCount.__table__
+    return (
+        select(rollup.c.topic_id, rollup.c.publication_day, rollup.c.count)
+        .where(rollup.c.publication_day >= models.to_day_number(start_date))
+        .where(rollup.c.publication_day <= models.to_day_number(end_date))
+    )
+
+def _trend_points(day_counts, layout: trends.BucketLayout):
+    return [schemas.TrendDataPoint(date=label, count=count) for label, count in layout.fold(day_counts)]
+
+def get_literature_trend(db: Session, topic_id: int, granularity: str = "month",
+                         start_date: Optional[date] = None, end_date: Optional[date] = None):
+    """
+    Publication counts per bucket between start_date and end_date (inclusive), gap-filled.
+    Defaults to the last 180 days.
+    """
+    start_date, end_date = _trend_window(start_date, end_date)
+    query = _daily_counts_query(start_date, end_date).where(models.LiteratureDailyCount.topic_id == topic_id)
+    day_counts = [(day, count) for _, day, count in db.execute(query)]
+    return _trend_points(day_counts, trends.BucketLayout(start_date, end_date, granularity))
+
+def get_literature_analysis_batch(db: Session, topic_ids: Optional[List[int]] = None, granularity: str = "month",
+                                  start_date: Optional[date] = None, end_date: Optional[date] = None):
+    """
+    Stats, trends and distributions for many topics (all topics when topic_ids is None).
+
+    Two grouped queries regardless of the number of topics: one pass over literature grouped by
+    (topic_id, type_code), from which both the stats and the distributions are derived,
+    and one pass over the daily rollup for the trends.
+    """
+    if topic_ids is None:
+        topic_ids = [row.id for row in live_topics(db, models.Topic.id).order_by(models.Topic.id)]
+    start_date, end_date = _trend_window(start_date, end_date)
+
+    distributions = {topic_id: [] for topic_id in topic_ids}
+    if topic_ids:
+        topic_filter = lambda literature: literature.c.topic_id.in_(topic_ids)
+    else:
+        topic_filter = lambda literature: true()
+    for topic_id, type_code, count in literature_archive.grouped_counts(db, ["topic_id", "type_code"], topic_filter):
+        if topic_id in distributions:
+            distributions[topic_id].append((type_code, count))
+
+    day_counts = {topic_id: [] for topic_id in topic_ids}
+    trend_query = _daily_counts_query(start_date, end_date)
+    if topic_ids:
+        trend_query = trend_query.where(models.LiteratureDailyCount.topic_id.in_(topic_ids))
+    for topic_id, day, count in db.execute(trend_query):
+        if topic_id in day_counts:
+            day_counts[topic_id].append((day, count))
+
+    layout = trends.BucketLayout(start_date, end_date, granularity)
+    summaries = []
+    for topic_id in topic_ids:
+        summaries.append(schemas.TopicAnalysisSummary(
+            topic_id=topic_id,
+            stats=_type_stats(distributions[topic_id]),
+            trend_data=_trend_points(day_counts[topic_id], layout),
+            distribution_data=_distribution(distributions[topic_id]),
+        ))
+    return summaries
+
+
+# --- Analysis Snapshots ---
+
+def get_snapshots(db: Session, topic_id: int, skip: int = 0, limit: int = 100):
+    """Snapshot metadata of a topic, newest first; the compressed payloads are not loaded."""
+    return (
+        db.query(models.AnalysisSnapshot)
+        .options(defer(models.AnalysisSnapshot.analysis), defer(models.AnalysisSnapshot.literature_ids))
+        .filter(models.AnalysisSnapshot.topic_id == topic_id)
+        .order_by(models.AnalysisSnapshot.created_at.desc(), models.AnalysisSnapshot.id.desc())
+        .offset(skip).limit(limit).all()
+    )
+
+def get_snapshot(db: Session, topic_id: int, snapshot_id: int):
+    return (
+        db.query(models.AnalysisSnapshot)
+        .filter(models.AnalysisSnapshot.id == snapshot_id, models.AnalysisSnapshot.topic_id == topic_id)
+        .first()
+    )
+
+def _snapshot_layout(snapshot: models.AnalysisSnapshot, granularity: str, start_date: Optional[date],
+                     end_date: Optional[date]) -> trends.BucketLayout:
+    # The default window ends on the day the snapshot was taken, not today
+    start_date, end_date = _trend_window(start_date, end_date or snapshot.created_at.date())
+    return trends.BucketLayout(start_date, end_date, granularity)
+
+def get_snapshot_analysis(db: Session, topic_id: int, snapshot_id: int, granularity: str = "month",
+                          start_date: Optional[date] = None, end_date: Optional[date] = None,
+                          include_literature_ids: bool = False):
+    """The analysis of a topic as frozen by one update cycle, or None if there is no such snapshot."""
+    snapshot = get_snapshot(db, topic_id, snapshot_id)
+    if snapshot is None:
+        return None
+    analysis = snapshots.decode_analysis(snapshot.analysis)
+    literature_ids = snapshots.decode_ids(snapshot.literature_ids).tolist() if include_literature_ids else None
+    return schemas.AnalysisSnapshot(
+        **schemas.AnalysisSnapshotInfo.model_validate(snapshot).model_dump(),
+        stats=_type_stats(analysis.type_counts),
+        trend_data=_trend_points(analysis.day_counts, _snapshot_layout(snapshot, granularity, start_date, end_date)),
+        distribution_data=_distribution(analysis.type_counts),
+        literature_ids=literature_ids,
+    )
+
+def _count_changes(before, after, keys) -> List[schemas.CountChange]:
+    return [schemas.CountChange(key=key, before=before.get(key, 0), after=after.get(key, 0),
+                                change=after.get(key, 0) - before.get(key, 0)) for key in keys]
+
+def diff_snapshots(db: Session, topic_id: int, before_id: int, after_id: int, granularity: str = "month",
+                   start_date: Optional[date] = None, end_date: Optional[date] = None):
+    """
+    Numeric changes between two snapshots of a topic (after minus before), or None if either is missing.
+    Trends of both are folded over the same window, by default the one ending on the later snapshot.
+    """
+    before, after = get_snapshot(db, topic_id, before_id), get_snapshot(db, topic_id, after_id)
+    if before is None or after is None:
+        return None
+    before_analysis = snapshots.decode_analysis(before.analysis)
+    after_analysis = snapshots.decode_analysis(after.analysis)
+
+    before_stats = _type_stats(before_analysis.type_counts).model_dump()
+    after_stats = _type_stats(after_analysis.type_counts).model_dump()
+
+    before_types = dict(literature_types.counts_by_label(before_analysis.type_counts))
+    after_types = dict(literature_types.counts_by_label(after_analysis.type_counts))
+    types = sorted(before_types.keys() | after_types.keys(),
+                   key=lambda label: (-abs(after_types.get(label, 0) - before_types.get(label, 0)), label))
+
+    latest = max(before, after, key=lambda snapshot: snapshot.created_at)
+    layout = _snapshot_layout(latest, granularity, start_date, end_date)
+    before_trend = dict(layout.fold(before_analysis.day_counts))
+    after_trend = dict(layout.fold(after_analysis.day_counts))
+
+    before_ids = snapshots.decode_ids(before.literature_ids)
+    after_ids = snapshots.decode_ids(after.literature_ids)
+    return schemas.AnalysisSnapshotDiff(
+        topic_id=topic_id,
+        before=schemas.AnalysisSnapshotInfo.model_validate(before),
+        after=schemas.AnalysisSnapshotInfo.model_validate(after),
+        stats=_count_changes(before_stats, after_stats, list(after_stats)),
+        trend_data=_count_changes(before_trend, after_trend, layout.labels),
+        distribution_data=_count_changes(before_types, after_types, types),
+        added_literature_ids=np.setdiff1d(after_ids, before_ids, assume_unique=True).tolist(),
+        removed_literature_ids=np.setdiff1d(before_ids, after_ids, assume_unique=True).tolist(),
+    )
+
+def get_keyword_trends(db: Session, topic_id: int, period_days: int = 90, end_date: Optional[date] = None,
+                       top_k: int = 20, min_count: int = 2, include_text: bool = False):
+    """
+    Keyword co-occurrence and period-over-period growth for a topic.
+    The current period is the `period_days` ending at end_date, compared with the period before it.
+    """
+    if end_date is None:
+        end_date = datetime.utcnow().date()
+
+    keyword_matrix = keyword_trends.get_keyword_matrix(db, topic_id, include_text=include_text)
+    end_day = models.to_day_number(end_date)
+
+    return schemas.KeywordTrends(
+        topic_id=topic_id,
+        paper_count=keyword_matrix.paper_count,
+        keyword_count=len(keyword_matrix.terms),
+        period_start=end_date - timedelta(days=period_days - 1),
+        period_end=end_date,
+        co_occurrences=[
+            schemas.KeywordPair(keyword_a=a, keyword_b=b, count=count, jaccard=jaccard)
+            for a, b, count, jaccard in keyword_matrix.co_occurrences(top_k=top_k, min_count=min_count)
+        ],
+        emerging=[
+            schemas.KeywordGrowth(keyword=keyword, current_count=current, previous_count=previous, growth_score=score)
+            for keyword, current, previous, score in keyword_matrix.growth(end_day, period_days, top_k=top_k, min_count=min_count)
+        ],
+    )
+
 
 # --- PPT Push History CRUD ---
 
@@ -0,0 +1,145 @@
+# 主题文献导出 (CSV / NDJSON / Parquet)
+# 按主键分块读取 (WHERE id > 上一块最后的 id LIMIT CHUNK_SIZE)，每块用一个短连接读取后立即释放，
+# 逐块编码并交给 StreamingResponse，因此内存占用与主题的文献数量无关，导出期间也不会长时间持有 SQLite 的读锁。
+# Parquet 每块写一个 row group，写出的字节随即发送给客户端。
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+
+import literature_archive
+
+FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+CHUNK_SIZE = 5000
+
+COLUMNS = ("id", "title", "authors", "publication_date", "journal_name", "literature_type",
+           "keywords", "summary", "relevance_score")
+LIST_COLUMNS = {"authors", "keywords"}
+
+
+def iter_chunks(engine: Engine, topic_id: int, chunk_size: Optional[int] = None) -> Iterator[List[Tuple]]:
+    """Rows of a topic in id order, chunk_size rows at a time (keyset pagination on the primary key)."""
+    chunk_size = chunk_size or CHUNK_SIZE
+    with engine.connect() as connection:
+        literature = literature_archive.literature_table(connection)
+    query = (
+        select(*(literature.c[name] for name in COLUMNS))
+        .where(literature.c.topic_id == topic_id)
+        .order_by(literature.c.id)
+        .limit(chunk_size)
+    )
+    last_id = 0
+    while True:
+        with engine.connect() as connection:
+            rows = connection.execute(query.where(literature.c.id > last_id)).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def _as_list(value) -> List[str]:
+    # Some rows store the list as a JSON string inside the JSON column
+    while isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return [value]
+    return [str(item) for item in value or []]
+
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _records(rows: Sequence[Tuple]) -> Iterator[dict]:
+    for row in rows:
+        record = dict(zip(COLUMNS, row))
+        record["authors"] = _as_list(record["authors"])
+        record["keywords"] = _as_list(record["keywords"])
+        record["publication_date"] = _iso(record["publication_date"])
+        yield record
+
+
+def stream_csv(chunks: Iterator[List[Tuple]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for rows in chunks:
+        for record in _records(rows):
+            writer.writerow(["; ".join(value) if name in LIST_COLUMNS else value for name, value in record.items()])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def stream_ndjson(chunks: Iterator[List[Tuple]]) -> Iterator[bytes]:
+    for rows in chunks:
+        yield "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in _records(rows)).encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands out what has been written since the last drain."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+def stream_parquet(chunks: Iterator[List[Tuple]]) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("id", pa.int64()),
+        ("title", pa.string()),
+        ("authors", pa.list_(pa.string())),
+        ("publication_date", pa.timestamp("us")),
+        ("journal_name", pa.string()),
+        ("literature_type", pa.string()),
+        ("keywords", pa.list_(pa.string())),
+        ("summary", pa.string()),
+        ("relevance_score", pa.float64()),
+    ])
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for rows in chunks:
+            columns = {name: list(values) for name, values in zip(COLUMNS, zip(*rows))}
+            columns["authors"] = [_as_list(value) for value in columns["authors"]]
+            columns["keywords"] = [_as_list(value) for value in columns["keywords"]]
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))  # one row group per chunk
+            yield sink.drain()
+    yield sink.drain()  # footer
+
+
+STREAMERS = {"csv": stream_csv, "ndjson": stream_ndjson, "parquet": stream_parquet}
+
+
+def stream_export(engine: Engine, topic_id: int, fmt: str, chunk_size: Optional[int] = None) -> Iterator[bytes]:
+    return STREAMERS[fmt](iter_chunks(engine, topic_id, chunk_size))
@@ -10,6 +10,7 @@ logger = logging.getLogger(__name__)
 
 # Import necessary components from your project
 import crud
+import relevance
 import schemas
 from models import Base, Topic, UpdateRecord, Literature, PPTPushRecord, PPTDiff
 from database import SessionLocal, engine
@@ -423,6 +424,8 @@ def insert_test_data(db: Session):
         )
         db.add(lit_data)
 
+    db.commit()
+    relevance.rescore_topic(db.connection(), topic.id)
     db.commit()
     logger.info(f"{len(literature_to_create)} literature records inserted.")
 
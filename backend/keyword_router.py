@@ -0,0 +1,260 @@
+# 关键词路由: 把文献一次性分配给所有关键词命中的主题
+# 所有主题的关键词 (连同同义词) 编译进同一个 Aho-Corasick 自动机。自动机以词为单位:
+# 文本按 Unicode 词切分并做大小写折叠，英文复数归一到单数 (inhibitors -> inhibitor)，
+# 不出现在任何关键词中的词直接回到根状态，因此一篇文献的匹配与其长度成线性关系，与主题数量无关。
+# 分数: 每个命中的主题关键词按命中的字段计权 (标题 3、文献关键词 2、摘要 1，取最高)，
+# 除以主题关键词数 × 3，范围 (0, 1]。
+# 主题变化时只更新该主题的映射；只有出现新的关键词短语时才在下一次路由前重建自动机结构。
+# 进程内的路由器跟随 topic_registry 同步 (get_router)，多 worker 时同样由 cache_bus 保持一致。
+import re
+import threading
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+import topic_registry
+
+TOKEN = re.compile(r"[^\W_]+")
+
+TITLE_WEIGHT = 3
+KEYWORDS_WEIGHT = 2
+SUMMARY_WEIGHT = 1
+
+# Each group lists phrases that mean the same thing; a topic keyword in a group matches all of them
+SYNONYMS: List[Tuple[str, ...]] = [
+    ("CLL", "chronic lymphocytic leukemia", "chronic lymphocytic leukaemia"),
+    ("AML", "acute myeloid leukemia", "acute myeloid leukaemia"),
+    ("MRD", "minimal residual disease", "measurable residual disease"),
+    ("BTK inhibitor", "Bruton tyrosine kinase inhibitor", "Bruton's tyrosine kinase inhibitor"),
+    ("NSCLC", "non-small cell lung cancer", "non-small-cell lung cancer"),
+    ("T2DM", "type 2 diabetes", "type 2 diabetes mellitus"),
+    ("GLP-1", "glucagon-like peptide-1", "glucagon-like peptide 1"),
+]
+
+Pattern = Tuple[str, ...]
+
+
+class Assignment(NamedTuple):
+    paper: int  # index of the paper in the routed sequence
+    topic_id: int
+    score: float
+
+
+def _stem(token: str) -> str:
+    return token[:-1] if len(token) > 3 and token.endswith("s") and not token.endswith("ss") else token
+
+
+def phrase_tokens(phrase: str) -> Pattern:
+    return tuple(_stem(token) for token in TOKEN.findall(phrase.casefold()))
+
+
+class _Automaton(NamedTuple):
+    vocab: Dict[str, int]  # text token -> token id (plural and singular share one)
+    goto: List[Dict[int, int]]
+    fail: List[int]
+    out: List[Tuple[int, ...]]  # pattern ids ending at each state, including via failure links
+
+
+class KeywordRouter:
+    """All topics' keywords in one automaton; safe to route from many threads while topics change."""
+
+    def __init__(self, synonyms: Iterable[Sequence[str]] = SYNONYMS):
+        self._synonyms: Dict[Pattern, Tuple[Pattern, ...]] = {}
+        for group in synonyms:
+            patterns = tuple(dict.fromkeys(phrase_tokens(phrase) for phrase in group))
+            for pattern in patterns:
+                self._synonyms[pattern] = tuple(dict.fromkeys(self._synonyms.get(pattern, ()) + patterns))
+        self._patterns: List[Pattern] = []
+        self._pattern_ids: Dict[Pattern, int] = {}
+        # Replaced, never mutated, so readers can use them without the lock
+        self._pattern_topics: List[Dict[int, int]] = []  # pattern id -> {topic id: keyword index}
+        self._keyword_counts: Dict[int, int] = {}
+        self._topic_keywords: Dict[int, Tuple[str, ...]] = {}
+        self._topic_patterns: Dict[int, List[int]] = {}
+        self._automaton: Optional[_Automaton] = None
+        self._lock = threading.Lock()
+        self.synced_from = None
+        self.rebuilds = 0
+
+    def __getstate__(self):
+        # Sent to worker processes (pubmed_import); they get their own lock
+        state = dict(self.__dict__)
+        del state["_lock"]
+        state["synced_from"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def topic_ids(self) -> List[int]:
+        """Topics that have at least one keyword to match."""
+        return list(self._keyword_counts)
+
+    def _expand(self, keyword: str) -> Tuple[Pattern, ...]:
+        pattern = phrase_tokens(keyword)
+        if not pattern:
+            return ()
+        return self._synonyms.get(pattern, (pattern,))
+
+    def _unlink(self, topic_id: int):
+        for pattern_id in self._topic_patterns.pop(topic_id, []):
+            topics = dict(self._pattern_topics[pattern_id])
+            topics.pop(topic_id, None)
+            self._pattern_topics[pattern_id] = topics
+        self._keyword_counts.pop(topic_id, None)
+        self._topic_keywords.pop(topic_id, None)
+
+    def set_topic(self, topic_id: int, keywords: Sequence[str]):
+        """Add a topic or replace its keywords."""
+        keywords = tuple(keywords or ())
+        with self._lock:
+            if self._topic_keywords.get(topic_id) == keywords:
+                return
+            self._unlink(topic_id)
+            linked = []
+            counted = 0
+            for index, keyword in enumerate(keywords):
+                patterns = self._expand(keyword)
+                counted += bool(patterns)
+                for pattern in patterns:
+                    pattern_id = self._pattern_ids.get(pattern)
+                    if pattern_id is None:
+                        # A phrase the automaton does not know yet: its structure is rebuilt before the next route
+                        pattern_id = self._pattern_ids[pattern] = len(self._patterns)
+                        self._patterns.append(pattern)
+                        self._pattern_topics.append({})
+                        self._automaton = None
+                    topics = self._pattern_topics[pattern_id]
+                    if topic_id not in topics:
+                        self._pattern_topics[pattern_id] = {**topics, topic_id: index}
+                        linked.append(pattern_id)
+            self._topic_keywords[topic_id] = keywords
+            if counted:
+                self._keyword_counts[topic_id] = counted
+                self._topic_patterns[topic_id] = linked
+
+    def remove_topic(self, topic_id: int):
+        with self._lock:
+            self._unlink(topic_id)
+
+    def sync(self, keywords_by_topic: Dict[int, Sequence[str]]):
+        """Make the router match exactly these topics, touching only the ones that changed."""
+        for topic_id in set(self._topic_keywords) - set(keywords_by_topic):
+            self.remove_topic(topic_id)
+        for topic_id, keywords in keywords_by_topic.items():
+            self.set_topic(topic_id, keywords)
+
+    def _build(self) -> _Automaton:
+        vocab: Dict[str, int] = {}
+        goto: List[Dict[int, int]] = [{}]
+        ends: List[List[int]] = [[]]
+        for pattern_id, pattern in enumerate(self._patterns):
+            state = 0
+            for token in pattern:
+                token_id = vocab.setdefault(token, len(vocab))
+                vocab.setdefault(token + "s", token_id)
+                following = goto[state].get(token_id)
+                if following is None:
+                    following = goto[state][token_id] = len(goto)
+                    goto.append({})
+                    ends.append([])
+                state = following
+            ends[state].append(pattern_id)
+
+        fail = [0] * len(goto)
+        out: List[Tuple[int, ...]] = [()] * len(goto)
+        queue = deque(goto[0].values())
+        for state in queue:
+            out[state] = tuple(ends[state])
+        while queue:
+            state = queue.popleft()
+            for token_id, child in goto[state].items():
+                queue.append(child)
+                if state:
+                    target = fail[state]
+                    while target and token_id not in goto[target]:
+                        target = fail[target]
+                    fail[child] = goto[target].get(token_id, 0)
+                out[child] = tuple(ends[child]) + out[fail[child]]
+        self.rebuilds += 1
+        return _Automaton(vocab, goto, fail, out)
+
+    def _current(self) -> _Automaton:
+        automaton = self._automaton
+        if automaton is None:
+            with self._lock:
+                if self._automaton is None:
+                    self._automaton = self._build()
+                automaton = self._automaton
+        return automaton
+
+    @staticmethod
+    def _scan(automaton: _Automaton, text: Optional[str], weight: int, found: Dict[int, int]):
+        if not text:
+            return
+        vocab, goto, fail, out = automaton
+        state = 0
+        for token in TOKEN.findall(text.casefold()):
+            token_id = vocab.get(token)
+            if token_id is None:
+                state = 0
+                continue
+            while state and token_id not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token_id, 0)
+            for pattern_id in out[state]:
+                if found.get(pattern_id, 0) < weight:
+                    found[pattern_id] = weight
+
+    def route(self, title: Optional[str], summary: Optional[str] = None,
+              keywords: Optional[Sequence[str]] = None) -> List[Tuple[int, float]]:
+        """(topic id, score) of every topic the paper mentions, best first."""
+        automaton = self._current()
+        found: Dict[int, int] = {}
+        self._scan(automaton, title, TITLE_WEIGHT, found)
+        for keyword in keywords or ():
+            self._scan(automaton, keyword, KEYWORDS_WEIGHT, found)  # one at a time: no phrase spans two keywords
+        self._scan(automaton, summary, SUMMARY_WEIGHT, found)
+        if not found:
+            return []
+
+        hits: Dict[int, Dict[int, int]] = {}
+        pattern_topics = self._pattern_topics
+        for pattern_id, weight in found.items():
+            for topic_id, index in pattern_topics[pattern_id].items():
+                weights = hits.setdefault(topic_id, {})
+                if weights.get(index, 0) < weight:
+                    weights[index] = weight
+        keyword_counts = self._keyword_counts
+        scores = [
+            (topic_id, sum(weights.values()) / (TITLE_WEIGHT * keyword_counts[topic_id]))
+            for topic_id, weights in hits.items() if topic_id in keyword_counts
+        ]
+        scores.sort(key=lambda item: (-item[1], item[0]))
+        return scores
+
+    def route_many(self, papers: Iterable[dict], min_score: float = 0.0) -> Iterator[Assignment]:
+        """Assignments of papers given as dicts with title, summary and keywords."""
+        for index, paper in enumerate(papers):
+            for topic_id, score in self.route(paper.get("title"), paper.get("summary"), paper.get("keywords")):
+                if score >= min_score:
+                    yield Assignment(index, topic_id, score)
+
+
+_router = KeywordRouter()
+_lock = threading.Lock()
+
+
+def get_router(db: Session) -> KeywordRouter:
+    """The process-wide router, synced with the live topics in topic_registry."""
+    topics = topic_registry.all_topics(db)
+    if _router.synced_from is not topics:
+        with _lock:
+            if _router.synced_from is not topics:
+                _router.sync({topic.id: topic.keywords for topic in topics.values()})
+                _router.synced_from = topics
+    return _router
+
@@ -0,0 +1,221 @@
+# 关键词共现与新兴主题检测
+# 每个主题维护一个 文献 × 关键词 的稀疏矩阵，按文献 id 增量追加，共现与增长率都用矩阵运算得到
+# 缓存中的矩阵发布后不再修改: 刷新在副本上追加，完成后替换缓存项 (写时复制)，读者不需要加锁
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import cache_bus
+import literature_archive
+
+TOKEN_PATTERN = re.compile(r"[a-z][a-z0-9\-]{2,}")
+STOPWORDS = frozenset("""
+about after also among analysis and are based been between both but can case cases clinical data did
+during each effect effects for from had has have however into its may more most new not novel over
+patients patient previous results role showed study studies such than that the their these this those
+through treatment using was were which while who with within without
+""".split())
+
+
+def normalize_keyword(keyword: str) -> str:
+    return " ".join(keyword.split()).casefold()
+
+
+def text_tokens(*texts: Optional[str]) -> List[str]:
+    tokens = []
+    for value in texts:
+        if value:
+            tokens.extend(t for t in TOKEN_PATTERN.findall(value.casefold()) if t not in STOPWORDS)
+    return tokens
+
+
+class KeywordMatrix:
+    """
+    Binary paper x keyword matrix for one topic.
+
+    Rows are appended in literature id order; `literature_watermark` is the highest id already
+    loaded, so a refresh only reads and tokenizes papers that arrived since the last call.
+    A matrix handed out by get_keyword_matrix is never modified again; refreshes work on a copy().
+    """
+
+    def __init__(self, topic_id: int, include_text: bool = False):
+        self.topic_id = topic_id
+        self.include_text = include_text
+        self.vocabulary: Dict[str, int] = {}
+        self.terms: List[str] = []
+        self.literature_watermark = 0
+        self.id_sum = 0  # with paper_count and literature_watermark, tells whether the loaded rows still match
+        self._indices: List[np.ndarray] = []
+        self._row_lengths: List[int] = []
+        self._days: List[int] = []
+        self._matrix: Optional[sparse.csr_matrix] = None
+        self._day_array: Optional[np.ndarray] = None
+        self.generation: Optional[int] = None  # literature write counter at the last refresh
+
+    @property
+    def paper_count(self) -> int:
+        return len(self._row_lengths)
+
+    def copy(self) -> "KeywordMatrix":
+        """A copy that can be refreshed while readers keep using this one (row arrays are shared, never changed)."""
+        other = KeywordMatrix(self.topic_id, self.include_text)
+        other.vocabulary, other.terms = dict(self.vocabulary), list(self.terms)
+        other.literature_watermark, other.id_sum = self.literature_watermark, self.id_sum
+        other._indices, other._row_lengths, other._days = list(self._indices), list(self._row_lengths), list(self._days)
+        return other
+
+    def add_paper(self, publication_day: Optional[int], terms: List[str]):
+        columns = set()
+        for term in terms:
+            term = normalize_keyword(term)
+            if not term:
+                continue
+            column = self.vocabulary.get(term)
+            if column is None:
+                column = self.vocabulary[term] = len(self.terms)
+                self.terms.append(term)
+            columns.add(column)
+        self._indices.append(np.fromiter(sorted(columns), dtype=np.int32, count=len(columns)))
+        self._row_lengths.append(len(columns))
+        self._days.append(-1 if publication_day is None else publication_day)
+        self._matrix = None
+
+    def refresh(self, db: Session):
+        """Load papers added to the topic since the last refresh."""
+        literature = literature_archive.literature_entity(db)
+        columns = [literature.id, literature.publication_day, literature.keywords]
+        if self.include_text:
+            columns += [literature.title, literature.summary]
+        query = (
+            db.query(*columns)
+            .filter(literature.topic_id == self.topic_id)
+            .filter(literature.id > self.literature_watermark)
+            .order_by(literature.id)
+            .yield_per(5000)
+        )
+        for row in query:
+            terms = list(row.keywords or [])
+            if self.include_text:
+                terms += text_tokens(row.title, row.summary)
+            self.add_paper(row.publication_day, terms)
+            self.literature_watermark = row.id
+            self.id_sum += row.id
+
+    @property
+    def matrix(self) -> sparse.csr_matrix:
+        if self._matrix is None:
+            indptr = np.zeros(self.paper_count + 1, dtype=np.int64)
+            np.cumsum(self._row_lengths, out=indptr[1:])
+            indices = np.concatenate(self._indices) if self._indices else np.zeros(0, dtype=np.int32)
+            data = np.ones(len(indices), dtype=np.float32)
+            self._matrix = sparse.csr_matrix((data, indices, indptr), shape=(self.paper_count, len(self.terms)))
+            self._day_array = np.asarray(self._days, dtype=np.int64)
+        return self._matrix
+
+    @property
+    def days(self) -> np.ndarray:
+        self.matrix
+        return self._day_array
+
+    def co_occurrences(self, top_k: int = 20, min_count: int = 2) -> List[Tuple[str, str, int, float]]:
+        """Most frequent keyword pairs as (keyword_a, keyword_b, count, jaccard)."""
+        matrix = self.matrix
+        if matrix.shape[1] < 2:
+            return []
+        document_frequency = np.asarray(matrix.sum(axis=0)).ravel().astype(np.int64)
+        pairs = sparse.triu(matrix.T @ matrix, k=1).tocoo()
+        keep = pairs.data >= min_count
+        rows, cols, counts = pairs.row[keep], pairs.col[keep], pairs.data[keep].astype(np.int64)
+        if counts.size == 0:
+            return []
+        jaccard = counts / (document_frequency[rows] + document_frequency[cols] - counts)
+        order = np.lexsort((-jaccard, -counts))[:top_k]
+        return [
+            (self.terms[rows[i]], self.terms[cols[i]], int(counts[i]), float(jaccard[i]))
+            for i in order
+        ]
+
+    def growth(self, end_day: int, period_days: int, top_k: int = 20, min_count: int = 2) -> List[Tuple[str, int, int, float]]:
+        """
+        Keywords ranked by smoothed log2 growth between the last two periods ending at end_day,
+        as (keyword, current_count, previous_count, score).
+        """
+        matrix, days = self.matrix, self.days
+        if matrix.shape[1] == 0:
+            return []
+        current = (days > end_day - period_days) & (days <= end_day)
+        previous = (days > end_day - 2 * period_days) & (days <= end_day - period_days)
+        current_counts = np.asarray(matrix[current].sum(axis=0)).ravel().astype(np.int64)
+        previous_counts = np.asarray(matrix[previous].sum(axis=0)).ravel().astype(np.int64)
+        scores = np.log2((current_counts + 1.0) / (previous_counts + 1.0))
+        candidates = np.flatnonzero(current_counts >= min_count)
+        order = candidates[np.lexsort((-current_counts[candidates], -scores[candidates]))][:top_k]
+        return [
+            (self.terms[i], int(current_counts[i]), int(previous_counts[i]), float(scores[i]))
+            for i in order
+        ]
+
+
+_cache: Dict[Tuple[int, bool], KeywordMatrix] = {}
+_key_locks: Dict[Tuple[int, bool], threading.Lock] = {}
+_cache_lock = threading.Lock()  # guards the two dicts; refreshes hold only their key's lock
+
+
+def _stored_state(db: Session, topic_id: int) -> Tuple[int, int, int]:
+    literature = literature_archive.literature_entity(db)
+    count, newest, id_sum = db.query(func.count(literature.id), func.max(literature.id), func.sum(literature.id)) \
+        .filter(literature.topic_id == topic_id).one()
+    return count, newest or 0, id_sum or 0
+
+
+def get_keyword_matrix(db: Session, topic_id: int, include_text: bool = False) -> KeywordMatrix:
+    """
+    Return the cached matrix for a topic, topped up with new papers.
+    The matrix is rebuilt when its rows no longer match the table (count, newest id and sum of ids),
+    i.e. papers were deleted, even when as many were added. Nothing is checked while the literature table
+    has not been written to since the last call.
+
+    Papers are treated as append-only: an in-place edit of a loaded paper's keywords, title or summary is not
+    picked up (the application never edits them). Code that does must call invalidate(topic_id) afterwards.
+    """
+    key = (topic_id, include_text)
+    generation = cache_bus.generation("literature")
+    with _cache_lock:
+        current = _cache.get(key)
+        if current is not None and generation is not None and current.generation == generation:
+            return current
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+
+    # Other topics are served while this one refreshes; callers for the same topic wait for its result
+    with key_lock:
+        with _cache_lock:
+            current = _cache.get(key)
+        if current is not None and generation is not None and current.generation == generation:
+            return current
+
+        stored = _stored_state(db, topic_id)
+        if current is not None and stored == (current.paper_count, current.literature_watermark, current.id_sum):
+            current.generation = generation  # this topic's papers did not change
+            return current
+        keyword_matrix = current.copy() if current is not None else KeywordMatrix(topic_id, include_text)
+        keyword_matrix.refresh(db)
+        stored = _stored_state(db, topic_id)  # again: papers may have arrived since the first look
+        if stored != (keyword_matrix.paper_count, keyword_matrix.literature_watermark, keyword_matrix.id_sum):
+            keyword_matrix = KeywordMatrix(topic_id, include_text)
+            keyword_matrix.refresh(db)
+        keyword_matrix.generation = generation
+        with _cache_lock:
+            _cache[key] = keyword_matrix
+        return keyword_matrix
+
+
+def invalidate(topic_id: Optional[int] = None):
+    with _cache_lock:
+        for key in list(_cache):
+            if topic_id is None or key[0] == topic_id:
+                del _cache[key]
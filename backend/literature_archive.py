@@ -0,0 +1,279 @@
+# 文献冷热分层
+# 看板、趋势和大纲上下文几乎只看近期文献，但所有查询都落在同一张不断增长的 literature 表上。
+# 发表日期早于 LITERATURE_HOT_DAYS (默认 365 天) 的文献按批移到归档库 (LITERATURE_ARCHIVE_PATH，默认 medbrief_archive.db)，
+# 每个连接以 "archive" 的名义 ATTACH 它，热库的 literature 表只保留近期文献，历史增长到数百万篇也能常驻页缓存。
+# - 边界: literature_archive_state 记录边界日 boundary_day，归档库只包含发表日 (publication_day) 早于边界日的文献；
+#   热库中仍可能有更早的文献 (例如回填的历史文献)，下一次归档时移走。边界日只前移，不后退
+# - 查询: tables / literature_table / literature_entity 按查询的起始日期选择来源: 从边界日开始或更晚的查询只读热库，
+#   更早的或不限时间的查询读两个库的 UNION ALL (SQLite 把条件下推到两边，各自走索引；能走索引的排序合并两边的有序结果)；
+#   grouped_counts 在每个库上分别分组计数再相加。还没有归档过任何文献时一律只读热库
+# - 快照: 选择来源前先开启读事务 (pysqlite 默认不为 SELECT 开事务)，读边界日与随后的查询看到同一个快照，
+#   边界前移和移动都不会让已经选定"只读热库"的查询漏掉文献；连接第一次写入前结束这个只读事务，写入照常开始
+# - 移动: 每批一个事务 (INSERT INTO archive.literature ... + DELETE)，两个库在同一事务中提交；批与批之间让出写锁。
+#   每批以 BEGIN IMMEDIATE 开始，先拿写锁再读要移动的行。文献 ID 不变；
+#   literature.id 是 AUTOINCREMENT (sqlite_sequence 记录分配过的最大 ID)，已归档或已清除的 ID 不会再分配
+# - 按天的计数汇总 (literature_daily_counts) 与主题文献数都包含归档文献，归档不改变它们，趋势查询不受影响。
+#   热库释放的页由后续写入复用
+# 用法: python literature_archive.py [--hot-days N] [--batch-size N]  (适合放进 cron，与 pubmed.py 的定时抓取一样)
+import argparse
+import logging
+import os
+import re
+import time
+import weakref
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Column, Index, MetaData, Table, event, func, inspect, select, text, union_all
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, aliased
+
+import models
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = "archive"
+BATCH_PAUSE = 0.005  # seconds between batches, lets waiting writers in
+_SNAPSHOT = "literature_archive_snapshot"  # connection info key: a read transaction opened by _read_snapshot
+_WRITE = re.compile(r"\s*(INSERT|UPDATE|DELETE|REPLACE|CREATE|DROP|ALTER)\b", re.IGNORECASE)
+_snapshot_engines: "weakref.WeakSet[Engine]" = weakref.WeakSet()
+
+
+@dataclass
+class ArchiveSettings:
+    path: str = "medbrief_archive.db"
+    hot_days: int = 365
+    batch_size: int = 2000
+
+    @classmethod
+    def from_env(cls) -> "ArchiveSettings":
+        env = os.environ.get
+        return cls(
+            path=env("LITERATURE_ARCHIVE_PATH", cls.path),
+            hot_days=int(env("LITERATURE_HOT_DAYS", cls.hot_days)),
+            batch_size=int(env("LITERATURE_ARCHIVE_BATCH_SIZE", cls.batch_size)),
+        )
+
+
+@dataclass
+class ArchiveResult:
+    moved: int
+    batches: int
+    boundary_day: Optional[int]
+
+
+_hot = models.Literature.__table__
+_state = models.LiteratureArchiveState.__table__
+_metadata = MetaData()
+# Same columns and indexes as the hot table; no foreign key, topics live in the main database
+archived = Table(_hot.name, _metadata, *(Column(c.name, c.type, primary_key=c.primary_key) for c in _hot.columns),
+                 schema=SCHEMA)
+for _index in _hot.indexes:
+    Index(_index.name, *(archived.c[c.name] for c in _index.columns))
+
+_tiers = union_all(select(_hot), select(archived)).subquery("literature_tiers")
+_tiers_entity = aliased(models.Literature, _tiers)
+
+
+def attach(engine: Engine, path: str):
+    """ATTACH the archive to every new connection of a SQLite engine (the file is created when missing)."""
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def _attach(dbapi_connection, connection_record):
+        dbapi_connection.execute(f"ATTACH DATABASE ? AS {SCHEMA}", (path,))
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _end_snapshot_before_write(connection, cursor, statement, parameters, context, executemany):
+        # A read transaction that then writes could not wait for other writers (SQLite reports the deadlock
+        # at once); nothing was written in it yet, so end it and let the write begin its own transaction
+        if connection.info.get(_SNAPSHOT) and _WRITE.match(statement):
+            del connection.info[_SNAPSHOT]
+            dbapi_connection = connection.connection.dbapi_connection
+            if dbapi_connection.in_transaction:
+                dbapi_connection.commit()
+
+    @event.listens_for(engine, "commit")
+    @event.listens_for(engine, "rollback")
+    def _forget_snapshot(connection):
+        connection.info.pop(_SNAPSHOT, None)
+
+    @event.listens_for(engine, "checkin")
+    def _forget_snapshot_on_checkin(dbapi_connection, connection_record):
+        connection_record.info.pop(_SNAPSHOT, None)
+
+    _snapshot_engines.add(engine)
+
+
+def is_attached(connection) -> bool:
+    if connection.dialect.name != "sqlite":
+        return False
+    return any(row[1] == SCHEMA for row in connection.exec_driver_sql("PRAGMA database_list"))
+
+
+def upgrade(connection):
+    """Create the archive table and add missing columns and indexes, like migrations.upgrade does for the hot one."""
+    if not is_attached(connection):
+        return
+    _metadata.create_all(bind=connection)
+    existing = {column["name"] for column in inspect(connection).get_columns(archived.name, schema=SCHEMA)}
+    for column in archived.columns:
+        if column.name not in existing:
+            column_type = column.type.compile(dialect=connection.dialect)
+            connection.execute(text(f"ALTER TABLE {SCHEMA}.{archived.name} ADD COLUMN {column.name} {column_type}"))
+    for index in archived.indexes:
+        index.create(bind=connection, checkfirst=True)
+
+
+def boundary_day(bind) -> Optional[int]:
+    """Day number before which papers may be archived, or None if nothing was ever archived."""
+    return bind.execute(select(_state.c.boundary_day).where(_state.c.id == 1)).scalar()
+
+
+def _read_snapshot(bind):
+    """
+    Open a read transaction unless one is already open, so the boundary and the queries that follow see the
+    same state of both tiers. It lasts until the caller commits, rolls back or first writes.
+    """
+    connection = bind.connection() if isinstance(bind, Session) else bind
+    if connection.engine not in _snapshot_engines:
+        return  # no archive attached: the boundary never moves
+    if connection.get_execution_options().get("isolation_level") == "AUTOCOMMIT":
+        return
+    dbapi_connection = connection.connection.dbapi_connection
+    if not dbapi_connection.in_transaction:
+        dbapi_connection.execute("BEGIN")
+        connection.info[_SNAPSHOT] = True
+
+
+def _hot_only(bind, since: Optional[date]) -> bool:
+    _read_snapshot(bind)
+    boundary = boundary_day(bind)
+    return boundary is None or (since is not None and models.to_day_number(since) >= boundary)
+
+
+def tables(bind, since: Optional[date] = None) -> List[Table]:
+    """The tier tables that can hold papers published on or after since (any time when None)."""
+    return [_hot] if _hot_only(bind, since) else [_hot, archived]
+
+
+def literature_table(bind, since: Optional[date] = None):
+    """The literature table, or the UNION ALL of both tiers when the query reaches archived papers."""
+    return _hot if _hot_only(bind, since) else _tiers
+
+
+def literature_entity(bind, since: Optional[date] = None):
+    """literature_table() for ORM queries: models.Literature, or models.Literature mapped onto both tiers."""
+    return models.Literature if _hot_only(bind, since) else _tiers_entity
+
+
+def grouped_counts(bind, columns: Sequence[str], where: Callable[[Table], Any],
+                   since: Optional[date] = None) -> List[Tuple]:
+    """
+    (*key, count) rows of COUNT(*) grouped by the named columns. Each tier is grouped on its own, so the
+    counts can come from its covering indexes, and the counts are added up.
+    """
+    totals: Dict[Tuple, int] = {}
+    for table in tables(bind, since):
+        keys = [table.c[name] for name in columns]
+        for *key, count in bind.execute(select(*keys, func.count()).where(where(table)).group_by(*keys)):
+            totals[tuple(key)] = totals.get(tuple(key), 0) + count
+    return [(*key, count) for key, count in totals.items()]
+
+
+@contextmanager
+def _write_transaction(engine: Engine):
+    """
+    BEGIN IMMEDIATE: take the write lock before reading the rows to move, so waiting for another writer never
+    turns into a lock upgrade that SQLite can only refuse.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.exec_driver_sql("ROLLBACK")
+            raise
+        connection.exec_driver_sql("COMMIT")
+
+
+def _raise_boundary(engine: Engine, cutoff: int) -> int:
+    with _write_transaction(engine) as connection:
+        boundary = boundary_day(connection)
+        if boundary is None:
+            connection.execute(_state.insert().values(id=1, boundary_day=cutoff, archived_count=0,
+                                                      updated_at=datetime.utcnow()))
+        elif boundary < cutoff:
+            connection.execute(_state.update().where(_state.c.id == 1).values(boundary_day=cutoff,
+                                                                              updated_at=datetime.utcnow()))
+        else:
+            return boundary
+    # Readers pick their tiers inside a read transaction (_read_snapshot): one that saw the old boundary keeps
+    # seeing the papers in the hot table until it ends, so the first batch can move right away
+    return cutoff
+
+
+def _movable(connection, cutoff: int, after_id: int, limit: int) -> List[int]:
+    # Primary key order from the last batch on: one pass over the table however many batches it takes
+    return connection.execute(
+        select(_hot.c.id)
+        .where(_hot.c.id > after_id, _hot.c.publication_day < cutoff)
+        .order_by(_hot.c.id).limit(limit)
+    ).scalars().all()
+
+
+def archive_literature(engine: Engine, settings: Optional[ArchiveSettings] = None,
+                       today: Optional[date] = None) -> ArchiveResult:
+    """Move papers published more than hot_days before today to the archive, batch_size per transaction."""
+    settings = settings or ArchiveSettings.from_env()
+    cutoff = models.to_day_number(today or datetime.utcnow().date()) - settings.hot_days
+    with engine.begin() as connection:
+        if not is_attached(connection):
+            raise RuntimeError("No archive database is attached to this engine")
+        upgrade(connection)
+        if not _movable(connection, cutoff, 0, 1):
+            return ArchiveResult(0, 0, boundary_day(connection))
+
+    boundary = _raise_boundary(engine, cutoff)
+    moved = batches = last_id = 0
+    while True:
+        with _write_transaction(engine) as connection:
+            ids = _movable(connection, cutoff, last_id, settings.batch_size)
+            if not ids:
+                break
+            connection.execute(archived.insert().from_select(list(_hot.c.keys()),
+                                                             select(_hot).where(_hot.c.id.in_(ids))))
+            # Core delete: the daily rollup and topic counts keep counting the archived papers
+            connection.execute(_hot.delete().where(_hot.c.id.in_(ids)))
+            connection.execute(_state.update().where(_state.c.id == 1).values(
+                archived_count=_state.c.archived_count + len(ids), updated_at=datetime.utcnow()))
+        moved += len(ids)
+        batches += 1
+        last_id = ids[-1]
+        time.sleep(BATCH_PAUSE)
+    logger.info("Archived %s papers published before day %s in %s batches", moved, cutoff, batches)
+    return ArchiveResult(moved, batches, boundary)
+
+
+def main():
+    defaults = ArchiveSettings.from_env()
+    parser = argparse.ArgumentParser(description="Move old literature to the archive database.")
+    parser.add_argument("--hot-days", type=int, default=defaults.hot_days,
+                        help=f"keep papers published in the last N days hot (default: {defaults.hot_days})")
+    parser.add_argument("--batch-size", type=int, default=defaults.batch_size, help="papers per transaction")
+    args = parser.parse_args()
+
+    from database import engine
+    import migrations
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    migrations.upgrade(engine)
+    result = archive_literature(engine, ArchiveSettings(defaults.path, args.hot_days, args.batch_size))
+    print(f"moved {result.moved} papers in {result.batches} batches, boundary day {result.boundary_day}")
+
+
+if __name__ == "__main__":
+    main()
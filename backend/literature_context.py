@@ -0,0 +1,161 @@
+# 大纲 Agent 的文献上下文
+# 生成 PPT 大纲之前，从主题已跟踪的文献中挑出时间段内最相关的若干篇，压缩后放进提示词，
+# 让 Agent 基于这些文献组织大纲，不必自己从头检索:
+# - 候选: 时间段内按 relevance_score (无分数的排在最后) 和发表日期排序的前 max_candidates 篇，只读取需要的列
+# - 去重: 相同 PMID，或标题规范化后相同 / 词集合 Jaccard 相似度不低于 DUPLICATE_JACCARD 的文献只保留最相关的一篇
+# - 压缩: 每篇一行: 标题 | 规范文献类型 | 期刊 年份 | PMID | 摘要中的关键发现 (结论句优先，其次含结果数据的句子)
+# - 装箱: 按相关性依次放入，估算的 token 数不超过预算 (放不下的跳过，继续尝试后面更短的；剩余预算放不下任何一行时停止)
+# token 数按快速估算: 中日韩字符每字 1 个，其余每 4 个字符 1 个，无需加载分词器。
+import math
+import os
+import re
+from dataclasses import dataclass, field
+from datetime import date, datetime, time
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+import literature_archive
+import literature_types
+
+DUPLICATE_JACCARD = 0.85
+MIN_LINE_TOKENS = 12  # shorter than any line: below this the budget is spent
+
+_CJK = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿]")
+_WORD = re.compile(r"[^\W_]+")
+_SENTENCE_END = re.compile(r"(?<=[.!?。！？])\s+|(?<=[。！？])")
+_CONCLUSION = re.compile(r"\bconclusions?\b|\bwe conclude\b|\bin summary\b|结论|总之", re.IGNORECASE)
+_RESULT = re.compile(r"\d+(\.\d+)?\s*%|\b(hr|or|rr)\b|95%\s*ci|\bp\s*[<=]|signific|improv|reduc|increas|prolong|"
+                     r"associated|superior|non-?inferior|efficacy|response rate|survival|显著|提高|降低|延长",
+                     re.IGNORECASE)
+
+
+@dataclass
+class ContextSettings:
+    token_budget: int = 2000
+    max_candidates: int = 300
+    finding_chars: int = 220
+    period_days: int = 365  # default period: the year before the deck
+
+    @classmethod
+    def from_env(cls) -> "ContextSettings":
+        env = os.environ.get
+        return cls(
+            token_budget=int(env("LITERATURE_CONTEXT_TOKENS", cls.token_budget)),
+            max_candidates=int(env("LITERATURE_CONTEXT_CANDIDATES", cls.max_candidates)),
+            finding_chars=int(env("LITERATURE_CONTEXT_FINDING_CHARS", cls.finding_chars)),
+            period_days=int(env("LITERATURE_CONTEXT_PERIOD_DAYS", cls.period_days)),
+        )
+
+
+@dataclass
+class PackedContext:
+    text: str
+    tokens: int
+    literature_ids: List[int] = field(default_factory=list)
+    candidates: int = 0
+    duplicates: int = 0
+    skipped: int = 0  # papers that did not fit the budget
+
+
+def estimate_tokens(text: str) -> int:
+    cjk = len(_CJK.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def key_finding(summary: Optional[str], max_chars: int) -> str:
+    """The summary's conclusion, else its sentence with the most result cues, else its first sentence."""
+    sentences = [s.strip() for s in _SENTENCE_END.split(" ".join((summary or "").split())) if s.strip()]
+    if not sentences:
+        return ""
+    conclusions = [s for s in sentences if _CONCLUSION.search(s)]
+    if conclusions:
+        finding = conclusions[-1]
+    else:
+        finding = max(sentences, key=lambda s: len(_RESULT.findall(s)))  # first sentence on ties
+    finding = re.sub(r"^(conclusions?|结论)\s*[:：]\s*", "", finding, flags=re.IGNORECASE)
+    if len(finding) > max_chars:
+        finding = finding[:max_chars - 1].rsplit(" ", 1)[0].rstrip(",;:") + "…"
+    return finding
+
+
+def _title_words(title: Optional[str]) -> frozenset:
+    return frozenset(_WORD.findall((title or "").casefold()))
+
+
+def _is_duplicate(words: frozenset, kept: Dict[int, List[frozenset]]) -> bool:
+    # Jaccard >= J needs the smaller set to hold at least J of the larger one: only compare those sizes
+    size = len(words)
+    for other_size in range(math.ceil(size * DUPLICATE_JACCARD), math.floor(size / DUPLICATE_JACCARD) + 1):
+        for other in kept.get(other_size, ()):
+            union = len(words | other)
+            if union and len(words & other) / union >= DUPLICATE_JACCARD:
+                return True
+    return False
+
+
+def _line(number: int, row, finding: str) -> str:
+    year = row.publication_date.year if row.publication_date else ""
+    parts = [f"{number}. {' '.join((row.title or '').split())}", literature_types.label(row.type_code),
+             f"{row.journal_name or ''} {year}".strip()]
+    if row.pmid:
+        parts.append(f"PMID {row.pmid}")
+    if finding:
+        parts.append(finding)
+    return " | ".join(parts)
+
+
+def pack_topic(db: Session, topic_id: int, start: date, end: date,
+               settings: Optional[ContextSettings] = None) -> PackedContext:
+    """The period's most relevant papers of a topic, deduplicated and compressed into the token budget."""
+    settings = settings or ContextSettings.from_env()
+    literature = literature_archive.literature_entity(db, since=start)  # a recent period reads the hot table only
+    rows = (
+        db.query(literature.id, literature.title, literature.summary, literature.type_code, literature.journal_name,
+                 literature.publication_date, literature.pmid)
+        .filter(literature.topic_id == topic_id,
+                literature.publication_date >= datetime.combine(start, time.min),
+                literature.publication_date <= datetime.combine(end, time.max))
+        .order_by(literature.relevance_score.is_(None), literature.relevance_score.desc(),
+                  literature.publication_date.desc(), literature.id.desc())
+        .limit(settings.max_candidates)
+        .all()
+    )
+
+    header = f"以下是本主题 {start:%Y-%m-%d} 至 {end:%Y-%m-%d} 期间最相关的文献（按相关性排序，格式: 标题 | 类型 | 期刊 年份 | PMID | 关键发现）:"
+    lines, tokens = [header], estimate_tokens(header) + 1
+    packed = PackedContext(text="", tokens=0, candidates=len(rows))
+    seen_pmids, kept_titles = set(), {}
+    for index, row in enumerate(rows):
+        if settings.token_budget - tokens < MIN_LINE_TOKENS:
+            packed.skipped += len(rows) - index  # not deduplicated any more
+            break
+        words = _title_words(row.title)
+        if (row.pmid and row.pmid in seen_pmids) or _is_duplicate(words, kept_titles):
+            packed.duplicates += 1
+            continue
+        if row.pmid:
+            seen_pmids.add(row.pmid)
+        kept_titles.setdefault(len(words), []).append(words)
+
+        line = _line(len(packed.literature_ids) + 1, row, key_finding(row.summary, settings.finding_chars))
+        cost = estimate_tokens(line) + 1  # the newline
+        if tokens + cost > settings.token_budget:
+            packed.skipped += 1
+            continue
+        lines.append(line)
+        tokens += cost
+        packed.literature_ids.append(row.id)
+
+    if not packed.literature_ids:
+        return packed
+    packed.text = "\n".join(lines)
+    packed.tokens = tokens
+    return packed
+
+
+def outline_prompt(topic: str, context: PackedContext) -> str:
+    """The outline agent's prompt: the topic, plus the packed literature when there is any."""
+    if not context.text:
+        return topic
+    return f"{topic}\n\n{context.text}\n\n请优先依据以上文献组织大纲，并在相关要点后注明文献编号。"
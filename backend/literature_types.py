@@ -0,0 +1,95 @@
+# 文献类型规范化
+# literature_type 是来源提供的自由文本 ("Clinical Trial"、"Phase 3 trial"、"Randomized Controlled Trial" ...)，
+# 入库时按规则表归入少数几个规范类型，存为整数代码 literature.type_code (与 topic_id 组成复合索引)，
+# 统计和分布直接按代码分组，不再对自由文本做前置通配符的 ilike 扫描。
+# 规则按顺序匹配 literature_type，第一条命中的规则决定类型；都不命中时再用同样的规则匹配标题，仍不命中则为 OTHER。
+import re
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import bindparam, select, update
+
+OTHER = 0
+CLINICAL_TRIAL = 1
+META_ANALYSIS = 2
+SYSTEMATIC_REVIEW = 3
+REVIEW = 4
+GUIDELINE = 5
+REAL_WORLD = 6
+CASE_REPORT = 7
+PRECLINICAL = 8
+COMMENTARY = 9
+
+LABELS = {
+    OTHER: "Other",
+    CLINICAL_TRIAL: "Clinical Trial",
+    META_ANALYSIS: "Meta-analysis",
+    SYSTEMATIC_REVIEW: "Systematic Review",
+    REVIEW: "Review",
+    GUIDELINE: "Guideline",
+    REAL_WORLD: "Real-world Study",
+    CASE_REPORT: "Case Report",
+    PRECLINICAL: "Preclinical Study",
+    COMMENTARY: "Commentary",
+}
+
+# Order matters: "systematic review and meta-analysis" is a meta-analysis, "review of trials" a review
+RULES: List[Tuple[int, "re.Pattern"]] = [(code, re.compile(pattern, re.IGNORECASE)) for code, pattern in [
+    (META_ANALYSIS, r"meta[\s-]?analys[ie]s|pooled analysis"),
+    (SYSTEMATIC_REVIEW, r"systematic (literature )?review|umbrella review"),
+    (GUIDELINE, r"guideline|consensus|recommendation|position (paper|statement)"),
+    (CLINICAL_TRIAL, r"clinical trial|\btrial\b|\bphase\s*(i{1,3}v?|[1-4])\b|\brct\b|randomi[sz]ed"),
+    (REAL_WORLD, r"real[\s-]?world|observational|cohort|registry|retrospective|prospective|database study"
+                 r"|population[\s-]based|epidemiolog"),
+    (CASE_REPORT, r"case (report|series)"),
+    (PRECLINICAL, r"preclinical|pre-clinical|mechanis|in vitro|in vivo|animal|murine|mouse|xenograft|cell line"),
+    (REVIEW, r"review|overview"),
+    (COMMENTARY, r"letter|editorial|comment|perspective|correspondence|erratum"),
+]]
+
+
+def _match(text: Optional[str]) -> Optional[int]:
+    if not text:
+        return None
+    for code, pattern in RULES:
+        if pattern.search(text):
+            return code
+    return None
+
+
+def classify(literature_type: Optional[str], title: Optional[str] = None) -> int:
+    """Canonical type code of a paper: its stated type first, then its title, else OTHER."""
+    code = _match(literature_type)
+    if code is None:
+        code = _match(title)
+    return OTHER if code is None else code
+
+
+def label(code: Optional[int]) -> str:
+    return LABELS.get(code, LABELS[OTHER])
+
+
+def backfill(connection, batch_size: int = 5000):
+    """Classify literature stored before type codes existed (or written by Core inserts)."""
+    from models import Literature
+
+    literature = Literature.__table__
+    statement = (update(literature).where(literature.c.id == bindparam("row_id"))
+                 .values(type_code=bindparam("code")))
+    while True:
+        rows = connection.execute(
+            select(literature.c.id, literature.c.literature_type, literature.c.title)
+            .where(literature.c.type_code.is_(None)).limit(batch_size)
+        ).all()
+        if not rows:
+            return
+        connection.execute(statement, [{"row_id": row_id, "code": classify(literature_type, title)}
+                                       for row_id, literature_type, title in rows])
+
+
+def counts_by_label(type_counts: Sequence[Tuple[Optional[int], int]]) -> List[Tuple[str, int]]:
+    """(label, count) per canonical type, largest first; unclassified rows count as OTHER."""
+    totals = {}
+    for code, count in type_counts:
+        code = OTHER if code is None else code
+        totals[code] = totals.get(code, 0) + count
+    return [(label(code), count) for code, count in sorted(totals.items(), key=lambda item: (-item[1], item[0]))]
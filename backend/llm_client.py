@@ -0,0 +1,133 @@
+# 异步 LLM 访问层 (OpenAI 兼容接口)
+# - 并发上限: 同时进行的请求不超过 concurrency 个；另有令牌桶按 requests_per_second 限流
+# - 重试: 429、5xx 和连接错误按指数退避重试 (ratelimit.retry_with_backoff)，其余错误直接抛出
+# - 缓存: 以 (模型, 消息, 温度) 的 SHA-256 为键，把回答持久化到本地 SQLite 文件，相同的请求不再访问接口；
+#   同时进行的相同请求只发出一次
+# 通过 OPENAI_BASE_URL 可以指向任意 OpenAI 兼容服务，测试中指向 stubs.LocalOpenAIServer
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import openai
+
+from ratelimit import RetryableError, TokenBucket, retry_with_backoff
+
+Messages = List[Dict[str, str]]
+
+
+@dataclass
+class LLMSettings:
+    base_url: Optional[str] = None  # None uses the OpenAI default
+    api_key: Optional[str] = None
+    model: str = "gpt-4o"
+    temperature: float = 0.0
+    concurrency: int = 8
+    requests_per_second: float = 5.0
+    attempts: int = 5
+    backoff_base: float = 1.0
+    timeout: float = 120.0
+    cache_path: Optional[str] = "llm_cache.db"  # None disables the persistent cache
+
+    @classmethod
+    def from_env(cls) -> "LLMSettings":
+        env = os.environ.get
+        return cls(
+            base_url=env("OPENAI_BASE_URL"),
+            api_key=env("OPENAI_API_KEY"),
+            model=env("LLM_MODEL", cls.model),
+            concurrency=int(env("LLM_CONCURRENCY", cls.concurrency)),
+            requests_per_second=float(env("LLM_REQUESTS_PER_SECOND", cls.requests_per_second)),
+            cache_path=env("LLM_CACHE_PATH", cls.cache_path) or None,
+        )
+
+
+def prompt_key(model: str, messages: Messages, temperature: float) -> str:
+    payload = json.dumps({"model": model, "messages": messages, "temperature": temperature},
+                         ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Completed responses by prompt hash, in a small SQLite file shared by all processes."""
+
+    def __init__(self, path: str):
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at TEXT)")
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._connection.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, response: str):
+        with self._lock:
+            self._connection.execute("INSERT OR REPLACE INTO responses (key, response, created_at) VALUES (?, ?, ?)",
+                                     (key, response, datetime.utcnow().isoformat()))
+
+    def close(self):
+        self._connection.close()
+
+
+class LLMClient:
+    def __init__(self, settings: Optional[LLMSettings] = None):
+        self.settings = settings or LLMSettings.from_env()
+        # Retries are ours, so they share the rate limit and backoff with every other request
+        self._client = openai.AsyncOpenAI(base_url=self.settings.base_url, api_key=self.settings.api_key or "none",
+                                          max_retries=0, timeout=self.settings.timeout)
+        self._semaphore = asyncio.Semaphore(self.settings.concurrency)
+        self._bucket = TokenBucket(self.settings.requests_per_second)
+        self.cache = ResponseCache(self.settings.cache_path) if self.settings.cache_path else None
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.requests_sent = 0
+
+    async def close(self):
+        await self._client.close()
+        if self.cache:
+            self.cache.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _request(self, messages: Messages) -> str:
+        async with self._semaphore:
+            await self._bucket.acquire()
+            self.requests_sent += 1
+            try:
+                response = await self._client.chat.completions.create(
+                    model=self.settings.model, messages=messages, temperature=self.settings.temperature)
+            except (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError) as exc:
+                raise RetryableError(str(exc)) from exc
+        return response.choices[0].message.content or ""
+
+    async def complete(self, messages: Messages) -> str:
+        """The model's answer to a chat, from the cache when the same prompt was answered before."""
+        key = prompt_key(self.settings.model, messages, self.settings.temperature)
+        if self.cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        # The shared request runs in its own task, so a cancelled caller does not cancel the other waiters
+        task = self._in_flight.get(key)
+        if task is None:
+            task = self._in_flight[key] = asyncio.ensure_future(self._complete(key, messages))
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _complete(self, key: str, messages: Messages) -> str:
+        answer = await retry_with_backoff(lambda: self._request(messages), attempts=self.settings.attempts,
+                                          base_delay=self.settings.backoff_base)
+        if self.cache:
+            self.cache.put(key, answer)
+        return answer
@@ -1,17 +1,41 @@
-from fastapi import FastAPI, Depends, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, BackgroundTasks, Depends, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import StreamingResponse
+import httpx
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from datetime import date
 import crud
-import models
+import export
+import migrations
+import notifications
+import ppt_files
+import profiling
+import pubmed
 import schemas
+import singleflight
+import topic_deletion
+import topic_registry
+import update_cycle
 from database import SessionLocal, engine
+from ratelimit import RetryableError
 
 
-models.Base.metadata.create_all(bind=engine)
+migrations.upgrade(engine)
 
-app = FastAPI(title="MedBrief Backend")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    db = SessionLocal()
+    try:
+        topic_registry.load(db)
+    finally:
+        db.close()
+    topic_deletion.start_pending_purges(engine)
+    yield
+
+app = FastAPI(title="MedBrief Backend", lifespan=lifespan)
 
 # CORS Middleware
 app.add_middleware(
@@ -22,7 +46,12 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
-app.mount("/PPT", StaticFiles(directory="PPT"), name="ppt")
+# Opt-in per-request profiling (PROFILING_ENABLED + PROFILING_TOKEN); not mounted at all otherwise
+profiling_settings = profiling.ProfilingSettings.from_env()
+if profiling_settings.enabled:
+    app.add_middleware(profiling.ProfilingMiddleware, engine=engine, settings=profiling_settings)
+
+app.mount("/PPT", ppt_files.DeckFiles(directory=ppt_files.PPT_DIRECTORY), name="ppt")
 
 # Dependency to get the database session
 def get_db():
@@ -32,6 +61,16 @@ def get_db():
     finally:
         db.close()
 
+def literature_fields(fields: Optional[str] = Query(None, description="Comma-separated literature fields to return (id is always included)")):
+    """Sparse fieldset of the literature list endpoints; None means every field."""
+    if fields is None:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = sorted(set(names) - set(schemas.LITERATURE_FIELDS))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown literature fields: {', '.join(unknown)}")
+    return names
+
 
 # --- Topic Management API ---
 
@@ -47,7 +86,7 @@ def list_topics(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     """
     Get a list of all topics.
     """
-    topics = crud.get_topics(db, skip=skip, limit=limit)
+    topics = topic_registry.list_topics(db, skip=skip, limit=limit)
     return topics
 
 @app.get("/topics/{topic_id}", response_model=schemas.Topic)
@@ -55,7 +94,7 @@ def get_topic(topic_id: int, db: Session = Depends(get_db)):
     """
     Get details of a specific topic.
     """
-    db_topic = crud.get_topic(db, topic_id=topic_id)
+    db_topic = topic_registry.get(db, topic_id=topic_id)
     if db_topic is None:
         raise HTTPException(status_code=404, detail="Topic not found")
     return db_topic
@@ -71,12 +110,13 @@ def update_topic(topic_id: int, topic: schemas.TopicCreate, db: Session = Depend
     return db_topic
 
 @app.delete("/topics/{topic_id}", status_code=204)
-def delete_topic(topic_id: int, db: Session = Depends(get_db)):
+def delete_topic(topic_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     """
-    Delete a topic.
+    Delete a topic. It disappears at once; its literature and records are purged in the background.
     """
     if not crud.delete_topic(db, topic_id=topic_id):
         raise HTTPException(status_code=404, detail="Topic not found")
+    background_tasks.add_task(topic_deletion.purge_topic, engine, topic_id)
     return
 
 @app.get("/topics/{topic_id}/history", response_model=schemas.TopicHistory)
@@ -84,28 +124,221 @@ def get_topic_update_history(topic_id: int, db: Session = Depends(get_db)):
     """
     Get the update history for a topic.
     """
-    db_topic = crud.get_topic(db, topic_id=topic_id)
-    if db_topic is None:
+    if not topic_registry.exists(db, topic_id=topic_id):
         raise HTTPException(status_code=404, detail="Topic not found")
-    
+
     updates = crud.get_topic_history(db, topic_id=topic_id)
     return schemas.TopicHistory(topic_id=topic_id, updates=updates)
 
+@app.get("/topics/{topic_id}/snapshots", response_model=List[schemas.AnalysisSnapshotInfo])
+def list_topic_snapshots(topic_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    """
+    List the analysis snapshots frozen by the topic's successful update cycles, newest first.
+    """
+    if not topic_registry.exists(db, topic_id=topic_id):
+        raise HTTPException(status_code=404, detail="Topic not found")
+    return crud.get_snapshots(db, topic_id=topic_id, skip=skip, limit=limit)
+
+@app.get("/topics/{topic_id}/snapshots/{snapshot_id}", response_model=schemas.AnalysisSnapshot)
+def get_topic_snapshot(topic_id: int, snapshot_id: int, granularity: schemas.TrendGranularity = "month",
+                       start_date: Optional[date] = None, end_date: Optional[date] = None,
+                       include_literature_ids: bool = False, db: Session = Depends(get_db)):
+    """
+    Get the stats, trend and distribution of a topic as they were when the snapshot was taken.
+    """
+    if not topic_registry.exists(db, topic_id=topic_id):
+        raise HTTPException(status_code=404, detail="Topic not found")
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+    snapshot = crud.get_snapshot_analysis(db, topic_id=topic_id, snapshot_id=snapshot_id, granularity=granularity,
+                                          start_date=start_date, end_date=end_date,
+                                          include_literature_ids=include_literature_ids)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    return snapshot
+
+@app.get("/topics/{topic_id}/snapshots/{snapshot_id}/diff/{other_snapshot_id}",
+         response_model=schemas.AnalysisSnapshotDiff)
+def diff_topic_snapshots(topic_id: int, snapshot_id: int, other_snapshot_id: int,
+                         granularity: schemas.TrendGranularity = "month",
+                         start_date: Optional[date] = None, end_date: Optional[date] = None,
+                         db: Session = Depends(get_db)):
+    """
+    Compare two snapshots of a topic: the changes from snapshot_id to other_snapshot_id.
+    """
+    if not topic_registry.exists(db, topic_id=topic_id):
+        raise HTTPException(status_code=404, detail="Topic not found")
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+    diff = crud.diff_snapshots(db, topic_id=topic_id, before_id=snapshot_id, after_id=other_snapshot_id,
+                               granularity=granularity, start_date=start_date, end_date=end_date)
+    if diff is None:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    return diff
+
+@app.post("/topics/{topic_id}/update-cycle", response_model=schemas.UpdateRecord)
+def run_topic_update_cycle(topic_id: int, db: Session = Depends(get_db)):
+    """
+    Run an incremental update cycle for a topic: only literature after its watermark is processed.
+    """
+    def run():
+        record = update_cycle.run_update_cycle(db, topic_id=topic_id)
+        return None if record is None else schemas.UpdateRecord.model_validate(record)
+
+    # A second click while the cycle runs gets the same record instead of starting another cycle
+    record = singleflight.group("update-cycle").do(topic_id, run)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Topic not found")
+    return record
+
 
 # --- Literature Updates API ---
 
-@app.get("/topics/{topic_id}/literature-analysis", response_model=schemas.LiteratureAnalysis)
-def get_literature_analysis_for_topic(topic_id: int, skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
+@app.get("/topics/{topic_id}/literature-analysis", response_model=schemas.LiteratureAnalysis,
+         response_model_exclude_unset=True)
+def get_literature_analysis_for_topic(topic_id: int, skip: int = 0, limit: int = 10,
+                                      order_by: schemas.LiteratureOrder = "date",
+                                      fields: Optional[List[str]] = Depends(literature_fields),
+                                      summary_length: Optional[int] = Query(None, ge=0),
+                                      db: Session = Depends(get_db)):
     """
     Get literature analysis for a specific topic.
     """
-    db_topic = crud.get_topic(db, topic_id=topic_id)
-    if db_topic is None:
+    if not topic_registry.exists(db, topic_id=topic_id):
         raise HTTPException(status_code=404, detail="Topic not found")
-    
-    analysis_data = crud.get_literature_analysis(db, topic_id=topic_id, skip=skip, limit=limit)
+
+    key = (topic_id, skip, limit, order_by, tuple(sorted(set(fields))) if fields else None, summary_length)
+    analysis_data = singleflight.group("literature-analysis").do(key, lambda: crud.get_literature_analysis(
+        db, topic_id=topic_id, skip=skip, limit=limit, order_by=order_by, fields=fields, summary_length=summary_length))
     return analysis_data
 
+@app.get("/topics/{topic_id}/literature/export")
+def export_topic_literature(topic_id: int, format: schemas.ExportFormat = "csv", db: Session = Depends(get_db)):
+    """
+    Stream every paper of a topic as CSV, NDJSON or Parquet, in constant memory.
+    """
+    if not topic_registry.exists(db, topic_id=topic_id):
+        raise HTTPException(status_code=404, detail="Topic not found")
+
+    media_type, extension = export.FORMATS[format]
+    return StreamingResponse(
+        export.stream_export(engine, topic_id, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="topic_{topic_id}_literature.{extension}"'},
+    )
+
+@app.post("/topics/{topic_id}/fetch", response_model=schemas.LiteratureFetchResult)
+async def fetch_topic_literature(topic_id: int):
+    """
+    Fetch the topic's new PubMed papers since its last fetch and add them to its literature.
+    """
+    async def fetch():
+        # Its own session: the fetch outlives the request that started it when that request is cancelled
+        db = SessionLocal()
+        try:
+            async with pubmed.EutilsClient() as client:
+                return await pubmed.fetch_topic(db, topic_id, client)
+        finally:
+            db.close()
+
+    try:
+        result = await singleflight.group("pubmed-fetch").do_async(topic_id, fetch)
+    except (httpx.HTTPError, RetryableError) as exc:
+        raise HTTPException(status_code=502, detail=f"PubMed fetch failed: {exc}")
+    if result is None:
+        raise HTTPException(status_code=404, detail="Topic not found")
+    return result
+
+@app.get("/literature/{literature_id}", response_model=schemas.LiteratureDetail)
+def get_literature(literature_id: int, db: Session = Depends(get_db)):
+    """
+    Get one paper with all its fields, e.g. its full summary when a list row is expanded.
+    """
+    literature = crud.get_literature(db, literature_id=literature_id)
+    if literature is None:
+        raise HTTPException(status_code=404, detail="Literature not found")
+    return literature
+
+@app.get("/literature/{literature_id}/similar", response_model=List[schemas.SimilarLiterature],
+         response_model_exclude_unset=True)
+def get_similar_literature(literature_id: int, k: int = Query(10, ge=1, le=100),
+                           fields: Optional[List[str]] = Depends(literature_fields),
+                           summary_length: Optional[int] = Query(None, ge=0), db: Session = Depends(get_db)):
+    """
+    Get the papers most similar to a paper, across all topics (approximate nearest neighbours).
+    """
+    similar = crud.get_similar_literature(db, literature_id=literature_id, k=k, fields=fields,
+                                          summary_length=summary_length)
+    if similar is None:
+        raise HTTPException(status_code=404, detail="Literature not found")
+    return similar
+
+@app.post("/literature/route", response_model=List[schemas.TopicAssignment])
+def route_literature(papers: List[schemas.PaperText], min_score: float = Query(0.0, ge=0.0, le=1.0),
+                     db: Session = Depends(get_db)):
+    """
+    Assign papers to every topic whose keywords (or their synonyms) they mention, with a score in (0, 1].
+    Nothing is stored.
+    """
+    return crud.route_literature(db, papers, min_score=min_score)
+
+@app.get("/literature-analysis/batch", response_model=List[schemas.TopicAnalysisSummary])
+def get_literature_analysis_batch(topic_ids: Optional[List[int]] = Query(None), granularity: schemas.TrendGranularity = "month",
+                                  start_date: Optional[date] = None, end_date: Optional[date] = None,
+                                  db: Session = Depends(get_db)):
+    """
+    Get stats, trends and distributions for several topics in one request (all topics if topic_ids is omitted).
+    """
+    if topic_ids:
+        topic_ids = list(dict.fromkeys(topic_ids))
+        if not topic_registry.all_exist(db, topic_ids):
+            raise HTTPException(status_code=404, detail="Topic not found")
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+
+    # The same topics asked in any order share one computation; each caller gets them in its own order
+    shared_ids = tuple(sorted(set(topic_ids))) if topic_ids else None
+    key = (shared_ids, granularity, start_date, end_date)
+    summaries = singleflight.group("literature-analysis-batch").do(key, lambda: crud.get_literature_analysis_batch(
+        db, topic_ids=list(shared_ids) if shared_ids else None, granularity=granularity, start_date=start_date,
+        end_date=end_date))
+    if topic_ids:
+        by_topic = {summary.topic_id: summary for summary in summaries}
+        summaries = [by_topic[topic_id] for topic_id in topic_ids]
+    return summaries
+
+@app.get("/topics/{topic_id}/trend", response_model=List[schemas.TrendDataPoint])
+def get_literature_trend_for_topic(topic_id: int, granularity: schemas.TrendGranularity = "month",
+                                   start_date: Optional[date] = None, end_date: Optional[date] = None,
+                                   db: Session = Depends(get_db)):
+    """
+    Get the publication trend of a topic, bucketed by day/week/month/quarter/year.
+    """
+    if not topic_registry.exists(db, topic_id=topic_id):
+        raise HTTPException(status_code=404, detail="Topic not found")
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+
+    key = (topic_id, granularity, start_date, end_date)
+    return singleflight.group("trend").do(key, lambda: crud.get_literature_trend(
+        db, topic_id=topic_id, granularity=granularity, start_date=start_date, end_date=end_date))
+
+@app.get("/topics/{topic_id}/keyword-trends", response_model=schemas.KeywordTrends)
+def get_keyword_trends_for_topic(topic_id: int, period_days: int = Query(90, ge=1, le=3650),
+                                 end_date: Optional[date] = None, top_k: int = Query(20, ge=1, le=200),
+                                 min_count: int = Query(2, ge=1), include_text: bool = False,
+                                 db: Session = Depends(get_db)):
+    """
+    Get keyword co-occurrence and emerging keywords for a topic.
+    """
+    if not topic_registry.exists(db, topic_id=topic_id):
+        raise HTTPException(status_code=404, detail="Topic not found")
+
+    key = (topic_id, period_days, end_date, top_k, min_count, include_text)
+    return singleflight.group("keyword-trends").do(key, lambda: crud.get_keyword_trends(
+        db, topic_id=topic_id, period_days=period_days, end_date=end_date, top_k=top_k, min_count=min_count,
+        include_text=include_text))
+
 
 # --- PPT Push History API ---
 
@@ -116,6 +349,62 @@ def get_ppt_push_history(skip: int = 0, limit: int = 100, db: Session = Depends(
     """
     return crud.get_ppt_push_history(db, skip=skip, limit=limit)
 
+async def _deliver_push_records(record_ids: List[int]):
+    db = SessionLocal()
+    try:
+        await notifications.deliver_pending(db, record_ids=record_ids)
+    finally:
+        db.close()
+
+@app.post("/topics/{topic_id}/push", response_model=List[schemas.PPTPushRecord], status_code=202)
+def push_ppt(topic_id: int, push: schemas.PPTPushRequest, background_tasks: BackgroundTasks,
+             db: Session = Depends(get_db)):
+    """
+    Push a generated PPT to the recipients over every notification channel of the topic.
+    Records are created as pending and updated once delivery finishes in the background.
+    """
+    db_topic = crud.get_topic(db, topic_id=topic_id)
+    if db_topic is None:
+        raise HTTPException(status_code=404, detail="Topic not found")
+    if ppt_files.deck_path(push.ppt_filename) is None:
+        raise HTTPException(status_code=404, detail="PPT not found")
+
+    records = notifications.create_push_records(db, db_topic, push.ppt_filename, push.recipients)
+    background_tasks.add_task(_deliver_push_records, [record.id for record in records])
+    return records
+
+@app.get("/ppt/{filename}/preview", response_model=schemas.PPTPreview)
+def get_ppt_preview(filename: str, request: Request, response: Response):
+    """
+    Get the text outline of a generated PPT, built once per deck and cached on disk.
+    """
+    try:
+        preview = ppt_files.get_preview(filename)
+    except ppt_files.DeckTooLarge:
+        raise HTTPException(status_code=413, detail="PPT too large to preview")
+    except ppt_files.DeckUnreadable:
+        raise HTTPException(status_code=422, detail="PPT file cannot be read")
+    if preview is None:
+        raise HTTPException(status_code=404, detail="PPT not found")
+
+    etag = ppt_files.preview_etag(preview["content_hash"])
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"etag": etag})
+    response.headers["etag"] = etag
+    response.headers["cache-control"] = ppt_files.REVALIDATE_CACHE_CONTROL
+    return preview
+
+
+
+# --- Metrics ---
+
+@app.get("/metrics/coalescing", response_model=List[schemas.CoalescingStats])
+def get_coalescing_metrics():
+    """
+    Per coalescing group of this worker: calls, computations actually run, and calls that shared another's result.
+    """
+    return [schemas.CoalescingStats(**vars(stats)) for stats in singleflight.stats()]
+
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,175 @@
+# 轻量级的数据库结构升级，没有引入 Alembic
+# create_all 只会创建缺失的表，已有的 medbrief.db 不会得到新增的列和索引，
+# 这里补齐缺失的列、索引，并执行一次性的数据回填。
+# 已有数据库切换到 auto_vacuum=INCREMENTAL 需要一次 VACUUM 重写整个文件，把 literature 表重建为 AUTOINCREMENT
+# 需要复制整张表，这两步都不在启动时执行，停服后运行一次: python migrations.py
+# (新建的数据库在建表时直接使用 INCREMENTAL 和 AUTOINCREMENT；启动时发现旧表只记录警告)
+import logging
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateTable
+import cache_bus
+import literature_archive
+import literature_types
+import models
+import relevance
+import similarity
+import topic_deletion
+
+logger = logging.getLogger(__name__)
+import trends
+
+
+def _seed_daily_counts(conn):
+    rollup_rows = conn.execute(text("SELECT COUNT(*) FROM literature_daily_counts")).scalar()
+    if not rollup_rows:
+        trends.rebuild_daily_counts(conn)
+
+
+def _seed_topic_summaries(conn):
+    # 新增的汇总列为空的主题，一次性从明细表计算；之后由 models 中的映射事件维护
+    conn.execute(text("""
+        UPDATE topics SET literature_count = (SELECT COUNT(*) FROM literature WHERE literature.topic_id = topics.id)
+        WHERE literature_count IS NULL
+    """))
+    conn.execute(text("""
+        UPDATE topics SET
+            last_update_status = (SELECT status FROM update_records WHERE topic_id = topics.id
+                                  ORDER BY timestamp DESC, id DESC LIMIT 1),
+            last_update_time = (SELECT MAX(timestamp) FROM update_records WHERE topic_id = topics.id),
+            latest_ppt_link = (SELECT ppt_preview_link FROM update_records
+                               WHERE topic_id = topics.id AND ppt_preview_link IS NOT NULL
+                               ORDER BY timestamp DESC, id DESC LIMIT 1)
+        WHERE last_update_time IS NULL
+    """))
+    conn.execute(text("""
+        UPDATE topics SET last_push_time = (SELECT MAX(push_time) FROM ppt_push_records
+                                            WHERE topic_id = topics.id AND status = 'success')
+        WHERE last_push_time IS NULL
+    """))
+
+
+# 每一项都是幂等的 SQL 或接收连接的函数，只处理尚未回填的数据
+BACKFILLS = [
+    # publication_day = 1970-01-01 以来的天数，与 models.to_day_number 一致；先取日期，1970 年以前的时刻也按天向下取整
+    """
+    UPDATE literature
+    SET publication_day = CAST(julianday(date(publication_date)) - 2440587.5 AS INTEGER)
+    WHERE publication_day IS NULL AND publication_date IS NOT NULL
+    """,
+    _seed_daily_counts,
+    relevance.backfill,
+    literature_types.backfill,
+    # 推送记录按主题名称关联到主题
+    """
+    UPDATE ppt_push_records
+    SET topic_id = (SELECT MIN(id) FROM topics WHERE topics.name = ppt_push_records.topic_name)
+    WHERE topic_id IS NULL
+    """,
+    _seed_topic_summaries,
+]
+
+
+def _literature_id_floor(conn) -> int:
+    # Highest literature id anything may still refer to: rows of either tier, and every stored id watermark
+    # Runs before the missing columns are added: watermark columns of older databases may not exist yet
+    inspector = inspect(conn)
+    floors = [conn.execute(text(f"SELECT MAX({column}) FROM {table}")).scalar() or 0
+              for table, column in (("literature", "id"), ("update_records", "to_literature_id"),
+                                    ("topics", "last_reported_literature_id"),
+                                    ("analysis_snapshots", "to_literature_id"))
+              if column in {c["name"] for c in inspector.get_columns(table)}]
+    if literature_archive.is_attached(conn):
+        floors.append(conn.execute(text(f"SELECT MAX(id) FROM {literature_archive.SCHEMA}.literature")).scalar() or 0)
+    return max(floors + [similarity.indexed_watermark()])
+
+
+def _has_autoincrement_ids(conn) -> bool:
+    sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'literature'")).scalar()
+    return "AUTOINCREMENT" in sql.upper()
+
+
+def rebuild_literature_with_autoincrement(engine) -> bool:
+    """
+    Rebuild a literature table created before its ids were AUTOINCREMENT (SQLite cannot alter a primary key):
+    copy into a new table, swap it in, and start the id sequence above every id in use or remembered.
+    Copies the whole table in one write transaction, so it is a step of `python migrations.py`, not of upgrade().
+    Returns whether the table was rebuilt; run upgrade() afterwards to recreate its indexes and cache triggers.
+    """
+    if engine.dialect.name != "sqlite":
+        return False
+    table = models.Literature.__table__
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if _has_autoincrement_ids(conn):
+            return False
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            rebuilt = not _has_autoincrement_ids(conn)
+            if rebuilt:
+                existing = {column["name"] for column in inspect(conn).get_columns("literature")}
+                columns = ", ".join(column.name for column in table.columns if column.name in existing)
+                create = str(CreateTable(table).compile(dialect=engine.dialect))
+                conn.exec_driver_sql(create.replace("CREATE TABLE literature ", "CREATE TABLE literature_rebuild ", 1))
+                conn.exec_driver_sql(f"INSERT INTO literature_rebuild ({columns}) SELECT {columns} FROM literature")
+                floor = _literature_id_floor(conn)
+                conn.exec_driver_sql("DROP TABLE literature")
+                conn.exec_driver_sql("ALTER TABLE literature_rebuild RENAME TO literature")
+                conn.execute(text("DELETE FROM sqlite_sequence WHERE name = 'literature'"))
+                conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('literature', :seq)"), {"seq": floor})
+            conn.exec_driver_sql("COMMIT")
+        except BaseException:
+            conn.exec_driver_sql("ROLLBACK")
+            raise
+    return rebuilt
+
+
+def upgrade(engine):
+    """Create missing tables, add missing columns and indexes, then run the backfills."""
+    with engine.connect() as conn:
+        # auto_vacuum can only be chosen for free before the first table is created
+        if engine.dialect.name == "sqlite" and not conn.execute(text("SELECT COUNT(*) FROM sqlite_master")).scalar():
+            conn.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+        models.Base.metadata.create_all(bind=conn)
+        conn.commit()
+        if engine.dialect.name == "sqlite" and not _has_autoincrement_ids(conn):
+            logger.warning("literature ids are not AUTOINCREMENT: ids freed by purges can be reissued "
+                           "until 'python migrations.py' rebuilds the table")
+
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in models.Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+        for table in models.Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+
+        for statement in BACKFILLS:
+            if callable(statement):
+                statement(conn)
+            else:
+                conn.execute(text(statement))
+
+        cache_bus.install(conn)
+        literature_archive.upgrade(conn)
+
+
+def main():
+    from database import engine
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    upgrade(engine)
+    if rebuild_literature_with_autoincrement(engine):
+        upgrade(engine)  # recreates the indexes and cache triggers dropped with the old table
+    # Deleted topics free their pages in small steps, see topic_deletion.reclaim_space; a no-op once switched
+    topic_deletion.enable_incremental_vacuum(engine)
+    print("database upgraded")
+
+
+if __name__ == "__main__":
+    main()
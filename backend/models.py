@@ -1,10 +1,23 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, JSON, ForeignKey, Boolean, Time, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import create_engine, Column, Integer, String, Date, DateTime, JSON, ForeignKey, Boolean, Time, Text, Float, Index, SmallInteger, LargeBinary, event, func, inspect, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, relationship
 from sqlalchemy.ext.declarative import declarative_base
-from datetime import datetime
+from datetime import datetime, date
+
+import literature_types
 
 Base = declarative_base()
 
+EPOCH = date(1970, 1, 1)
+
+def to_day_number(value):
+    """Days since 1970-01-01, the integer bucket key stored next to publication dates."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        value = value.date()
+    return (value - EPOCH).days
+
 class Topic(Base):
     __tablename__ = "topics"
 
@@ -23,6 +36,26 @@ class Topic(Base):
     # PPT Settings
     template = Column(String, default="default")
 
+    # IDF statistics of the topic keywords, maintained by relevance.py
+    relevance_stats = Column(JSON, nullable=True)
+
+    # High-watermarks of the last successful update cycle, see update_cycle.py
+    last_reported_literature_id = Column(Integer, nullable=True)
+    last_reported_publication_date = Column(DateTime, nullable=True)
+
+    # Entrez date up to which PubMed was last searched for the topic, see pubmed.py
+    last_fetched_date = Column(Date, nullable=True)
+
+    # Set when the topic is deleted; its rows are then purged in the background, see topic_deletion.py
+    deleted_at = Column(DateTime, nullable=True)
+
+    # Summary for the topic list, kept in sync by the flush and mapper events below (and seeded by migrations)
+    literature_count = Column(Integer, default=0)
+    last_update_status = Column(String, nullable=True)
+    last_update_time = Column(DateTime, nullable=True)
+    latest_ppt_link = Column(String, nullable=True)
+    last_push_time = Column(DateTime, nullable=True)
+
     updates = relationship("UpdateRecord", back_populates="topic")
 
 class UpdateRecord(Base):
@@ -33,12 +66,56 @@ class UpdateRecord(Base):
     timestamp = Column(DateTime, default=datetime.utcnow)
     status = Column(String)
     ppt_preview_link = Column(String, nullable=True)
+    # Literature id range (exclusive, inclusive] covered by this cycle
+    from_literature_id = Column(Integer, nullable=True)
+    to_literature_id = Column(Integer, nullable=True)
+    new_literature_count = Column(Integer, nullable=True)
 
     topic = relationship("Topic", back_populates="updates")
 
+
+class AnalysisSnapshot(Base):
+    """
+    Analysis state of a topic frozen by a successful update cycle, written once and never updated.
+    The payloads are zlib-compressed, see snapshots.py.
+    """
+    __tablename__ = "analysis_snapshots"
+
+    id = Column(Integer, primary_key=True, index=True)
+    topic_id = Column(Integer, ForeignKey("topics.id"), nullable=False)
+    update_record_id = Column(Integer, ForeignKey("update_records.id"), nullable=False, unique=True)
+    created_at = Column(DateTime, nullable=False)
+    # Literature of the topic with id <= to_literature_id, i.e. the papers behind the cycle's deck
+    to_literature_id = Column(Integer, nullable=False)
+    literature_count = Column(Integer, nullable=False)
+    analysis = Column(LargeBinary, nullable=False)
+    literature_ids = Column(LargeBinary, nullable=False)
+
+    __table_args__ = (
+        Index("ix_analysis_snapshots_topic_created", "topic_id", "created_at"),
+    )
+
+
+@event.listens_for(AnalysisSnapshot, "before_update")
+def _freeze_snapshot(mapper, connection, target):
+    raise ValueError("Analysis snapshots are immutable")
+
+
+class ReportSection(Base):
+    """Slide markdown of one report section, kept between cycles so only sections with new papers are rebuilt."""
+    __tablename__ = "report_sections"
+
+    topic_id = Column(Integer, ForeignKey("topics.id"), primary_key=True)
+    section_key = Column(String, primary_key=True)
+    markdown = Column(Text, nullable=False)
+    literature_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
 class Literature(Base):
     __tablename__ = "literature"
 
+    # AUTOINCREMENT: ids of purged or archived papers are never handed out again, so every id watermark
+    # (update cycles, snapshots, the similarity index) only moves forward
     id = Column(Integer, primary_key=True, index=True)
     topic_id = Column(Integer, ForeignKey("topics.id"), index=True)
     title = Column(String)
@@ -48,25 +125,164 @@ class Literature(Base):
     keywords = Column(JSON)
     summary = Column(Text)
     literature_type = Column(String)
+    # Integer day number of publication_date, kept in sync by the mapper events below so that
+    # trend queries can range-scan and group on an index instead of strftime() expressions
+    publication_day = Column(Integer)
+    # TF-IDF similarity to the topic keywords, computed at ingestion by relevance.py
+    relevance_score = Column(Float, nullable=True)
+    # Canonical type of the free-text literature_type, see literature_types.py
+    type_code = Column(SmallInteger, nullable=True)
+    # PubMed id of fetched or imported papers, used to skip papers a topic already has
+    pmid = Column(String, nullable=True)
 
     topic = relationship("Topic")
 
+    __table_args__ = (
+        Index("ix_literature_topic_day", "topic_id", "publication_day"),
+        Index("ix_literature_topic_relevance", "topic_id", "relevance_score"),
+        Index("ix_literature_topic_type", "topic_id", "type_code"),
+        Index("ix_literature_topic_pmid", "topic_id", "pmid"),
+        {"sqlite_autoincrement": True},
+    )
+
+
+class LiteratureArchiveState(Base):
+    """Tiering boundary of the literature table, a single row written by literature_archive.py."""
+    __tablename__ = "literature_archive_state"
+
+    id = Column(Integer, primary_key=True)
+    # Archived papers were all published before this day number; later papers are only in the hot table
+    boundary_day = Column(Integer, nullable=False)
+    archived_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime)
+
+
+class LiteratureDailyCount(Base):
+    """Rollup of literature counts per topic and publication day, read by trend queries."""
+    __tablename__ = "literature_daily_counts"
+
+    topic_id = Column(Integer, primary_key=True)
+    publication_day = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+@event.listens_for(Literature, "before_insert")
+@event.listens_for(Literature, "before_update")
+def _sync_publication_day(mapper, connection, target):
+    target.publication_day = to_day_number(target.publication_date)
+
+
+@event.listens_for(Literature, "before_insert")
+@event.listens_for(Literature, "before_update")
+def _classify_type(mapper, connection, target):
+    state = inspect(target)
+    if target.type_code is None or state.attrs.literature_type.history.has_changes() \
+            or state.attrs.title.history.has_changes():
+        target.type_code = literature_types.classify(target.literature_type, target.title)
+
+
+def bump_daily_count(connection, topic_id, publication_day, delta):
+    if topic_id is None or publication_day is None:
+        return
+    table = LiteratureDailyCount.__table__
+    statement = sqlite_insert(table).values(topic_id=topic_id, publication_day=publication_day, count=delta)
+    connection.execute(statement.on_conflict_do_update(
+        index_elements=[table.c.topic_id, table.c.publication_day],
+        set_={"count": table.c.count + delta},
+    ))
+
+
+@event.listens_for(Literature, "after_insert")
+def _count_inserted(mapper, connection, target):
+    bump_daily_count(connection, target.topic_id, target.publication_day, 1)
+
+
+@event.listens_for(Literature, "after_delete")
+def _count_deleted(mapper, connection, target):
+    bump_daily_count(connection, target.topic_id, target.publication_day, -1)
+
+
+@event.listens_for(Literature, "after_update")
+def _count_moved(mapper, connection, target):
+    state = inspect(target)
+    topic_history = state.attrs.topic_id.history
+    day_history = state.attrs.publication_day.history
+    if not topic_history.has_changes() and not day_history.has_changes():
+        return
+    old_topic = topic_history.deleted[0] if topic_history.deleted else target.topic_id
+    old_day = day_history.deleted[0] if day_history.deleted else target.publication_day
+    bump_daily_count(connection, old_topic, old_day, -1)
+    bump_daily_count(connection, target.topic_id, target.publication_day, 1)
+
+
+@event.listens_for(Session, "after_flush")
+def _count_topic_literature(session, flush_context):
+    # One UPDATE per topic and flush rather than per row, so batch ingestion stays cheap
+    deltas = {}
+    for target in session.new:
+        if isinstance(target, Literature):
+            deltas[target.topic_id] = deltas.get(target.topic_id, 0) + 1
+    for target in session.deleted:
+        if isinstance(target, Literature):
+            deltas[target.topic_id] = deltas.get(target.topic_id, 0) - 1
+    for target in session.dirty:
+        if isinstance(target, Literature):
+            history = inspect(target).attrs.topic_id.history
+            if history.deleted and history.added:
+                deltas[history.deleted[0]] = deltas.get(history.deleted[0], 0) - 1
+                deltas[history.added[0]] = deltas.get(history.added[0], 0) + 1
+    table = Topic.__table__
+    connection = session.connection()
+    for topic_id, delta in deltas.items():
+        if topic_id is not None and delta:
+            connection.execute(table.update().where(table.c.id == topic_id)
+                               .values(literature_count=func.coalesce(table.c.literature_count, 0) + delta))
+
+
+@event.listens_for(UpdateRecord, "after_insert")
+@event.listens_for(UpdateRecord, "after_update")
+def _summarize_update(mapper, connection, target):
+    if target.topic_id is None or target.timestamp is None:
+        return
+    table = Topic.__table__
+    values = {"last_update_status": target.status, "last_update_time": target.timestamp}
+    if target.ppt_preview_link:
+        values["latest_ppt_link"] = target.ppt_preview_link
+    # Records written out of order never move the summary back in time
+    connection.execute(table.update().where(table.c.id == target.topic_id)
+                       .where(or_(table.c.last_update_time.is_(None), table.c.last_update_time <= target.timestamp))
+                       .values(**values))
+
+
 class PPTPushRecord(Base):
     __tablename__ = "ppt_push_records"
 
     id = Column(Integer, primary_key=True, index=True)
+    topic_id = Column(Integer, ForeignKey("topics.id"), nullable=True, index=True)
     push_time = Column(DateTime)
     topic_name = Column(String)
     ppt_filename = Column(String)
     recipients = Column(JSON)
     channel = Column(String)
     status = Column(String)
+    refused_recipients = Column(JSON)  # addresses the mail server refused; such a push is not a success
 
     # Relationships for diffs
     diff_from = relationship("PPTDiff", foreign_keys="[PPTDiff.current_record_id]", back_populates="current_record", cascade="all, delete-orphan")
     diff_to = relationship("PPTDiff", foreign_keys="[PPTDiff.previous_record_id]", back_populates="previous_record", cascade="all, delete-orphan")
 
 
+@event.listens_for(PPTPushRecord, "after_insert")
+@event.listens_for(PPTPushRecord, "after_update")
+def _summarize_push(mapper, connection, target):
+    if target.topic_id is None or target.status != "success" or target.push_time is None:
+        return
+    table = Topic.__table__
+    connection.execute(table.update().where(table.c.id == target.topic_id)
+                       .where(or_(table.c.last_push_time.is_(None), table.c.last_push_time < target.push_time))
+                       .values(last_push_time=target.push_time))
+
+
 class PPTDiff(Base):
     __tablename__ = "ppt_diffs"
 
@@ -78,3 +294,21 @@ class PPTDiff(Base):
 
     current_record = relationship("PPTPushRecord", foreign_keys=[current_record_id], back_populates="diff_from")
     previous_record = relationship("PPTPushRecord", foreign_keys=[previous_record_id], back_populates="diff_to")
+
+
+class ImportProgress(Base):
+    """How far each PubMed baseline file has been imported, committed with its papers (see pubmed_import.py)."""
+    __tablename__ = "import_progress"
+
+    file_name = Column(String, primary_key=True)
+    articles_done = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime)
+    completed_at = Column(DateTime, nullable=True)
+
+
+class CacheGeneration(Base):
+    """Write counters per table, bumped by triggers and watched by every worker (see cache_bus.py)."""
+    __tablename__ = "cache_generations"
+
+    name = Column(String, primary_key=True)
+    generation = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,278 @@
+# PPT 推送: 将生成好的 PPT 同时推送给所有接收人
+# - email: 复用连接池中的 SMTP 连接，每封邮件以密送方式携带一批接收人
+# - app_push: 以 JSON 调用 Webhook，每次请求携带一批接收人
+# 每个渠道独立限流，临时错误按指数退避重试，结果写回 PPTPushRecord.status
+# SMTP 服务器拒收的接收人记入 PPTPushRecord.refused_recipients，有拒收的记录不算成功
+import asyncio
+import json
+import logging
+import os
+import smtplib
+from dataclasses import dataclass
+from datetime import datetime
+from email.message import EmailMessage
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+import httpx
+from sqlalchemy.orm import Session
+
+import models
+from ratelimit import RetryableError, TokenBucket, retry_with_backoff
+
+logger = logging.getLogger(__name__)
+
+EMAIL = "email"
+APP_PUSH = "app_push"
+# PPTPushRecord.channel 中出现过的写法
+CHANNEL_ALIASES = {"email": EMAIL, "app_push": APP_PUSH, "webhook": APP_PUSH}
+
+
+@dataclass
+class NotificationSettings:
+    smtp_host: str = "localhost"
+    smtp_port: int = 25
+    smtp_username: Optional[str] = None
+    smtp_password: Optional[str] = None
+    smtp_starttls: bool = False
+    smtp_pool_size: int = 4
+    webhook_connections: int = 16
+    sender: str = "medbrief@localhost"
+    webhook_url: Optional[str] = None
+    public_base_url: str = "http://localhost:8000"
+    recipients_per_message: int = 50
+    email_rate: float = 20.0     # messages per second
+    webhook_rate: float = 50.0   # requests per second
+    attempts: int = 4
+    backoff_base: float = 0.5
+
+    @classmethod
+    def from_env(cls) -> "NotificationSettings":
+        env = os.environ.get
+        return cls(
+            smtp_host=env("SMTP_HOST", cls.smtp_host),
+            smtp_port=int(env("SMTP_PORT", cls.smtp_port)),
+            smtp_username=env("SMTP_USERNAME"),
+            smtp_password=env("SMTP_PASSWORD"),
+            smtp_starttls=env("SMTP_STARTTLS", "0") == "1",
+            smtp_pool_size=int(env("SMTP_POOL_SIZE", cls.smtp_pool_size)),
+            webhook_connections=int(env("APP_PUSH_CONNECTIONS", cls.webhook_connections)),
+            sender=env("SMTP_SENDER", cls.sender),
+            webhook_url=env("APP_PUSH_WEBHOOK_URL"),
+            public_base_url=env("PUBLIC_BASE_URL", cls.public_base_url),
+        )
+
+
+@dataclass
+class Delivery:
+    status: str
+    refused: List[str]
+
+
+@dataclass
+class PushJob:
+    record_id: int
+    topic_name: str
+    ppt_filename: str
+    recipients: List[str]
+    channel: str
+
+
+def parse_recipients(value) -> List[str]:
+    # Seed data stores the list as a JSON string inside the JSON column
+    while isinstance(value, str):
+        value = json.loads(value)
+    return list(value or [])
+
+
+def batched(items: Sequence[str], size: int) -> List[List[str]]:
+    return [list(items[i:i + size]) for i in range(0, len(items), size)]
+
+
+class SMTPPool:
+    """A fixed number of persistent SMTP connections; blocking smtplib calls run in worker threads."""
+
+    def __init__(self, settings: NotificationSettings):
+        self.settings = settings
+        self._idle: asyncio.Queue = asyncio.Queue()
+        for _ in range(settings.smtp_pool_size):
+            self._idle.put_nowait(None)  # connected lazily
+
+    def _connect(self) -> smtplib.SMTP:
+        connection = smtplib.SMTP(self.settings.smtp_host, self.settings.smtp_port, timeout=30)
+        if self.settings.smtp_starttls:
+            connection.starttls()
+        if self.settings.smtp_username:
+            connection.login(self.settings.smtp_username, self.settings.smtp_password or "")
+        return connection
+
+    def _send_blocking(self, connection: Optional[smtplib.SMTP], message: EmailMessage,
+                       recipients: List[str]) -> Tuple[smtplib.SMTP, Dict[str, Tuple[int, bytes]]]:
+        if connection is None:
+            connection = self._connect()
+        try:
+            refused = connection.send_message(message, to_addrs=recipients)
+        except smtplib.SMTPRecipientsRefused as exc:
+            refused = exc.recipients  # every recipient refused; smtplib reset the session, the connection is fine
+        except (smtplib.SMTPServerDisconnected, smtplib.SMTPResponseException, OSError):
+            try:
+                connection.close()
+            finally:
+                raise
+        return connection, refused
+
+    async def send(self, message: EmailMessage, recipients: List[str]) -> Dict[str, Tuple[int, bytes]]:
+        """Send one message; returns the recipients the server refused, like SMTP.sendmail."""
+        connection = await self._idle.get()
+        try:
+            connection, refused = await asyncio.to_thread(self._send_blocking, connection, message, recipients)
+        except (smtplib.SMTPException, OSError) as exc:
+            connection = None  # dropped, reconnect on next use
+            if isinstance(exc, smtplib.SMTPResponseException) and exc.smtp_code >= 500:
+                raise  # permanent rejection, retrying will not help
+            raise RetryableError(str(exc)) from exc
+        finally:
+            self._idle.put_nowait(connection)
+        return refused
+
+    @staticmethod
+    def _quit(connection: smtplib.SMTP):
+        try:
+            connection.quit()
+        except (smtplib.SMTPException, OSError):
+            connection.close()  # the server already dropped the idle connection
+
+    async def close(self):
+        while not self._idle.empty():
+            connection = self._idle.get_nowait()
+            if connection is not None:
+                await asyncio.to_thread(self._quit, connection)
+
+
+class Notifier:
+    """Fans push jobs out over all channels concurrently."""
+
+    def __init__(self, settings: NotificationSettings):
+        self.settings = settings
+        self.smtp = SMTPPool(settings)
+        self.http = httpx.AsyncClient(timeout=httpx.Timeout(15.0),
+                                      limits=httpx.Limits(max_connections=settings.webhook_connections))
+        self.buckets = {EMAIL: TokenBucket(settings.email_rate), APP_PUSH: TokenBucket(settings.webhook_rate)}
+
+    async def close(self):
+        try:
+            await self.smtp.close()
+        finally:
+            await self.http.aclose()
+
+    def ppt_url(self, job: PushJob) -> str:
+        return f"{self.settings.public_base_url.rstrip('/')}/PPT/{quote(job.ppt_filename)}"
+
+    def _email(self, job: PushJob) -> EmailMessage:
+        message = EmailMessage()
+        message["Subject"] = f"{job.topic_name} 最新研究进展报告"
+        message["From"] = self.settings.sender
+        message["To"] = "undisclosed-recipients:;"
+        message.set_content(f"{job.topic_name} 的最新报告已生成:\n{self.ppt_url(job)}\n")
+        return message
+
+    async def _send_email_batch(self, job: PushJob, recipients: List[str]) -> List[str]:
+        await self.buckets[EMAIL].acquire()
+        return list(await self.smtp.send(self._email(job), recipients))
+
+    async def _send_webhook_batch(self, job: PushJob, recipients: List[str]) -> List[str]:
+        if not self.settings.webhook_url:
+            raise ValueError("APP_PUSH_WEBHOOK_URL is not configured")
+        await self.buckets[APP_PUSH].acquire()
+        payload = {"topic": job.topic_name, "ppt_url": self.ppt_url(job), "recipients": recipients}
+        try:
+            response = await self.http.post(self.settings.webhook_url, json=payload)
+        except httpx.TransportError as exc:
+            raise RetryableError(str(exc)) from exc
+        if response.status_code == 429 or response.status_code >= 500:
+            raise RetryableError(f"webhook returned {response.status_code}")
+        response.raise_for_status()
+        return []
+
+    async def deliver(self, job: PushJob) -> Delivery:
+        """Deliver one push record; returns the resulting status and the recipients that were refused."""
+        channel = CHANNEL_ALIASES.get(job.channel.lower())
+        if channel is None:
+            logger.error("Unknown push channel %r for record %s", job.channel, job.record_id)
+            return Delivery("failed", [])
+        send = self._send_email_batch if channel == EMAIL else self._send_webhook_batch
+
+        async def send_batch(recipients):
+            return await retry_with_backoff(lambda: send(job, recipients), attempts=self.settings.attempts,
+                                            base_delay=self.settings.backoff_base)
+
+        results = await asyncio.gather(
+            *(send_batch(batch) for batch in batched(job.recipients, self.settings.recipients_per_message)),
+            return_exceptions=True,
+        )
+        errors = [result for result in results if isinstance(result, BaseException)]
+        for error in errors:
+            logger.error("Push record %s failed: %s", job.record_id, error)
+        refused = [recipient for result in results if not isinstance(result, BaseException) for recipient in result]
+        if refused:
+            logger.error("Push record %s: %s recipients refused", job.record_id, len(refused))
+        return Delivery("failed" if errors or refused else "success", refused)
+
+    async def deliver_all(self, jobs: Sequence[PushJob]) -> Dict[int, Delivery]:
+        deliveries = await asyncio.gather(*(self.deliver(job) for job in jobs))
+        return {job.record_id: delivery for job, delivery in zip(jobs, deliveries)}
+
+
+def create_push_records(db: Session, topic: models.Topic, ppt_filename: str, recipients: List[str]) -> List[models.PPTPushRecord]:
+    """One pending record per notification channel of the topic."""
+    records = [
+        models.PPTPushRecord(push_time=datetime.utcnow(), topic_id=topic.id, topic_name=topic.name,
+                             ppt_filename=ppt_filename,
+                             recipients=recipients, channel=channel, status="pending")
+        for channel in (topic.notification_channels or [EMAIL])
+    ]
+    db.add_all(records)
+    db.commit()
+    for record in records:
+        db.refresh(record)
+    return records
+
+
+def _pending_records(db: Session, record_ids: Optional[Sequence[int]]) -> List[models.PPTPushRecord]:
+    query = db.query(models.PPTPushRecord).filter(models.PPTPushRecord.status == "pending")
+    if record_ids is not None:
+        query = query.filter(models.PPTPushRecord.id.in_(list(record_ids)))
+    return query.all()
+
+
+def _write_deliveries(db: Session, records: List[models.PPTPushRecord], deliveries: Dict[int, Delivery]):
+    for record in records:
+        record.status = deliveries[record.id].status
+        record.refused_recipients = deliveries[record.id].refused or None
+    db.commit()
+
+
+async def deliver_pending(db: Session, settings: Optional[NotificationSettings] = None,
+                          record_ids: Optional[Sequence[int]] = None) -> Dict[int, str]:
+    """
+    Deliver pending push records (optionally only the given ids) and write their statuses back.
+    The blocking Session work runs in worker threads, off the event loop.
+    """
+    records = await asyncio.to_thread(_pending_records, db, record_ids)
+    jobs = [
+        PushJob(record.id, record.topic_name, record.ppt_filename, parse_recipients(record.recipients), record.channel)
+        for record in records
+    ]
+
+    notifier = Notifier(settings or NotificationSettings.from_env())
+    try:
+        deliveries = await notifier.deliver_all(jobs)
+    finally:
+        try:
+            await notifier.close()
+        except Exception:
+            # The messages went out; a failed shutdown must not leave the records pending to be sent again
+            logger.exception("Closing the push channels failed")
+
+    await asyncio.to_thread(_write_deliveries, db, records, deliveries)
+    return {record_id: delivery.status for record_id, delivery in deliveries.items()}
@@ -0,0 +1,174 @@
+# 生成的 PPT 文件的分发与预览
+# - 以文件内容哈希作为 ETag；带 ?v=<哈希> 的地址内容不会再变，可以长期缓存
+# - Range 请求由 Starlette 的 FileResponse 处理
+# - 预览是每个 PPT 的文本大纲，首次请求时生成并以 <哈希>-v<格式版本>.json 缓存在磁盘上，只有几 KB；
+#   预览的 ETag 以 preview- 和格式版本开头，与 PPT 文件本身的 ETag 不同。超过 MAX_PREVIEW_BYTES 的文件不生成预览
+import hashlib
+import json
+import os
+import threading
+import uuid
+from typing import Dict, Optional, Tuple
+from urllib.parse import quote
+
+from pptx import Presentation
+from starlette.datastructures import Headers, QueryParams
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+PPT_DIRECTORY = "PPT"
+PREVIEW_DIRECTORY = os.path.join(PPT_DIRECTORY, ".previews")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+MAX_LINES_PER_SLIDE = 8
+MAX_LINE_LENGTH = 160
+PREVIEW_FORMAT_VERSION = 1  # bump when the outline changes, so cached previews and their ETags are replaced
+MAX_PREVIEW_BYTES = 200 * 1024 * 1024
+
+_hash_cache: Dict[str, Tuple[int, int, str]] = {}
+_hash_lock = threading.Lock()
+
+
+class DeckTooLarge(Exception):
+    """The deck exceeds MAX_PREVIEW_BYTES, so no preview is built for it."""
+
+
+class DeckUnreadable(Exception):
+    """The file is not a presentation python-pptx can open."""
+
+
+def content_hash(path: str, stat_result: Optional[os.stat_result] = None) -> str:
+    """SHA-256 of the file, recomputed only when its mtime or size changes."""
+    stat_result = stat_result or os.stat(path)
+    with _hash_lock:
+        cached = _hash_cache.get(path)
+    if cached and cached[:2] == (stat_result.st_mtime_ns, stat_result.st_size):
+        return cached[2]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    value = digest.hexdigest()
+    with _hash_lock:
+        _hash_cache[path] = (stat_result.st_mtime_ns, stat_result.st_size, value)
+    return value
+
+
+def deck_path(filename: str) -> Optional[str]:
+    """Resolve a deck filename inside PPT_DIRECTORY, or None if it is missing or escapes the directory."""
+    root = os.path.realpath(PPT_DIRECTORY)
+    path = os.path.realpath(os.path.join(root, filename))
+    if os.path.dirname(path) != root or not os.path.isfile(path):
+        return None
+    return path
+
+
+def deck_filename(name: str, suffix: str) -> str:
+    """A deck filename from free text such as a topic prompt: one line, no path separators, bounded length."""
+    stem = " ".join(name.split())[:80].replace(os.sep, "_")
+    if os.altsep:
+        stem = stem.replace(os.altsep, "_")
+    return f"{stem}_{suffix}.pptx"
+
+
+def versioned_url(filename: str, digest: str) -> str:
+    return f"/PPT/{quote(filename)}?v={digest[:16]}"
+
+
+class DeckFiles(StaticFiles):
+    """StaticFiles with content-hash ETags and immutable caching for versioned URLs."""
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        request_headers = Headers(scope=scope)
+        digest = content_hash(str(full_path), stat_result)
+
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        response.headers["etag"] = f'"{digest[:32]}"'
+        versioned = QueryParams(scope.get("query_string", b"")).get("v") == digest[:16]
+        response.headers["cache-control"] = IMMUTABLE_CACHE_CONTROL if versioned else REVALIDATE_CACHE_CONTROL
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def _truncate(text: str) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= MAX_LINE_LENGTH else text[:MAX_LINE_LENGTH - 1] + "…"
+
+
+def preview_etag(digest: str) -> str:
+    return f'"preview-v{PREVIEW_FORMAT_VERSION}-{digest[:32]}"'
+
+
+def _preview_file(digest: str) -> str:
+    return os.path.join(PREVIEW_DIRECTORY, f"{digest}-v{PREVIEW_FORMAT_VERSION}.json")
+
+
+def _outline(path: str) -> list:
+    slides = []
+    for index, slide in enumerate(Presentation(path).slides, start=1):
+        title = ""
+        if slide.shapes.title is not None and slide.shapes.title.has_text_frame:
+            title = _truncate(slide.shapes.title.text_frame.text)
+        lines = []
+        for shape in slide.shapes:
+            if not shape.has_text_frame or shape == slide.shapes.title:
+                continue
+            for paragraph in shape.text_frame.paragraphs:
+                text = _truncate("".join(run.text for run in paragraph.runs))
+                if text:
+                    lines.append(text)
+        if not title and lines:
+            title = lines.pop(0)
+        slides.append({"index": index, "title": title, "lines": lines[:MAX_LINES_PER_SLIDE]})
+    return slides
+
+
+def build_preview(path: str) -> dict:
+    """Extract a text outline of every slide and store it next to the decks; raises DeckUnreadable."""
+    digest = content_hash(path)
+    try:
+        slides = _outline(path)
+    except Exception as exc:  # zip, package and XML errors of a damaged or foreign file
+        raise DeckUnreadable(os.path.basename(path)) from exc
+
+    filename = os.path.basename(path)
+    preview = {
+        "filename": filename,
+        "content_hash": digest,
+        "size_bytes": os.path.getsize(path),
+        "slide_count": len(slides),
+        "download_url": versioned_url(filename, digest),
+        "slides": slides,
+    }
+    os.makedirs(PREVIEW_DIRECTORY, exist_ok=True)
+    target = _preview_file(digest)
+    temporary = f"{target}.{uuid.uuid4().hex}.tmp"  # concurrent builds of one deck each write their own file
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump(preview, f, ensure_ascii=False)
+    os.replace(temporary, target)
+    return preview
+
+
+def get_preview(filename: str) -> Optional[dict]:
+    """
+    Cached outline of a deck, built on first request. None if the deck does not exist;
+    raises DeckTooLarge before hashing or parsing a deck over MAX_PREVIEW_BYTES, and DeckUnreadable.
+    """
+    path = deck_path(filename)
+    if path is None:
+        return None
+    stat_result = os.stat(path)
+    if stat_result.st_size > MAX_PREVIEW_BYTES:
+        raise DeckTooLarge(filename)
+    cached = _preview_file(content_hash(path, stat_result))
+    try:
+        with open(cached, encoding="utf-8") as f:
+            preview = json.load(f)
+    except (FileNotFoundError, ValueError):  # not built yet, or a damaged cache file
+        return build_preview(path)
+    # Identical decks share one cache file, keep the name that was asked for
+    preview["filename"] = filename
+    preview["download_url"] = versioned_url(filename, preview["content_hash"])
+    return preview
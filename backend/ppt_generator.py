@@ -5,7 +5,12 @@ import httpx
 import asyncio
 import os
 import json
+import sys
+from datetime import datetime, timedelta
 from pathlib import Path
+import literature_context
+import ppt_files
+import ppt_renderer
 from a2a.client import A2AClient
 from a2a.types import MessageSendParams, SendStreamingMessageRequest
 
@@ -60,14 +65,36 @@ async def run_agent(prompt, agent_url, metadata=None, collect_text=False):
         return "\n".join(collected_chunks)
 
 
-async def main(topic):
-    # Step 1: 调用第一个 Agent 生成大纲
+def pack_literature_context(topic_id, start, end, settings=None):
+    """在独立的数据库会话中为大纲 Agent 打包主题文献"""
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return literature_context.pack_topic(db, topic_id, start, end, settings)
+    finally:
+        db.close()
+
+
+async def main(topic, template=ppt_renderer.DEFAULT_TEMPLATE, ppt_filename=None, topic_id=None,
+               start=None, end=None):
+    # Step 1: 调用第一个 Agent 生成大纲；给出 topic_id 时附上该时间段内最相关的已跟踪文献
     print("\n=== Step 1: 生成大纲 ===")
     outline_metadata = {
         "language": "Chinese",
         "select_time": [{"sTimeYear": 2011, "eTimeYear": 2025}]
     }
-    outline_text = await run_agent(topic, OUTLINE_AGENT_URL, metadata=outline_metadata, collect_text=True)
+    prompt = topic
+    if topic_id is not None:
+        settings = literature_context.ContextSettings.from_env()
+        end = end or datetime.now().date()
+        start = start or end - timedelta(days=settings.period_days)
+        context = await asyncio.to_thread(pack_literature_context, topic_id, start, end, settings)
+        prompt = literature_context.outline_prompt(topic, context)
+        outline_metadata["select_time"] = [{"sTimeYear": start.year, "eTimeYear": end.year}]
+        print(f"文献上下文: {len(context.literature_ids)} 篇 (候选 {context.candidates}，去重 {context.duplicates}，"
+              f"超出预算 {context.skipped})，约 {context.tokens} tokens")
+    outline_text = await run_agent(prompt, OUTLINE_AGENT_URL, metadata=outline_metadata, collect_text=True)
 
     # Step 2: 调用第二个 Agent 生成 PPT 内容
     print("\n=== Step 2: 根据大纲生成 PPT 内容 ===")
@@ -83,7 +110,16 @@ async def main(topic):
     Path(output_file).write_text(ppt_content, encoding="utf-8")
     print(f"\n✅ 已保存到 {output_file}")
 
+    # Step 4: 使用主题模板渲染 PPT，并同时生成预览大纲
+    ppt_filename = ppt_filename or ppt_files.deck_filename(topic, f"{datetime.now():%Y%m%d}")
+    ppt_path = os.path.join(ppt_files.PPT_DIRECTORY, ppt_filename)
+    await asyncio.to_thread(ppt_renderer.render_deck, ppt_content, ppt_path, template)
+    await asyncio.to_thread(ppt_files.build_preview, ppt_path)
+    print(f"✅ PPT 已生成 {ppt_path}")
+    return ppt_path
+
 
 if __name__ == "__main__":
     topic = """PDL1-41BB双抗在肺癌治疗领域的临床研究进展"""
-    asyncio.run(main(topic))
+    # python ppt_generator.py [主题ID]: 附上该主题近一年 (LITERATURE_CONTEXT_PERIOD_DAYS) 最相关的文献
+    asyncio.run(main(topic, topic_id=int(sys.argv[1]) if len(sys.argv) > 1 else None))
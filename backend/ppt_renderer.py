@@ -0,0 +1,187 @@
+# 将 PPT Agent 输出的幻灯片 markdown 渲染为 .pptx
+# - 模板: templates/<Topic.template>.pptx，不存在时使用 python-pptx 自带的默认模板；
+#   Topic.template 来自 API，只接受 templates 目录下的文件名，带路径的名称按不存在处理
+# - 每个进程只从磁盘加载一次模板，去掉示例页后序列化保存在内存中，之后每份 PPT 都从这份内存副本打开
+#   (python-pptx 的对象不能 deepcopy，lxml 会把共享的元素各自复制一份)
+# - render_decks 使用进程池，一个更新周期内的大量主题可以用满所有 CPU 核
+import io
+import os
+import re
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+from pptx import Presentation
+from pptx.util import Pt
+
+TEMPLATE_DIRECTORY = "templates"
+DEFAULT_TEMPLATE = "default"
+TITLE_LAYOUT = 0
+CONTENT_LAYOUT = 1
+
+HEADING = re.compile(r"^(#{1,3})\s+(.*)$")
+BULLET = re.compile(r"^(\s*)(?:[-*+]|\d+[.)])\s+(.*)$")
+SEPARATOR = re.compile(r"^\s*(?:---+|\*\*\*+)\s*$")
+INLINE_MARKUP = re.compile(r"\*\*(.+?)\*\*|__(.+?)__|`([^`]*)`")
+
+
+@dataclass
+class SlideContent:
+    title: str = ""
+    # (indent level, text)
+    paragraphs: List[tuple] = field(default_factory=list)
+    is_title_slide: bool = False
+
+
+def _plain(text: str) -> str:
+    return INLINE_MARKUP.sub(lambda m: next(g for g in m.groups() if g is not None), text).strip()
+
+
+def parse_slides(markdown: str) -> List[SlideContent]:
+    """
+    Split slide markdown into slides. A new slide starts at `---` or at any heading;
+    a level-1 heading opens a title slide.
+    """
+    slides: List[SlideContent] = []
+    current: Optional[SlideContent] = None
+
+    for line in markdown.splitlines():
+        if SEPARATOR.match(line):
+            current = None
+            continue
+        heading = HEADING.match(line)
+        if heading:
+            level, text = len(heading.group(1)), _plain(heading.group(2))
+            if current is not None and not current.title:
+                current.title = text
+            elif current is not None and level == 3:
+                current.paragraphs.append((0, text))
+            else:
+                current = SlideContent(title=text, is_title_slide=level == 1)
+                slides.append(current)
+            continue
+        if not line.strip():
+            continue
+        if current is None:
+            current = SlideContent()
+            slides.append(current)
+        bullet = BULLET.match(line)
+        if bullet:
+            current.paragraphs.append((min(len(bullet.group(1).expandtabs(4)) // 2, 4), _plain(bullet.group(2))))
+        else:
+            current.paragraphs.append((0, _plain(line)))
+
+    return [slide for slide in slides if slide.title or slide.paragraphs]
+
+
+_templates: Dict[str, bytes] = {}
+_templates_lock = threading.Lock()
+
+
+def template_path(template: str) -> Optional[str]:
+    if not template or os.path.basename(template) != template or (os.altsep and os.altsep in template):
+        return None
+    path = os.path.join(TEMPLATE_DIRECTORY, f"{template}.pptx")
+    return path if os.path.isfile(path) else None
+
+
+def _load_template(template: str) -> bytes:
+    path = template_path(template)
+    presentation = Presentation(path) if path else Presentation()
+    # Drop the sample slides a template may carry, keep masters and layouts
+    slide_ids = presentation.slides._sldIdLst
+    for slide_id in list(slide_ids):
+        presentation.part.drop_rel(slide_id.rId)
+        slide_ids.remove(slide_id)
+    blob = io.BytesIO()
+    presentation.save(blob)
+    return blob.getvalue()
+
+
+def new_presentation(template: str = DEFAULT_TEMPLATE):
+    """A fresh presentation opened from the in-memory copy of the template."""
+    with _templates_lock:
+        blob = _templates.get(template)
+        if blob is None:
+            blob = _templates[template] = _load_template(template)
+    return Presentation(io.BytesIO(blob))
+
+
+def _layout(presentation, index: int):
+    layouts = presentation.slide_layouts
+    return layouts[min(index, len(layouts) - 1)]
+
+
+def _body_placeholder(slide):
+    for placeholder in slide.placeholders:
+        if placeholder.placeholder_format.idx != 0 and placeholder.has_text_frame:
+            return placeholder
+    return None
+
+
+def build_presentation(slides: Sequence[SlideContent], template: str = DEFAULT_TEMPLATE):
+    presentation = new_presentation(template)
+    for content in slides:
+        layout = _layout(presentation, TITLE_LAYOUT if content.is_title_slide else CONTENT_LAYOUT)
+        slide = presentation.slides.add_slide(layout)
+        if slide.shapes.title is not None:
+            slide.shapes.title.text = content.title
+
+        body = _body_placeholder(slide)
+        if body is None or not content.paragraphs:
+            continue
+        text_frame = body.text_frame
+        for i, (level, text) in enumerate(content.paragraphs):
+            paragraph = text_frame.paragraphs[0] if i == 0 else text_frame.add_paragraph()
+            paragraph.text = text
+            paragraph.level = level
+            if content.is_title_slide:
+                paragraph.font.size = Pt(18)
+    return presentation
+
+
+def render_deck(markdown: str, output_path: str, template: str = DEFAULT_TEMPLATE) -> str:
+    """Render slide markdown to a .pptx file and return its path."""
+    presentation = build_presentation(parse_slides(markdown), template)
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary = f"{output_path}.{uuid.uuid4().hex}.tmp"  # a deck rendered twice at once writes two files
+    presentation.save(temporary)
+    os.replace(temporary, output_path)
+    return output_path
+
+
+@dataclass
+class RenderJob:
+    markdown: str
+    output_path: str
+    template: str = DEFAULT_TEMPLATE
+
+
+def _render_job(job: RenderJob) -> str:
+    return render_deck(job.markdown, job.output_path, job.template)
+
+
+def _warm_templates(templates: Sequence[str]):
+    for template in templates:
+        new_presentation(template)
+
+
+def render_decks(jobs: Sequence[RenderJob], workers: Optional[int] = None) -> List[str]:
+    """
+    Render many decks in a process pool (one worker per core by default).
+    Each worker loads every template once up front and opens it from memory per deck.
+    """
+    if not jobs:
+        return []
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return [_render_job(job) for job in jobs]
+
+    templates = sorted({job.template for job in jobs})
+    chunksize = max(1, len(jobs) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_warm_templates, initargs=(templates,)) as pool:
+        return list(pool.map(_render_job, jobs, chunksize=chunksize))
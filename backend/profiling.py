@@ -0,0 +1,276 @@
+# 按需的单请求性能剖析
+# 默认关闭: 只有设置了 PROFILING_ENABLED=1 和 PROFILING_TOKEN 时 main.py 才会挂载 ProfilingMiddleware，
+# 否则请求路径上没有任何额外代码。开启后，带 `X-Profile: 1` 请求头或 `?profile=1` 且
+# `X-Profile-Token` 正确的请求在采样剖析器下运行:
+# - 采样线程每 PROFILING_INTERVAL_MS 毫秒读取一次所有线程的调用栈 (sys._current_frames)，空闲等待中的线程不计入，
+#   因此同步端点在线程池中的执行、Pydantic 序列化和事件循环上的工作都会出现在结果中
+# - 该请求发出的 SQL 语句 (按 contextvar 区分其他并发请求) 记录文本、参数个数、耗时和所在线程
+# 结果保存为 speedscope 格式 (https://www.speedscope.app 直接打开): 每个线程一个火焰图，外加一个 SQL 时间线；
+# 响应头 X-Profile-Id 给出编号，用同一个令牌 GET /profiles/{编号} 下载。同一时间只剖析一个请求。
+import contextvars
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import Headers, QueryParams
+from starlette.responses import FileResponse, JSONResponse
+
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+MAX_SQL_LABEL = 200
+
+# Innermost frames of threads that are waiting for work rather than doing it
+IDLE_FRAMES = {("threading.py", "wait"), ("queue.py", "get"), ("selectors.py", "select")}
+
+Frame = Tuple[str, str, int]  # (function, file, first line)
+
+
+@dataclass
+class ProfilingSettings:
+    enabled: bool = False
+    token: Optional[str] = None
+    interval: float = 0.001  # seconds between samples
+    directory: str = "profiles"
+    keep: int = 100  # newest profiles kept on disk
+
+    @classmethod
+    def from_env(cls) -> "ProfilingSettings":
+        env = os.environ.get
+        token = env("PROFILING_TOKEN") or None
+        return cls(
+            enabled=env("PROFILING_ENABLED", "0").lower() in ("1", "true", "yes") and token is not None,
+            token=token,
+            interval=float(env("PROFILING_INTERVAL_MS", cls.interval * 1000)) / 1000,
+            directory=env("PROFILE_DIRECTORY", cls.directory),
+            keep=int(env("PROFILING_KEEP", cls.keep)),
+        )
+
+
+@dataclass
+class Statement:
+    sql: str
+    parameters: int  # parameter sets (executemany) or 1
+    thread: int
+    started: float
+    duration: float
+
+
+class Sampler(threading.Thread):
+    """Samples the Python stacks of every other busy thread until stopped."""
+
+    def __init__(self, interval: float):
+        super().__init__(name="profiling-sampler", daemon=True)
+        self.interval = interval
+        self.frames: Dict[Frame, int] = {}
+        self.samples: Dict[int, List[Tuple[List[int], float]]] = {}  # thread -> (stack, weight in seconds)
+        self.thread_names: Dict[int, str] = {}
+        self._stop_event = threading.Event()
+
+    def _stack(self, frame) -> Optional[List[int]]:
+        code = frame.f_code
+        if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+            return None
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            key = (code.co_name, code.co_filename, code.co_firstlineno)
+            index = self.frames.get(key)
+            if index is None:
+                index = self.frames[key] = len(self.frames)
+            stack.append(index)
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def run(self):
+        last = time.perf_counter()
+        while not self._stop_event.wait(self.interval):
+            now = time.perf_counter()
+            for ident, frame in sys._current_frames().items():
+                if ident == self.ident:
+                    continue
+                stack = self._stack(frame)
+                if stack is not None:
+                    self.samples.setdefault(ident, []).append((stack, now - last))
+            last = now
+        self.thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class Profile:
+    """One profiled request: stack samples plus the SQL it ran."""
+
+    def __init__(self, profile_id: str, method: str, path: str, interval: float):
+        self.id = profile_id
+        self.name = f"{method} {path}"
+        self.sampler = Sampler(interval)
+        self.statements: List[Statement] = []
+        self.request_threads = {threading.get_ident()}
+        self.started = self.finished = 0.0
+        self.status: Optional[int] = None
+
+    def start(self):
+        # A busy thread otherwise holds the GIL for the default 5 ms switch interval, starving the sampler
+        self._switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self._switch_interval, self.sampler.interval / 2))
+        self.started = time.perf_counter()
+        self.sampler.start()
+
+    def stop(self):
+        self.sampler.stop()
+        self.finished = time.perf_counter()
+        sys.setswitchinterval(self._switch_interval)
+
+    def speedscope(self) -> dict:
+        frames = [{"name": name, "file": file, "line": line} for (name, file, line) in self.sampler.frames]
+        duration = (self.finished - self.started) * 1000
+        profiles = []
+        # The request's own threads first: the event loop and the worker threads that ran its SQL
+        threads = sorted(self.sampler.samples, key=lambda ident: (ident not in self.request_threads, ident))
+        for ident in threads:
+            samples = self.sampler.samples[ident]
+            profiles.append({
+                "type": "sampled",
+                "name": f"{self.sampler.thread_names.get(ident, 'thread')} ({ident})"
+                        + ("" if ident in self.request_threads else " [other]"),
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": sum(weight for _, weight in samples) * 1000,
+                "samples": [stack for stack, _ in samples],
+                "weights": [weight * 1000 for _, weight in samples],
+            })
+        events = []
+        for statement in self.statements:
+            frame = len(frames)
+            frames.append({"name": " ".join(statement.sql.split())[:MAX_SQL_LABEL], "file": "sql"})
+            opened = (statement.started - self.started) * 1000
+            events.append({"type": "O", "frame": frame, "at": opened})
+            events.append({"type": "C", "frame": frame, "at": opened + statement.duration * 1000})
+        profiles.append({"type": "evented", "name": f"SQL ({len(self.statements)} statements)",
+                         "unit": "milliseconds", "startValue": 0, "endValue": duration, "events": events})
+        return {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "name": f"{self.name} ({self.status}, {duration:.1f} ms)",
+            "exporter": "medbrief-profiling",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": profiles,
+            "sql": [{"statement": statement.sql, "parameters": statement.parameters,
+                     "started_ms": round((statement.started - self.started) * 1000, 3),
+                     "duration_ms": round(statement.duration * 1000, 3)} for statement in self.statements],
+        }
+
+
+_current: contextvars.ContextVar[Optional[Profile]] = contextvars.ContextVar("profile", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    if profile is None:
+        return
+    started = conn.info["profile_started"].pop()
+    thread = threading.get_ident()
+    profile.request_threads.add(thread)
+    profile.statements.append(Statement(statement, len(parameters) if executemany else 1, thread,
+                                        started, time.perf_counter() - started))
+
+
+def _requested(scope) -> bool:
+    # Raw byte checks: this runs on every request once profiling is enabled
+    query = scope["query_string"]
+    if b"profile=" in query and QueryParams(query).get("profile") == "1":
+        return True
+    for name, value in scope["headers"]:
+        if name == b"x-profile":
+            return value == b"1"
+    return False
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware; mounted only when profiling is enabled."""
+
+    def __init__(self, app, engine: Engine, settings: ProfilingSettings):
+        self.app = app
+        self.engine = engine
+        self.settings = settings
+        self._lock = threading.Lock()  # one profile at a time
+
+    def _authorized(self, headers: Headers) -> bool:
+        token = headers.get("x-profile-token", "")
+        return bool(self.settings.token) and hmac.compare_digest(token.encode(), self.settings.token.encode())
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        path = scope["path"]
+        if path.startswith("/profiles/") and scope["method"] == "GET":
+            return await self._download(scope, receive, send)
+        if not _requested(scope):
+            return await self.app(scope, receive, send)
+
+        if not self._authorized(Headers(scope=scope)):
+            return await JSONResponse({"detail": "Invalid profiling token"}, status_code=403)(scope, receive, send)
+        if not self._lock.acquire(blocking=False):
+            return await JSONResponse({"detail": "Another request is being profiled"}, status_code=409)(scope, receive, send)
+        try:
+            await self._profile(scope, receive, send)
+        finally:
+            self._lock.release()
+
+    async def _profile(self, scope, receive, send):
+        profile = Profile(f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}", scope["method"], scope["path"],
+                          self.settings.interval)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"x-profile-id", profile.id.encode())]}
+            await send(message)
+
+        event.listen(self.engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(self.engine, "after_cursor_execute", _after_cursor_execute)
+        token = _current.set(profile)
+        profile.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profile.stop()
+            _current.reset(token)
+            event.remove(self.engine, "before_cursor_execute", _before_cursor_execute)
+            event.remove(self.engine, "after_cursor_execute", _after_cursor_execute)
+            self._save(profile)
+
+    def _save(self, profile: Profile):
+        os.makedirs(self.settings.directory, exist_ok=True)
+        with open(os.path.join(self.settings.directory, f"{profile.id}.speedscope.json"), "w", encoding="utf-8") as f:
+            json.dump(profile.speedscope(), f)
+        saved = sorted(name for name in os.listdir(self.settings.directory) if name.endswith(".speedscope.json"))
+        for name in saved[:-self.settings.keep]:
+            os.remove(os.path.join(self.settings.directory, name))
+
+    async def _download(self, scope, receive, send):
+        if not self._authorized(Headers(scope=scope)):
+            response = JSONResponse({"detail": "Invalid profiling token"}, status_code=403)
+        else:
+            name = f"{os.path.basename(scope['path'])}.speedscope.json"
+            path = os.path.join(self.settings.directory, name)
+            if os.path.isfile(path):
+                response = FileResponse(path, media_type="application/json", filename=name)
+            else:
+                response = JSONResponse({"detail": "Profile not found"}, status_code=404)
+        await response(scope, receive, send)
@@ -0,0 +1,409 @@
+# PubMed 文献抓取 (E-utilities 兼容接口)
+# 1. esearch: 用主题关键词 (OR) 和 Entrez 日期窗口 [mindate, maxdate] 检索，结果保存在服务端历史 (WebEnv) 中；
+#    单个窗口超过 esearch 的结果上限时，按日期对半拆分窗口
+# 2. efetch: 按 batch_size 分批并发拉取记录 XML，边下载边解析 (XMLPullParser)，不在内存中保留整份响应
+# 3. 解析出的记录经队列交给写入协程，按 insert_batch_size 批量写入 (crud.create_literature_batch)，
+#    同一主题中已存在的 PMID 跳过
+# 所有请求经同一个 httpx 连接池，按主机限制并发数并以令牌桶限流 (NCBI: 无 API key 每秒 3 次，有 key 每秒 10 次)；
+# 限制在进程内所有客户端之间共享，同时进行的多个抓取合起来也不超过限额，
+# 429、5xx 和连接错误按指数退避重试。成功后记录主题的 last_fetched_date，下一次只检索这之后的窗口。
+# 测试和 benchmarks/bench_pubmed.py 使用 stubs.LocalEutilsServer。
+import asyncio
+import logging
+import os
+import re
+import sys
+import threading
+import weakref
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+from sqlalchemy.orm import Session
+
+import crud
+import literature_archive
+import literature_types
+import topic_registry
+from ratelimit import RetryableError, TokenBucket, retry_with_backoff
+
+logger = logging.getLogger(__name__)
+
+DATE_FORMAT = "%Y/%m/%d"
+MONTHS = {name: number for number, name in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], start=1)}
+
+
+@dataclass
+class EutilsSettings:
+    base_url: str = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
+    api_key: Optional[str] = None
+    tool: str = "medbrief"
+    email: Optional[str] = None
+    requests_per_second: float = 3.0  # per host; NCBI allows 10 with an API key
+    concurrency: int = 3  # requests in flight per host
+    batch_size: int = 200  # records per efetch
+    insert_batch_size: int = 1000  # records per database transaction
+    max_window_results: int = 9999  # esearch cannot page further; larger windows are split
+    lookback_days: int = 365  # window of a topic's first fetch
+    attempts: int = 5
+    backoff_base: float = 1.0
+    timeout: float = 60.0
+
+    @classmethod
+    def from_env(cls) -> "EutilsSettings":
+        env = os.environ.get
+        api_key = env("NCBI_API_KEY")
+        return cls(
+            base_url=env("EUTILS_BASE_URL", cls.base_url),
+            api_key=api_key,
+            email=env("NCBI_EMAIL"),
+            requests_per_second=float(env("EUTILS_REQUESTS_PER_SECOND", 10.0 if api_key else cls.requests_per_second)),
+            concurrency=int(env("EUTILS_CONCURRENCY", cls.concurrency)),
+            lookback_days=int(env("EUTILS_LOOKBACK_DAYS", cls.lookback_days)),
+        )
+
+
+@dataclass
+class SearchResult:
+    count: int
+    webenv: str
+    query_key: str
+
+
+@dataclass
+class FetchResult:
+    topic_id: int
+    mindate: date
+    maxdate: date
+    found: int = 0
+    fetched: int = 0
+    inserted: int = 0
+
+
+def build_term(keywords: Sequence[str]) -> str:
+    """Papers mentioning any of the keywords in title or abstract."""
+    terms = [keyword.replace('"', " ").strip() for keyword in keywords or []]
+    return " OR ".join(f'"{term}"[tiab]' for term in terms if term)
+
+
+# --- Parsing ---
+
+def _text(element: Optional[ET.Element]) -> str:
+    return " ".join("".join(element.itertext()).split()) if element is not None else ""
+
+
+def _date(element: Optional[ET.Element]) -> Optional[datetime]:
+    """A PubDate-style element (Year/Month/Day or MedlineDate such as "2025 Jan-Feb")."""
+    if element is None:
+        return None
+    year, month, day = element.findtext("Year"), element.findtext("Month"), element.findtext("Day")
+    if not year:
+        match = re.match(r"(\d{4})(?:\s+([A-Za-z]{3}))?", element.findtext("MedlineDate") or "")
+        if not match:
+            return None
+        year, month = match.groups()
+    if month and not month.isdigit():
+        month = MONTHS.get(month[:3].lower())
+    try:
+        return datetime(int(year), int(month or 1), int(day or 1))
+    except ValueError:
+        return datetime(int(year), 1, 1)
+
+
+def _author(author: ET.Element) -> Optional[str]:
+    last = author.findtext("LastName")
+    if not last:
+        return author.findtext("CollectiveName")
+    initials = author.findtext("Initials") or ""
+    return f"{last}, {'.'.join(initials)}." if initials else last
+
+
+def publication_type(types: Sequence[str]) -> str:
+    """The most specific publication type: the first one that has a canonical type, else the first listed."""
+    for value in types:
+        if literature_types.classify(value) != literature_types.OTHER:
+            return value
+    specific = [value for value in types if value.lower() != "journal article"]
+    return (specific or list(types) or ["Journal Article"])[0]
+
+
+def parse_article(article: ET.Element) -> Optional[dict]:
+    """models.Literature columns (plus pmid) of one <PubmedArticle>, or None if it has no PMID."""
+    citation = article.find("MedlineCitation")
+    pmid = citation.findtext("PMID") if citation is not None else None
+    info = citation.find("Article") if citation is not None else None
+    if not pmid or info is None:
+        return None
+    abstract = [
+        f"{node.get('Label')}: {_text(node)}" if node.get("Label") else _text(node)
+        for node in info.findall("Abstract/AbstractText")
+    ]
+    keywords = [_text(node) for node in citation.findall("KeywordList/Keyword")] or \
+        [_text(node) for node in citation.findall("MeshHeadingList/MeshHeading/DescriptorName")]
+    published = (_date(info.find("Journal/JournalIssue/PubDate")) or _date(info.find("ArticleDate"))
+                 or _date(article.find("PubmedData/History/PubMedPubDate[@PubStatus='pubmed']")))
+    return {
+        "pmid": pmid.strip(),
+        "title": _text(info.find("ArticleTitle")),
+        "authors": [name for name in map(_author, info.findall("AuthorList/Author")) if name],
+        "publication_date": published,
+        "journal_name": info.findtext("Journal/Title") or info.findtext("Journal/ISOAbbreviation") or "",
+        "keywords": [keyword for keyword in keywords if keyword],
+        "summary": "\n".join(abstract),
+        "literature_type": publication_type([_text(node) for node in info.findall("PublicationTypeList/PublicationType")]),
+    }
+
+
+class ArticleStream:
+    """Incremental <PubmedArticleSet> parser: feed it bytes as they arrive, get finished records back."""
+
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=("end",))
+
+    def _drain(self) -> List[dict]:
+        records = []
+        for _, element in self._parser.read_events():
+            if element.tag == "PubmedArticle":
+                record = parse_article(element)
+                element.clear()
+                if record is not None:
+                    records.append(record)
+        return records
+
+    def feed(self, data: bytes) -> List[dict]:
+        self._parser.feed(data)
+        return self._drain()
+
+    def close(self) -> List[dict]:
+        self._parser.close()
+        return self._drain()
+
+
+# --- E-utilities client ---
+
+# Per-host limits shared by every client in the process; one set per event loop, which asyncio primitives are bound to
+_host_limits: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Tuple[asyncio.Semaphore, TokenBucket]]]" = \
+    weakref.WeakKeyDictionary()
+_host_limits_lock = threading.Lock()
+
+
+class EutilsClient:
+    """
+    Pooled async client. Concurrency and rate limits are per host and shared by all requests of all clients
+    in the process; the first client to reach a host sets them from its settings.
+    """
+
+    def __init__(self, settings: Optional[EutilsSettings] = None):
+        self.settings = settings or EutilsSettings.from_env()
+        self.http = httpx.AsyncClient(timeout=httpx.Timeout(self.settings.timeout),
+                                      limits=httpx.Limits(max_connections=self.settings.concurrency))
+        self.requests_sent = 0
+
+    async def close(self):
+        await self.http.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def _url(self, endpoint: str) -> str:
+        return f"{self.settings.base_url.rstrip('/')}/{endpoint}"
+
+    def _params(self, params: dict) -> dict:
+        common = {"db": "pubmed", "tool": self.settings.tool}
+        if self.settings.email:
+            common["email"] = self.settings.email
+        if self.settings.api_key:
+            common["api_key"] = self.settings.api_key
+        return {**common, **params}
+
+    def _limits(self, url: str) -> Tuple[asyncio.Semaphore, TokenBucket]:
+        host = urlsplit(url).netloc
+        with _host_limits_lock:
+            limits = _host_limits.setdefault(asyncio.get_running_loop(), {})
+            if host not in limits:
+                limits[host] = (asyncio.Semaphore(self.settings.concurrency),
+                                TokenBucket(self.settings.requests_per_second))
+            return limits[host]
+
+    async def _request(self, endpoint: str, params: dict, handle):
+        """GET with the host's limits; handle(response) consumes the streamed body."""
+        url = self._url(endpoint)
+        semaphore, bucket = self._limits(url)
+
+        async def attempt():
+            async with semaphore:
+                await bucket.acquire()
+                self.requests_sent += 1
+                try:
+                    async with self.http.stream("GET", url, params=self._params(params)) as response:
+                        if response.status_code == 429 or response.status_code >= 500:
+                            raise RetryableError(f"{endpoint} returned {response.status_code}")
+                        response.raise_for_status()
+                        return await handle(response)
+                except httpx.TransportError as exc:
+                    raise RetryableError(f"{endpoint}: {exc}") from exc
+
+        return await retry_with_backoff(attempt, attempts=self.settings.attempts,
+                                        base_delay=self.settings.backoff_base)
+
+    async def esearch(self, term: str, mindate: date, maxdate: date) -> SearchResult:
+        params = {"term": term, "datetype": "edat", "mindate": mindate.strftime(DATE_FORMAT),
+                  "maxdate": maxdate.strftime(DATE_FORMAT), "usehistory": "y", "retmax": 0, "retmode": "json"}
+
+        async def handle(response):
+            await response.aread()
+            result = response.json()["esearchresult"]
+            return SearchResult(int(result["count"]), result.get("webenv", ""), str(result.get("querykey", "")))
+
+        return await self._request("esearch.fcgi", params, handle)
+
+    async def search(self, term: str, mindate: date, maxdate: date) -> List[SearchResult]:
+        """Searches covering [mindate, maxdate], split by date until each fits in max_window_results."""
+        result = await self.esearch(term, mindate, maxdate)
+        if result.count <= self.settings.max_window_results or mindate >= maxdate:
+            if result.count > self.settings.max_window_results:
+                logger.warning("%s matches %s papers on %s; only the first %s are fetched", term, result.count,
+                               mindate, self.settings.max_window_results)
+            return [result] if result.count else []
+        middle = mindate + (maxdate - mindate) // 2
+        first, second = await asyncio.gather(self.search(term, mindate, middle),
+                                             self.search(term, middle + timedelta(days=1), maxdate))
+        return first + second
+
+    async def efetch(self, search: SearchResult, start: int, count: int) -> List[dict]:
+        """Records [start, start + count) of a search, parsed while the response streams in."""
+        params = {"WebEnv": search.webenv, "query_key": search.query_key, "retstart": start, "retmax": count,
+                  "rettype": "abstract", "retmode": "xml"}
+
+        async def handle(response):
+            stream = ArticleStream()
+            records = []
+            async for chunk in response.aiter_bytes():
+                records.extend(stream.feed(chunk))
+            return records + stream.close()
+
+        return await self._request("efetch.fcgi", params, handle)
+
+    def batches(self, searches: Iterable[SearchResult]):
+        size = self.settings.batch_size
+        for search in searches:
+            for start in range(0, min(search.count, self.settings.max_window_results), size):
+                yield search, start, size
+
+
+# --- Fetching into a topic ---
+
+def _insert(db: Session, topic_id: int, records: List[dict], seen: set) -> int:
+    """Insert records whose PMID the topic does not have yet; returns the number inserted."""
+    pmids = {record["pmid"] for record in records} - seen
+    literature = literature_archive.literature_entity(db)
+    existing = {
+        pmid for (pmid,) in db.query(literature.pmid)
+        .filter(literature.topic_id == topic_id, literature.pmid.in_(pmids))
+    }
+    items = []
+    for record in records:
+        if record["pmid"] in seen or record["pmid"] in existing or record["publication_date"] is None:
+            continue
+        seen.add(record["pmid"])
+        items.append(record)
+    if items:
+        crud.create_literature_batch(db, items, topic_id)
+    return len(items)
+
+
+def _advance_window(db: Session, topic, maxdate: date):
+    topic.last_fetched_date = maxdate
+    db.commit()
+    topic_registry.put(topic)
+
+
+async def fetch_topic(db: Session, topic_id: int, client: EutilsClient,
+                      today: Optional[date] = None) -> Optional[FetchResult]:
+    """
+    Fetch the topic's new papers since its last fetch (or the lookback window) up to today.
+    Returns None if the topic does not exist. The fetch window only advances when the whole fetch succeeds.
+    Database work runs in worker threads, off the event loop.
+    """
+    topic = await asyncio.to_thread(crud.get_topic, db, topic_id)
+    if topic is None:
+        return None
+    maxdate = today or datetime.utcnow().date()
+    # The last day is searched again: papers indexed later that day are caught, duplicates skipped by PMID
+    mindate = topic.last_fetched_date or maxdate - timedelta(days=client.settings.lookback_days)
+    result = FetchResult(topic_id=topic_id, mindate=mindate, maxdate=maxdate)
+    term = build_term(topic.keywords)
+    if not term:
+        return result
+
+    searches = await client.search(term, mindate, maxdate)
+    result.found = sum(search.count for search in searches)
+
+    queue: asyncio.Queue = asyncio.Queue()
+    seen: set = set()
+
+    async def insert_worker():
+        pending = []
+        while True:
+            records = await queue.get()
+            if records is not None:
+                pending.extend(records)
+            if pending and (records is None or len(pending) >= client.settings.insert_batch_size):
+                # Off the event loop, so fetching continues while a batch is written
+                result.inserted += await asyncio.to_thread(_insert, db, topic_id, pending, seen)
+                pending = []
+            if records is None:
+                return
+
+    async def fetch_batch(search, start, count):
+        records = await client.efetch(search, start, count)
+        result.fetched += len(records)
+        await queue.put(records)
+
+    inserter = asyncio.create_task(insert_worker())
+    try:
+        await asyncio.gather(*(fetch_batch(*batch) for batch in client.batches(searches)))
+    finally:
+        await queue.put(None)
+        await inserter
+
+    await asyncio.to_thread(_advance_window, db, topic, maxdate)
+    return result
+
+
+async def fetch_topics(db: Session, topic_ids: Sequence[int],
+                       settings: Optional[EutilsSettings] = None) -> List[FetchResult]:
+    """Fetch several topics one after another over one client, so they share its limits."""
+    results = []
+    async with EutilsClient(settings) as client:
+        for topic_id in topic_ids:
+            result = await fetch_topic(db, topic_id, client)
+            if result is not None:
+                results.append(result)
+    return results
+
+
+def main():
+    """Fetch new PubMed papers for the given topic ids (all topics without arguments)."""
+    from database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        topic_ids = [int(arg) for arg in sys.argv[1:]] or [topic.id for topic in crud.get_topics(db, limit=None)]
+        for result in asyncio.run(fetch_topics(db, topic_ids)):
+            print(f"topic {result.topic_id}: {result.mindate}..{result.maxdate} found {result.found}, "
+                  f"fetched {result.fetched}, inserted {result.inserted}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+# PubMed 年度基线 (baseline) 文件导入
+# 用法: python pubmed_import.py <pubmed25n0001.xml.gz | 目录> ... [--processes N] [--topics 1 2 ...]
+# - 解析: 每个文件由进程池中的一个进程以 iterparse 流式解析 (gzip 或未压缩的 XML)，每篇文章处理完即清除已解析的元素，
+#   内存占用与文件大小无关；文章按 pubmed.parse_article 映射为 literature 字段
+# - 分配: 所有主题的关键词编译为一个 keyword_router.KeywordRouter 随任务发给各进程，每篇文章一次扫描即得到
+#   标题、摘要或关键词命中的全部主题，未命中任何主题的文章丢弃
+# - 写入: 各进程把命中的记录分块送入队列，由主进程中唯一的写入者批量写入 SQLite (同一主题已有的 PMID 跳过)
+# - 断点续传: 每个文件已扫描的文章数 (import_progress 表) 与对应的文献在同一事务中提交；
+#   中断后重新运行同样的命令，已完成的文件跳过，未完成的文件跳过已提交的部分继续
+import argparse
+import glob
+import gzip
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+import keyword_router
+import literature_archive
+import models
+import pubmed
+import relevance
+import similarity
+
+logger = logging.getLogger(__name__)
+
+CHUNK_ARTICLES = 2000  # articles scanned per message from a worker
+WRITE_BATCH = 5000  # records per writer transaction
+PROGRESS_INTERVAL = 10.0  # seconds between progress lines
+
+_queue = None  # the worker's end of the record queue, set by _init_worker
+
+
+@dataclass
+class ImportResult:
+    files: int = 0
+    skipped_files: int = 0
+    articles: int = 0
+    inserted: int = 0
+    failed: Dict[str, str] = field(default_factory=dict)
+
+
+def open_dump(path: str):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+def iter_articles(stream, skip: int = 0):
+    """(position, record) for each <PubmedArticle> after the first `skip`, in constant memory."""
+    context = ET.iterparse(stream, events=("start", "end"))
+    _, root = next(context)
+    position = 0
+    for event, element in context:
+        if event != "end" or element.tag != "PubmedArticle":
+            continue
+        position += 1
+        if position > skip:
+            yield position, pubmed.parse_article(element)
+        root.clear()  # drops every finished article; the set element itself stays tiny
+
+
+def _init_worker(record_queue):
+    global _queue
+    _queue = record_queue
+
+
+def _scan_file(path: str, skip: int, router: keyword_router.KeywordRouter) -> int:
+    """Worker: parse one dump and send the matching records in chunks; returns the articles scanned."""
+    matched: Dict[int, List[dict]] = {}
+    position = skip
+    with open_dump(path) as stream:
+        for position, record in iter_articles(stream, skip):
+            if record is not None and record["publication_date"] is not None:
+                for topic_id, _ in router.route(record["title"], record["summary"], record["keywords"]):
+                    matched.setdefault(topic_id, []).append(record)
+            if position % CHUNK_ARTICLES == 0:
+                _queue.put((path, position, matched, False))
+                matched = {}
+    _queue.put((path, position, matched, True))
+    return position
+
+
+def _progress(db: Session, paths: Sequence[str]) -> Dict[str, models.ImportProgress]:
+    names = [os.path.basename(path) for path in paths]
+    return {row.file_name: row for row in
+            db.query(models.ImportProgress).filter(models.ImportProgress.file_name.in_(names))}
+
+
+def write_records(db: Session, records_by_topic: Dict[int, List[dict]], progress: Dict[str, Tuple[int, bool]]) -> int:
+    """
+    Insert records (skipping PMIDs a topic already has) and record how far each file was scanned,
+    in one transaction. Returns the number of papers inserted.
+    """
+    new_ids: Dict[int, List[int]] = {}
+    literature = literature_archive.literature_entity(db)  # imported history is mostly archived
+    for topic_id, records in records_by_topic.items():
+        pmids = {record["pmid"] for record in records}
+        seen = {pmid for (pmid,) in db.query(literature.pmid)
+                .filter(literature.topic_id == topic_id, literature.pmid.in_(pmids))}
+        papers = []
+        for record in records:
+            if record["pmid"] not in seen:
+                seen.add(record["pmid"])
+                papers.append(models.Literature(**record, topic_id=topic_id))
+        db.add_all(papers)
+        db.flush()
+        new_ids[topic_id] = [paper.id for paper in papers]
+    for topic_id, literature_ids in new_ids.items():
+        relevance.score_literature(db.connection(), topic_id, literature_ids)
+
+    now = datetime.utcnow()
+    for file_name, (articles, complete) in progress.items():
+        db.merge(models.ImportProgress(file_name=file_name, articles_done=articles, updated_at=now,
+                                       completed_at=now if complete else None))
+    db.commit()
+    similarity.index_new_literature(db.connection())
+    return sum(len(ids) for ids in new_ids.values())
+
+
+def expand_paths(arguments: Sequence[str]) -> List[str]:
+    paths = []
+    for argument in arguments:
+        if os.path.isdir(argument):
+            paths.extend(sorted(glob.glob(os.path.join(argument, "*.xml.gz")) + glob.glob(os.path.join(argument, "*.xml"))))
+        else:
+            paths.append(argument)
+    return paths
+
+
+def import_dumps(session_factory: Callable[[], Session], paths: Sequence[str], processes: Optional[int] = None,
+                 topic_ids: Optional[Sequence[int]] = None,
+                 report: Callable[[str], None] = logger.info) -> ImportResult:
+    """Import baseline files into the topics whose keywords they mention (all live topics by default)."""
+    result = ImportResult()
+    db = session_factory()
+    try:
+        query = db.query(models.Topic).filter(models.Topic.deleted_at.is_(None))
+        if topic_ids:
+            query = query.filter(models.Topic.id.in_(list(topic_ids)))
+        router = keyword_router.KeywordRouter()
+        for topic in query:
+            router.set_topic(topic.id, topic.keywords or [])
+
+        done = _progress(db, paths)
+        todo = []
+        for path in paths:
+            row = done.get(os.path.basename(path))
+            if row is not None and row.completed_at is not None:
+                result.skipped_files += 1
+            else:
+                todo.append((path, row.articles_done if row else 0))
+        if not todo or not router.topic_ids:
+            return result
+
+        record_queue = multiprocessing.get_context().Queue(maxsize=64)  # bounds what workers can run ahead
+        processes = min(processes or os.cpu_count() or 1, len(todo))
+        started = last_report = time.perf_counter()
+        with ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(record_queue,)) as pool:
+            futures = {pool.submit(_scan_file, path, skip, router): path for path, skip in todo}
+            scanned = {path: skip for path, skip in todo}
+            pending: Dict[int, List[dict]] = {}
+            pending_progress: Dict[str, Tuple[int, bool]] = {}
+            pending_count = 0
+
+            def flush():
+                nonlocal pending, pending_progress, pending_count
+                if pending_progress:
+                    result.inserted += write_records(db, pending, pending_progress)
+                pending, pending_progress, pending_count = {}, {}, 0
+
+            def receive(message):
+                nonlocal pending_count
+                path, position, matched, complete = message
+                result.articles += position - scanned[path]
+                scanned[path] = position
+                for topic_id, records in matched.items():
+                    pending.setdefault(topic_id, []).extend(records)
+                    pending_count += len(records)
+                pending_progress[os.path.basename(path)] = (position, complete)
+                if complete:
+                    result.files += 1
+                    remaining.discard(path)
+                if complete or pending_count >= WRITE_BATCH:
+                    flush()
+
+            # A file is finished when its last chunk arrives (or its worker failed), not when its future is done:
+            # queued chunks may still be in transit after the worker returned
+            remaining = set(scanned)
+            while remaining:
+                try:
+                    receive(record_queue.get(timeout=0.2))
+                except queue.Empty:
+                    for future, path in futures.items():
+                        if path in remaining and future.done() and future.exception() is not None:
+                            remaining.discard(path)
+                            result.failed[path] = repr(future.exception())
+                            report(f"{os.path.basename(path)} failed after {scanned[path]} articles: "
+                                   f"{future.exception()!r}")
+                now = time.perf_counter()
+                if now - last_report >= PROGRESS_INTERVAL:
+                    last_report = now
+                    report(f"{result.files}/{len(todo)} files, {result.articles:,} articles "
+                           f"({result.articles / (now - started):,.0f}/s), {result.inserted:,} papers imported")
+            while not record_queue.empty():
+                receive(record_queue.get())
+            flush()
+        report(f"done: {result.files} files, {result.articles:,} articles in {time.perf_counter() - started:.1f} s, "
+               f"{result.inserted:,} papers imported, {len(result.failed)} failed")
+        return result
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import PubMed baseline XML files into the topics they match.")
+    parser.add_argument("paths", nargs="+", help="baseline files (.xml.gz or .xml) or directories containing them")
+    parser.add_argument("--processes", type=int, default=None, help="parser processes (default: CPU count)")
+    parser.add_argument("--topics", type=int, nargs="*", help="only import into these topic ids")
+    args = parser.parse_args()
+
+    from database import SessionLocal, engine
+    import migrations
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    migrations.upgrade(engine)
+    result = import_dumps(SessionLocal, expand_paths(args.paths), processes=args.processes, topic_ids=args.topics)
+    sys.exit(1 if result.failed else 0)
+
+
+if __name__ == "__main__":
+    main()
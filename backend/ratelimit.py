@@ -0,0 +1,55 @@
+# 异步限流与重试，供通知推送等访问外部服务的模块共用
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Tuple, Type, TypeVar
+
+T = TypeVar("T")
+
+
+class TokenBucket:
+    """
+    Async token bucket: `rate` tokens per second, bursts of up to `capacity`.
+    A rate of 0 or less disables limiting.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: float = 1.0):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+class RetryableError(Exception):
+    """Raised by callers to mark a failure as transient, e.g. an HTTP 429 or 5xx."""
+
+
+async def retry_with_backoff(
+    func: Callable[[], Awaitable[T]],
+    attempts: int = 4,
+    base_delay: float = 0.5,
+    max_delay: float = 30.0,
+    retry_on: Tuple[Type[BaseException], ...] = (RetryableError,),
+) -> T:
+    """Await func(), retrying transient errors with exponential backoff and full jitter."""
+    for attempt in range(1, attempts + 1):
+        try:
+            return await func()
+        except retry_on:
+            if attempt == attempts:
+                raise
+            await asyncio.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1))))
@@ -0,0 +1,213 @@
+# 文献与主题关键词的相关度打分
+# 文献在写入时按批次打分并存入 literature.relevance_score，列表按相关度排序时直接走索引
+#
+# 文献向量: 标题 + 摘要 + 关键词 的 1-2 gram 哈希特征，次线性 TF 后做 L2 归一化
+# 主题向量: 关键词的哈希特征，按 IDF 加权；IDF 只需要主题关键词所在的那几列，
+#           文档频次和文献总数保存在 topics.relevance_stats 中，随每个批次累加
+# 冻结的 IDF: 主题的所有分数都按同一份统计 (scored_n / scored_df) 计算，新批次也按它打分，不同批次的分数可以比较；
+#           累加的统计与它相差超过 RESCORE_DRIFT，或累加的文献总数与 topics.literature_count 不符 (文献被删除)，
+#           就重新统计并为整个主题重新打分，再冻结新的统计
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+from sqlalchemy import bindparam, select, update
+
+import literature_archive
+import models
+
+BATCH_SIZE = 2000
+RESCORE_DRIFT = 0.1  # largest relative change of a keyword weight before the whole topic is rescored
+
+# 无状态，可在进程内共享，不需要 fit
+vectorizer = HashingVectorizer(
+    n_features=2 ** 20,
+    ngram_range=(1, 2),
+    stop_words="english",
+    alternate_sign=False,
+    norm=None,
+    dtype=np.float32,
+)
+
+
+def document_text(title: Optional[str], summary: Optional[str], keywords: Optional[Sequence[str]]) -> str:
+    return " . ".join([title or "", summary or "", " . ".join(keywords or [])])
+
+
+def query_columns(keywords: Sequence[str]) -> np.ndarray:
+    """Hashed feature columns of the topic keywords, each keyword vectorized on its own."""
+    if not keywords:
+        return np.zeros(0, dtype=np.int64)
+    return np.unique(vectorizer.transform(list(keywords)).indices).astype(np.int64)
+
+
+def document_matrix(texts: List[str]) -> sparse.csr_matrix:
+    """Sublinear-TF, L2-normalized document vectors."""
+    matrix = vectorizer.transform(texts).tocsr()
+    np.log1p(matrix.data, out=matrix.data)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.diags(1.0 / norms) @ matrix
+
+
+class TopicScorer:
+    """
+    Scores batches of documents against one topic's keywords and accumulates the IDF statistics.
+    Scores use the frozen statistics (scored_count, scored_frequency) until freeze() is called.
+    """
+
+    def __init__(self, keywords: Sequence[str], stats: Optional[Dict] = None):
+        self.columns = query_columns(keywords)
+        stats = stats or {}
+        if stats.get("columns") == self.columns.tolist():
+            self.document_count = stats["n"]
+            self.document_frequency = np.asarray(stats["df"], dtype=np.int64)
+            self.scored_count = stats.get("scored_n", self.document_count)
+            self.scored_frequency = np.asarray(stats.get("scored_df", stats["df"]), dtype=np.int64)
+        else:
+            # Keywords changed since the stats were recorded, start over
+            self.document_count = self.scored_count = 0
+            self.document_frequency = np.zeros(len(self.columns), dtype=np.int64)
+            self.scored_frequency = self.document_frequency.copy()
+
+    def stats(self) -> Dict:
+        return {"columns": self.columns.tolist(), "n": self.document_count, "df": self.document_frequency.tolist(),
+                "scored_n": self.scored_count, "scored_df": self.scored_frequency.tolist()}
+
+    def idf(self) -> np.ndarray:
+        return np.log((1.0 + self.scored_count) / (1.0 + self.scored_frequency)) + 1.0
+
+    def freeze(self):
+        """Score with the statistics accumulated so far from now on."""
+        self.scored_count = self.document_count
+        self.scored_frequency = self.document_frequency.copy()
+
+    def drift(self) -> float:
+        """Largest relative change of a keyword weight between the frozen and the accumulated statistics."""
+        if not len(self.columns):
+            return 0.0
+        frozen = self.idf()
+        current = np.log((1.0 + self.document_count) / (1.0 + self.document_frequency)) + 1.0
+        frozen, current = frozen / np.linalg.norm(frozen), current / np.linalg.norm(current)
+        return float(np.max(np.abs(current - frozen) / frozen))
+
+    def observe(self, texts: List[str]) -> sparse.csr_matrix:
+        """Vectorize a batch and fold it into the document frequencies."""
+        matrix = document_matrix(texts)
+        if len(self.columns):
+            hits = matrix[:, self.columns]
+            self.document_frequency += np.diff(hits.tocsc().indptr)
+        self.document_count += matrix.shape[0]
+        return matrix
+
+    def score(self, matrix: sparse.csr_matrix) -> np.ndarray:
+        if not len(self.columns):
+            return np.zeros(matrix.shape[0], dtype=np.float64)
+        weights = self.idf()
+        weights = weights / np.linalg.norm(weights)
+        return np.asarray(matrix[:, self.columns] @ weights).ravel().astype(np.float64)
+
+    def observe_and_score(self, texts: List[str]) -> np.ndarray:
+        return self.score(self.observe(texts))
+
+
+def _load_topic(connection, topic_id: int) -> Tuple[List[str], Optional[Dict], int]:
+    topics = models.Topic.__table__
+    row = connection.execute(
+        select(topics.c.keywords, topics.c.relevance_stats, topics.c.literature_count).where(topics.c.id == topic_id)
+    ).first()
+    if row is None:
+        return [], None, 0
+    return list(row.keywords or []), row.relevance_stats, row.literature_count or 0
+
+
+def _save_scores(connection, scores: Iterable[Tuple[int, float]], tables=(models.Literature.__table__,)):
+    params = [{"literature_id": literature_id, "score": score} for literature_id, score in scores]
+    if not params:
+        return
+    for literature in tables:
+        connection.execute(
+            update(literature)
+            .where(literature.c.id == bindparam("literature_id"))
+            .values(relevance_score=bindparam("score")),
+            params,
+        )
+
+
+def score_literature(connection, topic_id: int, literature_ids: Sequence[int]):
+    """
+    Score newly ingested literature of one topic, BATCH_SIZE rows at a time, against the topic's frozen
+    statistics. The whole topic is rescored instead when it has none yet, and afterwards when the statistics
+    drifted by more than RESCORE_DRIFT or papers were removed since they were counted.
+    Runs on the caller's connection so the scores commit together with the inserted rows.
+    """
+    keywords, stats, paper_count = _load_topic(connection, topic_id)
+    scorer = TopicScorer(keywords, stats)
+    if len(scorer.columns) and not scorer.scored_count:
+        rescore_topic(connection, topic_id)
+        return
+    literature = models.Literature.__table__
+
+    for start in range(0, len(literature_ids), BATCH_SIZE):
+        batch_ids = list(literature_ids[start:start + BATCH_SIZE])
+        rows = connection.execute(
+            select(literature.c.id, literature.c.title, literature.c.summary, literature.c.keywords)
+            .where(literature.c.id.in_(batch_ids))
+        ).all()
+        scores = scorer.observe_and_score([document_text(r.title, r.summary, r.keywords) for r in rows])
+        _save_scores(connection, zip((r.id for r in rows), scores.tolist()))
+
+    if len(scorer.columns) and (scorer.drift() > RESCORE_DRIFT or scorer.document_count != paper_count):
+        rescore_topic(connection, topic_id)  # counts the remaining papers again, so removals are accounted for
+        return
+    _save_stats(connection, topic_id, scorer)
+
+
+def rescore_topic(connection, topic_id: int):
+    """
+    Recompute every score of a topic with one consistent IDF, e.g. after its keywords changed or its
+    statistics drifted. Two passes: the first collects document frequencies, the second scores.
+    """
+    keywords, _, _ = _load_topic(connection, topic_id)
+    scorer = TopicScorer(keywords)
+    # Archived papers are rescored too; each id is in one of the tiers, the update of the other matches nothing
+    tables = literature_archive.tables(connection)
+    literature = literature_archive.literature_table(connection)
+    ids_query = select(literature.c.id).where(literature.c.topic_id == topic_id).order_by(literature.c.id)
+    literature_ids = connection.execute(ids_query).scalars().all()
+
+    def batches():
+        for start in range(0, len(literature_ids), BATCH_SIZE):
+            batch_ids = literature_ids[start:start + BATCH_SIZE]
+            rows = connection.execute(
+                select(literature.c.id, literature.c.title, literature.c.summary, literature.c.keywords)
+                .where(literature.c.id.in_(batch_ids))
+            ).all()
+            yield rows, [document_text(r.title, r.summary, r.keywords) for r in rows]
+
+    for _, texts in batches():
+        scorer.observe(texts)
+    scorer.freeze()
+    for rows, texts in batches():
+        scores = scorer.score(document_matrix(texts))
+        _save_scores(connection, zip((r.id for r in rows), scores.tolist()), tables)
+
+    _save_stats(connection, topic_id, scorer)
+
+
+def _save_stats(connection, topic_id: int, scorer: TopicScorer):
+    topics = models.Topic.__table__
+    connection.execute(update(topics).where(topics.c.id == topic_id).values(relevance_stats=scorer.stats()))
+
+
+def backfill(connection):
+    """Score topics that still have unscored literature."""
+    literature = models.Literature.__table__
+    topic_ids = connection.execute(
+        select(literature.c.topic_id)
+        .where(literature.c.relevance_score.is_(None), literature.c.topic_id.isnot(None))
+        .distinct()
+    ).scalars().all()
+    for topic_id in topic_ids:
+        rescore_topic(connection, topic_id)
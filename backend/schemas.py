@@ -1,7 +1,7 @@
 import json
 from pydantic import BaseModel, Field, validator
-from typing import List, Optional, Literal
-from datetime import datetime, time
+from typing import List, Optional, Literal, get_args
+from datetime import datetime, time, date
 
 # --- Base Models ---
 
@@ -33,6 +33,12 @@ class Topic(TopicBase):
     detection_time: Optional[time]
     notification_channels: List[str]
     template: str
+    # Summary for the topic list, maintained on every literature, update and push write
+    literature_count: int = 0
+    last_update_status: Optional[str] = None
+    last_update_time: Optional[datetime] = None
+    latest_ppt_link: Optional[str] = None
+    last_push_time: Optional[datetime] = None
 
     class Config:
         from_attributes = True
@@ -44,6 +50,9 @@ class UpdateRecord(BaseModel):
     timestamp: datetime
     status: Literal["success", "failed"]
     ppt_preview_link: Optional[str] = None
+    from_literature_id: Optional[int] = None
+    to_literature_id: Optional[int] = None
+    new_literature_count: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -55,6 +64,9 @@ class TopicHistory(BaseModel):
 
 # --- Literature ---
 
+LiteratureOrder = Literal["date", "relevance"]
+ExportFormat = Literal["csv", "ndjson", "parquet"]
+
 class Literature(BaseModel):
     id: int
     title: str
@@ -64,10 +76,58 @@ class Literature(BaseModel):
     keywords: List[str]
     summary: str
     literature_type: str
+    relevance_score: Optional[float] = None
+    pmid: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+LiteratureField = Literal["id", "title", "authors", "publication_date", "journal_name", "keywords", "summary",
+                          "literature_type", "relevance_score", "pmid"]
+LITERATURE_FIELDS = get_args(LiteratureField)
+
+class LiteratureListItem(BaseModel):
+    """A paper in a list. With a sparse fieldset only the requested fields are set, and only set fields are returned."""
+    id: int
+    title: Optional[str] = None
+    authors: Optional[List[str]] = None
+    publication_date: Optional[datetime] = None
+    journal_name: Optional[str] = None
+    keywords: Optional[List[str]] = None
+    summary: Optional[str] = None
+    summary_truncated: Optional[bool] = None  # set when summary_length was given
+    literature_type: Optional[str] = None
+    relevance_score: Optional[float] = None
+    pmid: Optional[str] = None
+
+class LiteratureDetail(Literature):
+    topic_id: int
+
+class SimilarLiterature(LiteratureListItem):
+    topic_id: int
+    similarity: float = 0.0
+
+class LiteratureFetchResult(BaseModel):
+    topic_id: int
+    mindate: date
+    maxdate: date
+    found: int
+    fetched: int
+    inserted: int
 
     class Config:
         from_attributes = True
 
+class PaperText(BaseModel):
+    title: str
+    summary: str = ""
+    keywords: List[str] = []
+
+class TopicAssignment(BaseModel):
+    paper: int  # index of the paper in the request
+    topic_id: int
+    score: float
+
 
 # --- PPT Push History ---
 
@@ -86,11 +146,29 @@ class PPTPushRecord(BaseModel):
 
     channel: str
     status: Literal["success", "failed", "pending"]
+    refused_recipients: Optional[List[str]] = None
     diff_summary: Optional[str] = None
 
     class Config:
         from_attributes = True
 
+class PPTPushRequest(BaseModel):
+    ppt_filename: str
+    recipients: List[str]
+
+class PPTSlideOutline(BaseModel):
+    index: int
+    title: str
+    lines: List[str]
+
+class PPTPreview(BaseModel):
+    filename: str
+    content_hash: str
+    size_bytes: int
+    slide_count: int
+    download_url: str
+    slides: List[PPTSlideOutline]
+
 # --- Literature Analysis ---
 
 class LiteratureAnalysisStats(BaseModel):
@@ -99,6 +177,8 @@ class LiteratureAnalysisStats(BaseModel):
     clinical_trial_count: int
     meta_analysis_count: int
 
+TrendGranularity = Literal["day", "week", "month", "quarter", "year"]
+
 class TrendDataPoint(BaseModel):
     date: str
     count: int
@@ -111,4 +191,78 @@ class LiteratureAnalysis(BaseModel):
     stats: LiteratureAnalysisStats
     trend_data: List[TrendDataPoint]
     distribution_data: List[DistributionDataPoint]
-    literature: List[Literature]
+    literature: List[LiteratureListItem]
+
+class TopicAnalysisSummary(BaseModel):
+    topic_id: int
+    stats: LiteratureAnalysisStats
+    trend_data: List[TrendDataPoint]
+    distribution_data: List[DistributionDataPoint]
+
+
+# --- Analysis Snapshots ---
+
+class AnalysisSnapshotInfo(BaseModel):
+    id: int
+    update_record_id: int
+    created_at: datetime
+    to_literature_id: int
+    literature_count: int
+
+    class Config:
+        from_attributes = True
+
+class AnalysisSnapshot(AnalysisSnapshotInfo):
+    stats: LiteratureAnalysisStats
+    trend_data: List[TrendDataPoint]
+    distribution_data: List[DistributionDataPoint]
+    literature_ids: Optional[List[int]] = None
+
+class CountChange(BaseModel):
+    key: str
+    before: int
+    after: int
+    change: int
+
+class AnalysisSnapshotDiff(BaseModel):
+    topic_id: int
+    before: AnalysisSnapshotInfo
+    after: AnalysisSnapshotInfo
+    stats: List[CountChange]
+    trend_data: List[CountChange]
+    distribution_data: List[CountChange]
+    added_literature_ids: List[int]
+    removed_literature_ids: List[int]
+
+# --- Keyword Trends ---
+
+class KeywordPair(BaseModel):
+    keyword_a: str
+    keyword_b: str
+    count: int
+    jaccard: float
+
+class KeywordGrowth(BaseModel):
+    keyword: str
+    current_count: int
+    previous_count: int
+    growth_score: float
+
+class KeywordTrends(BaseModel):
+    topic_id: int
+    paper_count: int
+    keyword_count: int
+    period_start: date
+    period_end: date
+    co_occurrences: List[KeywordPair]
+    emerging: List[KeywordGrowth]
+
+
+# --- Metrics ---
+
+class CoalescingStats(BaseModel):
+    name: str
+    calls: int
+    executions: int
+    coalesced: int
+    in_flight: int
@@ -0,0 +1,426 @@
+# 相似文献检索 (近似最近邻)，跨所有主题
+# - 向量: relevance.document_matrix 的哈希特征 (标题 + 摘要 + 关键词)，经固定种子的稀疏随机投影降到 DIMENSIONS 维并归一化，
+#   余弦相似度即点积；所有进程使用同一个投影，无需训练
+# - 索引: IVF。球面 k-means 得到 nlist 个中心，每篇文献归入最近的中心；查询时只比较最近 NPROBE 个中心里的文献
+# - 存储: INDEX_DIRECTORY 下的内存映射文件，向量 (float16)、文献 id、所属中心按文献 id 顺序追加写入，
+#   meta.json 记录当前版本、已写入的条数和最后一篇文献 id (水位)，最后原子替换，读者只读取 meta 中记录的条数
+# - 增量: 新文献只做投影和中心分配后追加；条数比上次训练时增长 RETRAIN_GROWTH 倍时重新训练中心并重新分配
+#   (写入新版本的文件，向量与 id 文件用硬链接复用)。写入用文件锁串行化，多个 worker 共用同一份索引
+# - 写入路径: 文献入库后只追加 (index_new_literature)；首次建立索引和重新训练耗时，交给后台线程
+#   (train_in_background，每个索引同时只有一个)，它逐批提交，不长时间占着数据库读锁；
+#   也可以用 python similarity.py 预先建立
+# - 删除: 被删除文献的 id 追加到墓碑文件，查询时排除；compact() 把其余条目写入新版本以回收空间
+import fcntl
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sklearn.random_projection import SparseRandomProjection
+from sqlalchemy import func, select
+
+import literature_archive
+import models
+import relevance
+
+logger = logging.getLogger(__name__)
+
+INDEX_DIRECTORY = "similarity_index"
+DIMENSIONS = 128
+NPROBE = 8
+MAX_LISTS = 4096
+MIN_TRAINING_SIZE = 1000  # below this every paper sits in one list, i.e. exact search
+RETRAIN_GROWTH = 4
+KMEANS_ITERATIONS = 8
+KMEANS_SAMPLE_PER_LIST = 32
+
+_literature = models.Literature.__table__
+_projection = SparseRandomProjection(n_components=DIMENSIONS, dense_output=True, random_state=0)
+_projection.fit(sparse.csr_matrix((1, relevance.vectorizer.n_features), dtype=np.float32))
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+def embed(texts: List[str]) -> np.ndarray:
+    return _normalize(_projection.transform(relevance.document_matrix(texts)))
+
+
+def train_centroids(vectors: np.ndarray, lists: int, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on a sample of the (unit length) vectors."""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), lists * KMEANS_SAMPLE_PER_LIST)
+    sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))], dtype=np.float32)
+    centroids = sample[rng.choice(sample_size, lists, replace=False)]
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        membership = sparse.csr_matrix((np.ones(sample_size, dtype=np.float32), (assignment, np.arange(sample_size))),
+                                       shape=(lists, sample_size))
+        sums = membership @ sample
+        empty = np.flatnonzero(np.diff(membership.indptr) == 0)
+        sums[empty] = sample[rng.choice(sample_size, len(empty))]  # reseed empty lists
+        centroids = _normalize(sums)
+    return centroids
+
+
+def assign(vectors: np.ndarray, centroids: np.ndarray, chunk: int = 65536) -> np.ndarray:
+    return np.concatenate([
+        np.argmax(np.asarray(vectors[start:start + chunk], dtype=np.float32) @ centroids.T, axis=1).astype(np.int32)
+        for start in range(0, len(vectors), chunk)
+    ] or [np.zeros(0, dtype=np.int32)])
+
+
+class SimilarityIndex:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.RLock()  # guards the mapped state below
+        self._write_lock = threading.Lock()
+        self._meta_stamp = None
+        self.meta = {"count": 0, "watermark": 0, "version": 0, "trained_count": 0, "deleted": 0}
+        self.vectors = np.zeros((0, DIMENSIONS), dtype=np.float16)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.deleted = np.zeros(0, dtype=np.int64)  # tombstones, sorted
+        self.centroids: Optional[np.ndarray] = None
+        self._members: List[np.ndarray] = []
+
+    # --- files ---
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _file(self, name: str, version: int) -> str:
+        stem, extension = name.split(".")
+        return self._path(f"{stem}-{version}.{extension}")
+
+    def _remove_version(self, version: int):
+        # Readers that mapped these files keep them until they reload
+        for name in ("vectors.f16", "ids.i64", "lists.i32", "deleted.i64", "centroids.npy"):
+            if os.path.exists(self._file(name, version)):
+                os.remove(self._file(name, version))
+
+    @staticmethod
+    def _map(path: str, dtype, count: int, shape=()) -> np.ndarray:
+        if count == 0:
+            return np.zeros((0,) + shape, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r", shape=(count,) + shape)
+
+    def _sync(self, retries: int = 3):
+        """Reload when another process (or this one) has published a new meta.json."""
+        try:
+            stat_result = os.stat(self._path("meta.json"))
+        except FileNotFoundError:
+            return
+        stamp = (stat_result.st_mtime_ns, stat_result.st_size, stat_result.st_ino)
+        if stamp == self._meta_stamp:
+            return
+        with open(self._path("meta.json")) as f:
+            meta = json.load(f)
+        try:
+            self._load(meta)
+        except FileNotFoundError:
+            if not retries:
+                raise
+            self._sync(retries - 1)  # a writer replaced this version meanwhile; read the newer meta
+            return
+        self.meta, self._meta_stamp = meta, stamp
+
+    def _load(self, meta: dict):
+        count, version, deleted = meta["count"], meta["version"], meta.get("deleted", 0)
+        self.vectors = self._map(self._file("vectors.f16", version), np.float16, count, (DIMENSIONS,))
+        self.ids = self._map(self._file("ids.i64", version), np.int64, count)
+        self.deleted = np.sort(self._map(self._file("deleted.i64", version), np.int64, deleted))
+        self.centroids, self._members = None, []
+        if count:
+            self.centroids = np.load(self._file("centroids.npy", version))
+            lists = self._map(self._file("lists.i32", version), np.int32, count)
+            order = np.argsort(lists, kind="stable")
+            bounds = np.searchsorted(lists[order], np.arange(len(self.centroids) + 1))
+            self._members = [order[bounds[i]:bounds[i + 1]] for i in range(len(self.centroids))]
+
+    def _publish(self, meta: dict):
+        temporary = self._path("meta.json.tmp")
+        with open(temporary, "w") as f:
+            json.dump(meta, f)
+        os.replace(temporary, self._path("meta.json"))
+
+    @staticmethod
+    def _append(path: str, array: np.ndarray, keep_bytes: int):
+        with open(path, "ab") as f:
+            f.truncate(keep_bytes)  # drop a tail left behind by an interrupted writer
+            f.write(np.ascontiguousarray(array).tobytes())
+
+    # --- writes ---
+
+    @contextmanager
+    def _writing(self):
+        """Serialize writers within the process and across processes; queries keep running meanwhile."""
+        os.makedirs(self.directory, exist_ok=True)
+        with self._write_lock, open(self._path("index.lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            with self._lock:
+                self._sync()
+            yield
+
+    def _commit(self, meta: dict):
+        self._publish(meta)
+        with self._lock:
+            self._sync()
+
+    def refresh(self, connection, batch_size: int = relevance.BATCH_SIZE, train: bool = True,
+                max_rows: Optional[int] = None) -> int:
+        """
+        Index literature added after the watermark, at most max_rows papers; returns the number added.
+        With train=False nothing is built or retrained: papers are only appended to the existing lists.
+        """
+        added = 0
+        literature = literature_archive.literature_table(connection)  # papers archived before they were indexed
+        with self._writing():
+            if not train and self.centroids is None:
+                return 0
+            while max_rows is None or added < max_rows:
+                if max_rows is not None:
+                    batch_size = min(batch_size, max_rows - added)
+                rows = connection.execute(
+                    select(literature.c.id, literature.c.title, literature.c.summary, literature.c.keywords)
+                    .where(literature.c.id > self.meta["watermark"])
+                    .order_by(literature.c.id)
+                    .limit(batch_size)
+                ).all()
+                if not rows:
+                    break
+                vectors = embed([relevance.document_text(r.title, r.summary, r.keywords) for r in rows])
+                self._add(np.array([r.id for r in rows], dtype=np.int64), vectors, train)
+                added += len(rows)
+        return added
+
+    def training_due(self, count: Optional[int] = None) -> bool:
+        """Whether the index has no lists yet, or has grown enough since training to need more of them."""
+        count = self.meta["count"] if count is None else count
+        if self.centroids is None:
+            return True
+        grown = count >= max(MIN_TRAINING_SIZE, self.meta["trained_count"] * RETRAIN_GROWTH)
+        return grown and len(self.centroids) < self._list_count(count)
+
+    def _add(self, ids: np.ndarray, vectors: np.ndarray, train: bool = True):
+        meta = dict(self.meta)
+        count, version = meta["count"], meta["version"]
+        self._append(self._file("vectors.f16", version), vectors.astype(np.float16), count * DIMENSIONS * 2)
+        self._append(self._file("ids.i64", version), ids, count * 8)
+        total = count + len(ids)
+
+        if train and self.training_due(total):
+            self._train(meta, total)
+        else:
+            self._append(self._file("lists.i32", version), assign(vectors, self.centroids), count * 4)
+        meta.update(count=total, watermark=int(ids[-1]))
+        self._commit_version(meta)
+
+    def _train(self, meta: dict, count: int):
+        """(Re)train: new centroid and assignment files under a new version, recorded in meta."""
+        version = meta["version"]
+        all_vectors = self._map(self._file("vectors.f16", version), np.float16, count, (DIMENSIONS,))
+        lists = self._list_count(count)
+        centroids = train_centroids(all_vectors, lists) if lists > 1 else _normalize(
+            np.asarray(all_vectors, dtype=np.float32).sum(axis=0, keepdims=True))
+        version += 1
+        for name in ("vectors.f16", "ids.i64", "deleted.i64"):
+            if os.path.exists(self._file(name, version - 1)):
+                os.link(self._file(name, version - 1), self._file(name, version))
+        np.save(self._file("centroids.npy", version), centroids)
+        assign(all_vectors, centroids).tofile(self._file("lists.i32", version))
+        meta.update(trained_count=count, version=version)
+
+    def _commit_version(self, meta: dict):
+        retrained = meta["version"] != self.meta["version"]
+        self._commit(meta)
+        if retrained:
+            self._remove_version(meta["version"] - 1)  # vectors and ids live on through the hard links
+
+    def train(self) -> bool:
+        """Retrain the lists if training_due(); returns whether it did."""
+        if not os.path.exists(self._path("meta.json")):
+            return False
+        with self._writing():
+            if not self.meta["count"] or not self.training_due():
+                return False
+            meta = dict(self.meta)
+            self._train(meta, meta["count"])
+            self._commit_version(meta)
+            return True
+
+    def remove(self, literature_ids):
+        """Tombstone deleted literature so queries no longer return it."""
+        if not os.path.exists(self._path("meta.json")):
+            return
+        with self._writing():
+            meta = dict(self.meta)
+            if not meta["count"]:
+                return
+            ids = np.asarray(list(literature_ids), dtype=np.int64)
+            if not len(ids):
+                return
+            self._append(self._file("deleted.i64", meta["version"]), ids, meta["deleted"] * 8)
+            meta["deleted"] += len(ids)
+            self._commit(meta)
+
+    def compact(self, chunk: int = 65536) -> int:
+        """Rewrite the index without tombstoned entries; returns the number of entries dropped."""
+        if not os.path.exists(self._path("meta.json")):
+            return 0
+        with self._writing():
+            meta = dict(self.meta)
+            if not meta["deleted"]:
+                return 0
+            version = meta["version"] + 1
+            lists = self._map(self._file("lists.i32", meta["version"]), np.int32, meta["count"])
+            kept = 0
+            with open(self._file("vectors.f16", version), "wb") as vectors_file, \
+                    open(self._file("ids.i64", version), "wb") as ids_file, \
+                    open(self._file("lists.i32", version), "wb") as lists_file:
+                for start in range(0, meta["count"], chunk):
+                    ids = np.asarray(self.ids[start:start + chunk])
+                    keep = ~np.isin(ids, self.deleted)
+                    vectors_file.write(np.asarray(self.vectors[start:start + chunk])[keep].tobytes())
+                    ids_file.write(ids[keep].tobytes())
+                    lists_file.write(np.asarray(lists[start:start + chunk])[keep].tobytes())
+                    kept += int(keep.sum())
+            np.save(self._file("centroids.npy", version), self.centroids)
+            dropped = meta["count"] - kept
+            meta.update(count=kept, version=version, deleted=0)
+            self._commit(meta)
+            self._remove_version(version - 1)
+            return dropped
+
+    @staticmethod
+    def _list_count(count: int) -> int:
+        if count < MIN_TRAINING_SIZE:
+            return 1
+        return int(min(MAX_LISTS, np.sqrt(count)))
+
+    # --- reads ---
+
+    def vector_of(self, literature_id: int) -> Optional[np.ndarray]:
+        row = int(np.searchsorted(self.ids, literature_id))
+        if row < len(self.ids) and self.ids[row] == literature_id:
+            return np.asarray(self.vectors[row], dtype=np.float32)
+        return None
+
+    def search(self, vector: np.ndarray, k: int, nprobe: int = NPROBE) -> List[Tuple[int, float]]:
+        """Top-k (literature id, cosine similarity) among the nprobe lists closest to the vector."""
+        with self._lock:
+            self._sync()
+            centroids, members, vectors, ids, deleted = (self.centroids, self._members, self.vectors,
+                                                         self.ids, self.deleted)
+        if centroids is None:
+            return []
+        probes = np.argsort(-(centroids @ vector))[:nprobe]
+        candidates = np.sort(np.concatenate([members[i] for i in probes]))
+        if len(deleted):
+            candidates = candidates[~np.isin(ids[candidates], deleted)]
+        if not len(candidates):
+            return []
+        scores = np.asarray(vectors[candidates], dtype=np.float32) @ vector
+        top = np.argpartition(-scores, k - 1)[:k] if len(scores) > k else np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[candidates[i]]), float(scores[i])) for i in top]
+
+    def similar(self, literature_id: int, k: int = 10) -> Optional[List[Tuple[int, float]]]:
+        """Papers most similar to an indexed paper (excluding itself), or None if it is not indexed."""
+        with self._lock:
+            self._sync()
+            vector = self.vector_of(literature_id)
+        if vector is None:
+            return None
+        return [(i, score) for i, score in self.search(vector, k + 1) if i != literature_id][:k]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index() -> SimilarityIndex:
+    directory = os.path.abspath(INDEX_DIRECTORY)
+    with _indexes_lock:
+        index = _indexes.get(directory)
+        if index is None:
+            index = _indexes[directory] = SimilarityIndex(directory)
+        return index
+
+
+def indexed_watermark() -> int:
+    """The shared index's watermark from its meta.json (0 without an index), without loading the index."""
+    try:
+        with open(os.path.join(os.path.abspath(INDEX_DIRECTORY), "meta.json")) as f:
+            return json.load(f)["watermark"]
+    except FileNotFoundError:
+        return 0
+
+
+def catch_up(connection) -> SimilarityIndex:
+    """The shared index, first topped up with literature newer than its watermark."""
+    index = get_index()
+    with index._lock:
+        index._sync()
+    # Ids are never reissued (AUTOINCREMENT), but the newest paper may have been purged or archived
+    latest = max(connection.execute(select(func.max(table.c.id))).scalar() or 0
+                 for table in literature_archive.tables(connection))
+    if latest > index.meta["watermark"]:
+        index.refresh(connection)
+    return index
+
+
+_training = {}
+
+
+def _build(index: SimilarityIndex, engine):
+    try:
+        with engine.connect() as connection:
+            # One read transaction per batch, so a first build over the whole history never holds writers up
+            while index.refresh(connection, max_rows=relevance.BATCH_SIZE):
+                connection.commit()
+            connection.commit()
+        index.train()
+    except Exception:
+        logger.exception("Building the similarity index failed; it will catch up on the next query")
+
+
+def train_in_background(engine) -> threading.Thread:
+    """Build or retrain the shared index in a daemon thread; at most one runs per index."""
+    index = get_index()
+    with _indexes_lock:
+        thread = _training.get(index.directory)
+        if thread is None or not thread.is_alive():
+            thread = _training[index.directory] = threading.Thread(
+                target=_build, args=(index, engine), name="similarity-index", daemon=True)
+            thread.start()
+        return thread
+
+
+def index_new_literature(connection):
+    """
+    Called after literature is committed: appends the new papers to the index lists it already has.
+    A first build or a due retraining is left to train_in_background. Failures never fail the ingestion.
+    """
+    try:
+        index = get_index()
+        index.refresh(connection, train=False)
+        if index.training_due():
+            train_in_background(connection.engine)
+    except Exception:
+        logger.exception("Similarity indexing failed; it will catch up on the next query")
+
+
+if __name__ == "__main__":
+    # 首次部署时预先建立索引，避免第一次查询时才为全部历史文献建立索引
+    from database import engine
+
+    with engine.connect() as connection:
+        catch_up(connection)
+    print(f"indexed {get_index().meta['count']} papers")
@@ -0,0 +1,114 @@
+# 相同请求合并 (single-flight)
+# 报告发出后，许多收件人几乎同时打开同一个主题的看板；重复点击也会同时触发同一个更新周期或同一次 PPT 对比。
+# 同一个 Group 中键相同的调用如果在前一个调用完成之前到达，就不再重复计算，而是等待并共享正在进行的那次计算的结果
+# (或异常)。这不是缓存: 计算完成后键立即释放，之后到达的调用重新计算。
+# - Group.do: 同步调用 (FastAPI 线程池中的同步端点)，等待者阻塞在 threading.Event 上
+# - Group.do_async: 协程，计算在独立的任务中运行，某个等待者被取消不会影响其他等待者
+# 每个 Group 统计调用次数、实际执行次数和被合并的次数，由 GET /metrics/coalescing 返回。
+import asyncio
+import threading
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class GroupStats:
+    name: str
+    calls: int = 0
+    executions: int = 0
+    coalesced: int = 0
+    in_flight: int = 0
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+class Group:
+    """Concurrent calls with the same key share one execution."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self._tasks: Dict[Hashable, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self._stats = GroupStats(name)
+
+    def _count(self, leader: bool):
+        self._stats.calls += 1
+        if leader:
+            self._stats.executions += 1
+        else:
+            self._stats.coalesced += 1
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        """fn() for the first caller of a key; callers arriving while it runs wait for and get the same result."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            self._count(leader)
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Like do() for coroutines; the shared execution runs in its own task."""
+        task_key = (asyncio.get_running_loop(), key)  # a task can only be awaited on its own loop
+        with self._lock:
+            task = self._tasks.get(task_key)
+            leader = task is None
+            if leader:
+                task = self._tasks[task_key] = asyncio.ensure_future(fn())
+                task.add_done_callback(lambda _: self._release(task_key))
+            self._count(leader)
+        return await asyncio.shield(task)
+
+    def _release(self, task_key: Hashable):
+        with self._lock:
+            self._tasks.pop(task_key, None)
+
+    def stats(self) -> GroupStats:
+        with self._lock:
+            return GroupStats(self.name, self._stats.calls, self._stats.executions, self._stats.coalesced,
+                              len(self._calls) + len(self._tasks))
+
+
+_groups: Dict[str, Group] = {}
+_groups_lock = threading.Lock()
+
+
+def group(name: str) -> Group:
+    """The process-wide group of that name."""
+    with _groups_lock:
+        found = _groups.get(name)
+        if found is None:
+            found = _groups[name] = Group(name)
+        return found
+
+
+def stats() -> List[GroupStats]:
+    with _groups_lock:
+        groups = sorted(_groups.values(), key=lambda g: g.name)
+    return [g.stats() for g in groups]
@@ -0,0 +1,88 @@
+# 分析快照
+# 每个成功的更新周期在写入 UpdateRecord 的同一事务中，冻结主题当时的分析状态:
+# 文献类型计数 (统计和分布由它得出)、每日发表计数 (趋势可按任意粒度和窗口重新分桶) 以及纳入报告的文献 id。
+# 快照只写一次，之后不再修改；两个字段都以 zlib 压缩保存在 analysis_snapshots 表中:
+# - analysis: JSON，每日计数按天数差分编码
+# - literature_ids: 升序 id 的差分，int64 小端序
+# 查看历史状态或对比两个快照只需读取快照本身，不再访问 literature 表。
+import json
+import zlib
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import literature_archive
+import models
+
+FORMAT_VERSION = 1
+COMPRESSION_LEVEL = 6
+
+
+@dataclass
+class Analysis:
+    type_counts: List[Tuple[Optional[int], int]]  # (type_code, count)
+    day_counts: List[Tuple[int, int]]  # (publication_day, count), ascending days
+
+
+def encode_analysis(analysis: Analysis) -> bytes:
+    days = [day for day, _ in analysis.day_counts]
+    payload = {
+        "version": FORMAT_VERSION,
+        "type_counts": [list(pair) for pair in analysis.type_counts],
+        "day_deltas": np.diff(days, prepend=0).tolist() if days else [],
+        "day_counts": [count for _, count in analysis.day_counts],
+    }
+    return zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"), COMPRESSION_LEVEL)
+
+
+def decode_analysis(blob: bytes) -> Analysis:
+    payload = json.loads(zlib.decompress(blob))
+    days = np.cumsum(payload["day_deltas"]).tolist()
+    return Analysis(
+        type_counts=[(code, count) for code, count in payload["type_counts"]],
+        day_counts=list(zip(days, payload["day_counts"])),
+    )
+
+
+def encode_ids(literature_ids: np.ndarray) -> bytes:
+    return zlib.compress(np.diff(literature_ids, prepend=0).astype("<i8").tobytes(), COMPRESSION_LEVEL)
+
+
+def decode_ids(blob: bytes) -> np.ndarray:
+    return np.cumsum(np.frombuffer(zlib.decompress(blob), dtype="<i8"))
+
+
+def capture(db: Session, record: models.UpdateRecord) -> models.AnalysisSnapshot:
+    """
+    Freeze the analysis of the literature covered by a (flushed) successful update record.
+    The snapshot is added to the session and committed together with the record.
+    """
+    def covered(literature):
+        return (literature.c.topic_id == record.topic_id) & (literature.c.id <= (record.to_literature_id or 0))
+
+    # Index-only reads: SQLite indexes carry the rowid, so the id bound needs no table lookups
+    literature = literature_archive.literature_table(db)
+    literature_ids = np.array(db.execute(select(literature.c.id).where(covered(literature)).order_by(literature.c.id))
+                              .scalars().all(), dtype=np.int64)
+    type_counts = literature_archive.grouped_counts(db, ["type_code"], covered)
+    day_counts = literature_archive.grouped_counts(
+        db, ["publication_day"], lambda literature: covered(literature) & literature.c.publication_day.is_not(None))
+    analysis = Analysis(
+        type_counts=sorted(((code, count) for code, count in type_counts),
+                           key=lambda pair: (pair[0] is None, pair[0] or 0)),
+        day_counts=sorted((day, count) for day, count in day_counts),
+    )
+    snapshot = models.AnalysisSnapshot(
+        topic_id=record.topic_id,
+        update_record_id=record.id,
+        created_at=record.timestamp,
+        to_literature_id=record.to_literature_id or 0,
+        literature_count=len(literature_ids),
+        analysis=encode_analysis(analysis),
+        literature_ids=encode_ids(literature_ids),
+    )
+    db.add(snapshot)
+    return snapshot
@@ -0,0 +1,376 @@
+# 外部服务的本地替身，供测试与基准测试使用，均在后台线程中监听 127.0.0.1 的随机端口
+# - LocalSMTPServer: 最小的 SMTP 服务器，记录收到的邮件 (发件人、收件人、正文)
+# - LocalWebhookReceiver: 记录收到的 JSON 请求，可以让前若干次请求返回指定的错误状态码
+# - LocalOpenAIServer: OpenAI 兼容的 /v1/chat/completions，回答由提示内容确定，可模拟延迟和错误状态码
+# - LocalEutilsServer: PubMed E-utilities 的 esearch (JSON，usehistory) 与 efetch (PubMed XML)，
+#   在给定的文章中按 "..."[tiab] 短语和 Entrez 日期检索，可模拟延迟和错误状态码
+# - LocalOutlineAgent: 大纲 Agent 的延迟模型 (POST JSON {"prompt", "metadata"})，延迟随提示词 token 数增长；
+#   提示词中的文献不足 target_papers 篇时，按缺少的篇数模拟 Agent 自行检索的轮次
+import hashlib
+import json
+import re
+import socketserver
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Sequence
+from urllib.parse import parse_qs, urlsplit
+from xml.sax.saxutils import escape
+
+
+class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+
+class _ThreadingHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server.owner
+        with server.lock:
+            server.connections += 1
+        self.reply("220 localhost stub SMTP")
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("utf-8", "replace").strip()
+            verb = command[:4].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250 localhost")
+            elif verb == "MAIL":
+                sender, recipients = command.split(":", 1)[1].strip(" <>"), []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                recipient = command.split(":", 1)[1].strip(" <>")
+                if recipient in server.refused:
+                    self.reply("550 No such user")
+                    continue
+                recipients.append(recipient)
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                body = []
+                for data_line in iter(self.rfile.readline, b""):
+                    if data_line in (b".\r\n", b".\n"):
+                        break
+                    body.append(data_line)
+                with server.lock:
+                    server.messages.append({"sender": sender, "recipients": recipients, "data": b"".join(body)})
+                sender, recipients = None, []
+                self.reply("250 OK queued")
+                if server.drop_idle:
+                    return  # like a server timing out the idle connection
+            elif verb == "RSET":
+                sender, recipients = None, []
+                self.reply("250 OK")
+            elif verb == "NOOP":
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class LocalSMTPServer:
+    def __init__(self, refused: Sequence[str] = (), drop_idle: bool = False):
+        self.messages: List[dict] = []
+        self.refused = set(refused)  # RCPT TO is answered 550 for these addresses
+        self.drop_idle = drop_idle  # hang up after every message
+        self.connections = 0
+        self.lock = threading.Lock()
+        self._server = _ThreadingTCPServer(("127.0.0.1", 0), _SMTPHandler)
+        self._server.owner = self
+        self.host, self.port = self._server.server_address
+
+    @property
+    def recipients(self) -> List[str]:
+        with self.lock:
+            return [r for message in self.messages for r in message["recipients"]]
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like a real push gateway
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        owner = self.server.owner
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"null")
+        with owner.lock:
+            status = owner.failures.pop(0) if owner.failures else 200
+            if status == 200:
+                owner.requests.append(payload)
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+class LocalWebhookReceiver:
+    def __init__(self, failures: List[int] = None):
+        self.requests: List[dict] = []
+        self.failures = list(failures or [])
+        self.lock = threading.Lock()
+        self._server = _ThreadingHTTPServer(("127.0.0.1", 0), _WebhookHandler)
+        self._server.owner = self
+        host, port = self._server.server_address
+        self.url = f"http://{host}:{port}/push"
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class _OpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, payload: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        owner = self.server.owner
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with owner.lock:
+            status = owner.failures.pop(0) if owner.failures else 200
+            owner.requests.append(request)
+            owner.active += 1
+            owner.max_active = max(owner.max_active, owner.active)
+        try:
+            time.sleep(owner.latency)
+            if status != 200:
+                self._reply(status, {"error": {"message": f"stub error {status}", "type": "stub"}})
+                return
+            prompt = request["messages"][-1]["content"]
+            answer = f"summary {hashlib.sha256(prompt.encode()).hexdigest()[:12]}: {prompt.strip()[:60]}"
+            self._reply(200, {
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()),
+                "model": request.get("model", "stub"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": answer}}],
+                "usage": {"prompt_tokens": len(prompt), "completion_tokens": len(answer),
+                          "total_tokens": len(prompt) + len(answer)},
+            })
+        finally:
+            with owner.lock:
+                owner.active -= 1
+
+
+class LocalOpenAIServer:
+    def __init__(self, latency: float = 0.0, failures: List[int] = None):
+        self.requests: List[dict] = []
+        self.failures = list(failures or [])
+        self.latency = latency
+        self.active = self.max_active = 0
+        self.lock = threading.Lock()
+        self._server = _ThreadingHTTPServer(("127.0.0.1", 0), _OpenAIHandler)
+        self._server.owner = self
+        host, port = self._server.server_address
+        self.base_url = f"http://{host}:{port}/v1"
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def pubmed_article_xml(article: dict) -> str:
+    """
+    One <PubmedArticle> for a dict with pmid, title, abstract, journal, publication_date (date),
+    and optionally authors [(last name, initials)], publication_types and keywords.
+    """
+    published = article["publication_date"]
+    authors = "".join(f"<Author><LastName>{escape(last)}</LastName><Initials>{escape(initials)}</Initials></Author>"
+                      for last, initials in article.get("authors", []))
+    types = "".join(f"<PublicationType>{escape(value)}</PublicationType>"
+                    for value in article.get("publication_types", ["Journal Article"]))
+    keywords = "".join(f"<Keyword>{escape(value)}</Keyword>" for value in article.get("keywords", []))
+    return (
+        f"<PubmedArticle><MedlineCitation><PMID>{article['pmid']}</PMID><Article>"
+        f"<Journal><JournalIssue><PubDate><Year>{published.year}</Year>"
+        f"<Month>{published.strftime('%b')}</Month><Day>{published.day}</Day></PubDate></JournalIssue>"
+        f"<Title>{escape(article['journal'])}</Title></Journal>"
+        f"<ArticleTitle>{escape(article['title'])}</ArticleTitle>"
+        f"<Abstract><AbstractText>{escape(article['abstract'])}</AbstractText></Abstract>"
+        f"<AuthorList>{authors}</AuthorList><PublicationTypeList>{types}</PublicationTypeList>"
+        f"</Article><KeywordList>{keywords}</KeywordList></MedlineCitation></PubmedArticle>"
+    )
+
+
+class _EutilsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _search(self, params) -> bytes:
+        owner = self.server.owner
+        phrases = [phrase.lower() for phrase in re.findall(r'"([^"]+)"', params.get("term", ""))]
+        low = datetime.strptime(params["mindate"], "%Y/%m/%d").date()
+        high = datetime.strptime(params["maxdate"], "%Y/%m/%d").date()
+        pmids = [
+            article["pmid"] for article in owner.articles
+            if low <= article["entrez_date"] <= high
+            and any(phrase in f"{article['title']} {article['abstract']}".lower() for phrase in phrases)
+        ]
+        with owner.lock:
+            webenv = f"MCID_{len(owner.histories)}"
+            owner.histories[webenv] = pmids
+        return json.dumps({"esearchresult": {"count": str(len(pmids)), "retmax": "0", "retstart": "0",
+                                             "querykey": "1", "webenv": webenv, "idlist": []}}).encode()
+
+    def _fetch(self, params) -> bytes:
+        owner = self.server.owner
+        start, count = int(params.get("retstart", 0)), int(params.get("retmax", 20))
+        pmids = owner.histories[params["WebEnv"]][start:start + count]
+        articles = "".join(pubmed_article_xml(owner.by_pmid[pmid]) for pmid in pmids)
+        return f'<?xml version="1.0" ?>\n<PubmedArticleSet>{articles}</PubmedArticleSet>'.encode()
+
+    def do_GET(self):
+        owner = self.server.owner
+        url = urlsplit(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        with owner.lock:
+            status = owner.failures.pop(0) if owner.failures else 200
+            owner.requests.append((url.path.rsplit("/", 1)[-1], params))
+            owner.active += 1
+            owner.max_active = max(owner.max_active, owner.active)
+        try:
+            time.sleep(owner.latency)
+            if status != 200:
+                self._reply(status, b"stub error", "text/plain")
+            elif url.path.endswith("esearch.fcgi"):
+                self._reply(200, self._search(params), "application/json")
+            elif url.path.endswith("efetch.fcgi"):
+                self._reply(200, self._fetch(params), "text/xml")
+            else:
+                self._reply(404, b"unknown utility", "text/plain")
+        finally:
+            with owner.lock:
+                owner.active -= 1
+
+
+class LocalEutilsServer:
+    """
+    Serves the given articles (pubmed_article_xml fields plus entrez_date, a date).
+    requests records (utility, params) of every request.
+    """
+
+    def __init__(self, articles: List[dict], latency: float = 0.0, failures: List[int] = None):
+        self.articles = list(articles)
+        self.by_pmid = {article["pmid"]: article for article in self.articles}
+        self.histories = {}
+        self.requests: List[tuple] = []
+        self.failures = list(failures or [])
+        self.latency = latency
+        self.active = self.max_active = 0
+        self.lock = threading.Lock()
+        self._server = _ThreadingHTTPServer(("127.0.0.1", 0), _EutilsHandler)
+        self._server.owner = self
+        host, port = self._server.server_address
+        self.base_url = f"http://{host}:{port}/entrez/eutils"
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class _OutlineAgentHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        import literature_context
+
+        owner = self.server.owner
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        prompt = request.get("prompt", "")
+        tokens = literature_context.estimate_tokens(prompt)
+        papers = len(re.findall(r"^\d+\. .+ \| ", prompt, re.MULTILINE))
+        missing = max(0, owner.target_papers - papers)
+        rounds = -(-missing // owner.papers_per_round)
+        with owner.lock:
+            owner.requests.append({"prompt_tokens": tokens, "papers": papers, "research_rounds": rounds})
+        time.sleep(owner.latency + tokens / 1000 * owner.seconds_per_1k_tokens + rounds * owner.research_latency)
+        body = json.dumps({"outline": f"outline of {papers} papers", "research_rounds": rounds}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class LocalOutlineAgent:
+    """
+    Latency model of the outline agent: latency + seconds_per_1k_tokens per 1k prompt tokens
+    + research_latency per research round, one round per papers_per_round papers short of target_papers.
+    """
+
+    def __init__(self, latency: float = 0.0, seconds_per_1k_tokens: float = 0.0, research_latency: float = 0.0,
+                 target_papers: int = 20, papers_per_round: int = 5):
+        self.latency = latency
+        self.seconds_per_1k_tokens = seconds_per_1k_tokens
+        self.research_latency = research_latency
+        self.target_papers = target_papers
+        self.papers_per_round = papers_per_round
+        self.requests: List[dict] = []
+        self.lock = threading.Lock()
+        self._server = _ThreadingHTTPServer(("127.0.0.1", 0), _OutlineAgentHandler)
+        self._server.owner = self
+        host, port = self._server.server_address
+        self.url = f"http://{host}:{port}/"
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
@@ -125,3 +125,1591 @@ def test_get_ppt_history_placeholder():
     data = response.json()
     assert isinstance(data, list)
     assert len(data) == 1 # As per mock data
+
+def _add_literature(topic_id, publication_date, **overrides):
+    """
+    Insert a literature row straight through the ORM; there is no public ingestion endpoint.
+    """
+    from database import SessionLocal
+    import models
+
+    fields = dict(
+        title="Sample paper",
+        authors=["Doe J"],
+        publication_date=publication_date,
+        journal_name="Test Journal",
+        keywords=["test"],
+        summary="Sample summary.",
+        literature_type="Review",
+    )
+    fields.update(overrides)
+    db = SessionLocal()
+    try:
+        literature = models.Literature(topic_id=topic_id, **fields)
+        db.add(literature)
+        db.commit()
+        return literature.id
+    finally:
+        db.close()
+
+def test_literature_trend_granularity_and_gap_fill():
+    """
+    Test trend bucketing over an explicit window, including empty buckets.
+    """
+    from datetime import datetime
+    topic_id = client.post("/topics/", json={"name": "Trend Topic", "keywords": []}).json()["id"]
+    _add_literature(topic_id, datetime(2024, 1, 15))
+    _add_literature(topic_id, datetime(2024, 2, 1))
+    _add_literature(topic_id, datetime(2024, 11, 30))
+
+    response = client.get(f"/topics/{topic_id}/trend",
+                          params={"granularity": "quarter", "start_date": "2024-01-01", "end_date": "2024-12-31"})
+    assert response.status_code == 200
+    assert response.json() == [
+        {"date": "2024-Q1", "count": 2},
+        {"date": "2024-Q2", "count": 0},
+        {"date": "2024-Q3", "count": 0},
+        {"date": "2024-Q4", "count": 1},
+    ]
+
+    response = client.get(f"/topics/{topic_id}/trend",
+                          params={"granularity": "week", "start_date": "2024-01-15", "end_date": "2024-01-28"})
+    assert response.json() == [{"date": "2024-W03", "count": 1}, {"date": "2024-W04", "count": 0}]
+
+    response = client.get(f"/topics/{topic_id}/trend", params={"granularity": "decade"})
+    assert response.status_code == 422
+
+def test_keyword_trends_incremental():
+    """
+    Test keyword co-occurrence and growth, and that new papers are picked up by the cached matrix.
+    """
+    from datetime import datetime
+    topic_id = client.post("/topics/", json={"name": "Keyword Topic", "keywords": []}).json()["id"]
+    _add_literature(topic_id, datetime(2025, 1, 10), keywords=["CLL", "Ibrutinib"])
+    _add_literature(topic_id, datetime(2025, 5, 10), keywords=["cll", "Venetoclax"])
+    _add_literature(topic_id, datetime(2025, 6, 10), keywords=["CLL ", "venetoclax", "MRD"])
+
+    params = {"end_date": "2025-06-30", "period_days": 90}
+    data = client.get(f"/topics/{topic_id}/keyword-trends", params=params).json()
+    assert data["paper_count"] == 3
+    assert data["co_occurrences"][0]["keyword_a"] == "cll"
+    assert data["co_occurrences"][0]["keyword_b"] == "venetoclax"
+    assert data["co_occurrences"][0]["count"] == 2
+    assert data["emerging"][0]["keyword"] == "venetoclax"
+    assert data["emerging"][0]["previous_count"] == 0
+
+    _add_literature(topic_id, datetime(2025, 6, 20), keywords=["MRD", "CLL"])
+    data = client.get(f"/topics/{topic_id}/keyword-trends", params=params).json()
+    assert data["paper_count"] == 4
+    assert {"keyword_a": "cll", "keyword_b": "mrd", "count": 2, "jaccard": 0.5} in data["co_occurrences"]
+
+def test_literature_ordered_by_relevance():
+    """
+    Test that batch ingestion scores papers and the analysis list can be sorted by relevance.
+    """
+    from datetime import datetime
+    from database import SessionLocal
+    import crud
+
+    topic_id = client.post("/topics/", json={"name": "Relevance Topic", "keywords": ["Venetoclax"]}).json()["id"]
+    common = dict(authors=[], journal_name="J", literature_type="Review")
+    db = SessionLocal()
+    try:
+        crud.create_literature_batch(db, [
+            dict(title="Venetoclax combinations", summary="Venetoclax with obinutuzumab.", keywords=["Venetoclax"],
+                 publication_date=datetime(2024, 1, 1), **common),
+            dict(title="Infection control", summary="Vaccination in hematology.", keywords=["Infection"],
+                 publication_date=datetime(2024, 6, 1), **common),
+        ], topic_id=topic_id)
+    finally:
+        db.close()
+
+    data = client.get(f"/topics/{topic_id}/literature-analysis", params={"order_by": "relevance"}).json()
+    titles = [item["title"] for item in data["literature"]]
+    assert titles == ["Venetoclax combinations", "Infection control"]
+    assert data["literature"][0]["relevance_score"] > data["literature"][1]["relevance_score"] == 0
+
+    # Changing the keywords rescores the whole topic
+    client.put(f"/topics/{topic_id}", json={"name": "Relevance Topic", "keywords": ["Vaccination"]})
+    data = client.get(f"/topics/{topic_id}/literature-analysis", params={"order_by": "relevance"}).json()
+    assert [item["title"] for item in data["literature"]] == ["Infection control", "Venetoclax combinations"]
+
+def test_relevance_scores_use_frozen_statistics(monkeypatch):
+    """
+    Test that papers ingested in later batches are scored with the same IDF as the earlier ones, and that
+    the topic is rescored once the statistics drift or papers are removed.
+    """
+    from datetime import datetime
+    from database import SessionLocal
+    import crud
+    import models
+    import relevance
+
+    topic_id = client.post("/topics/", json={"name": "Frozen IDF", "keywords": ["Ibrutinib", "Zanubrutinib"]}).json()["id"]
+    common = dict(authors=[], journal_name="J", literature_type="Review", publication_date=datetime(2024, 1, 1))
+    both = dict(title="Ibrutinib or zanubrutinib", summary="Switching ibrutinib to zanubrutinib.", **common)
+    other = [dict(title=f"Supportive care {i}", summary="Infection prophylaxis.", **common) for i in range(30)]
+    rescored = []
+    rescore_topic = relevance.rescore_topic
+    monkeypatch.setattr(relevance, "rescore_topic", lambda *args: rescored.append(args[1]) or rescore_topic(*args))
+
+    def scores(db, ids):
+        return [db.get(models.Literature, i).relevance_score for i in ids]
+
+    db = SessionLocal()
+    try:
+        first = crud.create_literature_batch(db, [both, *other], topic_id=topic_id)
+        assert rescored == [topic_id]  # no statistics yet: counted and scored in two passes
+        copy = crud.create_literature_batch(db, [both], topic_id=topic_id)
+        assert rescored == [topic_id]
+        assert scores(db, copy) == scores(db, first[:1])
+        stats = db.get(models.Topic, topic_id).relevance_stats
+        assert (stats["n"], stats["scored_n"]) == (32, 31)
+
+        # Many papers on one keyword shift its weight: the whole topic is rescored with the new statistics
+        crud.create_literature_batch(db, [dict(title=f"Ibrutinib {i}", summary="Ibrutinib.", **common)
+                                          for i in range(40)], topic_id=topic_id)
+        assert rescored == [topic_id] * 2
+        stats = db.get(models.Topic, topic_id).relevance_stats
+        assert stats["n"] == stats["scored_n"] == 72 and stats["df"] == stats["scored_df"]
+        assert scores(db, copy) == scores(db, first[:1])
+
+        for paper in db.query(models.Literature).filter(models.Literature.id.in_(first[1:])):
+            db.delete(paper)
+        db.commit()
+        crud.create_literature_batch(db, [both], topic_id=topic_id)
+        assert rescored == [topic_id] * 3
+        assert db.get(models.Topic, topic_id).relevance_stats["n"] == 43
+    finally:
+        db.close()
+
+def test_literature_analysis_batch(monkeypatch):
+    """
+    Test the multi-topic analysis endpoint against the per-topic endpoints.
+    """
+    from datetime import datetime
+    import crud
+    first = client.post("/topics/", json={"name": "Batch A", "keywords": []}).json()["id"]
+    second = client.post("/topics/", json={"name": "Batch B", "keywords": []}).json()["id"]
+    _add_literature(first, datetime(2025, 3, 3), literature_type="Randomized Clinical Trial")
+    _add_literature(first, datetime(2025, 3, 9), literature_type="Meta-Analysis")
+    _add_literature(second, datetime(2025, 1, 5))
+
+    params = {"topic_ids": [first, second], "start_date": "2025-01-01", "end_date": "2025-03-31"}
+    response = client.get("/literature-analysis/batch", params=params)
+    assert response.status_code == 200
+    data = {item["topic_id"]: item for item in response.json()}
+    assert data[first]["stats"] == {"total_count": 2, "high_citation_count": 0,
+                                    "clinical_trial_count": 1, "meta_analysis_count": 1}
+    assert data[first]["trend_data"] == [{"date": "2025-01", "count": 0}, {"date": "2025-02", "count": 0},
+                                         {"date": "2025-03", "count": 2}]
+    assert data[second]["distribution_data"] == [{"type": "Review", "count": 1}]
+
+    single = client.get(f"/topics/{first}/literature-analysis").json()
+    assert single["stats"] == data[first]["stats"]
+
+    # Any order of the same topics is one computation (shared while it runs); the response keeps the order asked
+    calls = []
+    batch = crud.get_literature_analysis_batch
+    monkeypatch.setattr(crud, "get_literature_analysis_batch", lambda db, **kwargs: calls.append(kwargs["topic_ids"])
+                        or batch(db, **kwargs))
+    reordered = client.get("/literature-analysis/batch", params={**params, "topic_ids": [second, first, second]}).json()
+    assert [item["topic_id"] for item in reordered] == [second, first]
+    assert reordered[1] == data[first] and calls == [sorted([first, second])]
+
+    response = client.get("/literature-analysis/batch", params={"topic_ids": [first, 9999]})
+    assert response.status_code == 404
+
+def test_ppt_preview_and_cached_download(monkeypatch):
+    """
+    Test the cached PPT outline, content-hash ETags and range requests on the deck itself.
+    """
+    from urllib.parse import quote
+    filename = quote("慢性淋巴细胞白血病最新研究进展_1-3月.pptx")
+
+    response = client.get(f"/ppt/{filename}/preview")
+    assert response.status_code == 200
+    preview = response.json()
+    assert preview["slide_count"] == len(preview["slides"]) > 0
+    assert len(response.content) < preview["size_bytes"] / 10
+    assert client.get(f"/ppt/{filename}/preview", headers={"If-None-Match": response.headers["etag"]}).status_code == 304
+
+    deck = client.get(preview["download_url"], headers={"Range": "bytes=0-1023"})
+    assert deck.status_code == 206
+    assert len(deck.content) == 1024
+    assert "immutable" in deck.headers["cache-control"]
+    assert deck.headers["etag"] == f'"{preview["content_hash"][:32]}"'
+    assert response.headers["etag"] != deck.headers["etag"]
+    assert client.get(f"/ppt/{filename}/preview", headers={"If-None-Match": deck.headers["etag"]}).status_code == 200
+
+    unversioned = client.get(f"/PPT/{filename}", headers={"If-None-Match": deck.headers["etag"]})
+    assert unversioned.status_code == 304
+
+    assert client.get("/ppt/missing.pptx/preview").status_code == 404
+
+    import ppt_files
+    monkeypatch.setattr(ppt_files, "MAX_PREVIEW_BYTES", preview["size_bytes"] - 1)
+    assert client.get(f"/ppt/{filename}/preview").status_code == 413
+
+
+def test_ppt_preview_concurrent_builds_and_unreadable_decks(tmp_path, monkeypatch):
+    """
+    Test that concurrent first requests for a preview all succeed, and that a damaged deck is a 422.
+    """
+    import shutil
+    from concurrent.futures import ThreadPoolExecutor
+    import ppt_files
+
+    source = ppt_files.deck_path("慢性淋巴细胞白血病最新研究进展_1-3月.pptx")
+    monkeypatch.setattr(ppt_files, "PPT_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(ppt_files, "PREVIEW_DIRECTORY", str(tmp_path / ".previews"))
+    shutil.copy(source, tmp_path / "deck.pptx")
+    with ThreadPoolExecutor(8) as pool:
+        previews = list(pool.map(lambda _: ppt_files.build_preview(str(tmp_path / "deck.pptx")), range(8)))
+    assert len({preview["content_hash"] for preview in previews}) == 1
+    assert [name for name in os.listdir(tmp_path / ".previews") if name.endswith(".tmp")] == []
+
+    with open(ppt_files._preview_file(previews[0]["content_hash"]), "w") as f:
+        f.write("{")  # damaged cache file: rebuilt
+    assert client.get("/ppt/deck.pptx/preview").status_code == 200
+    (tmp_path / "broken.pptx").write_bytes(b"not a zip")
+    assert client.get("/ppt/broken.pptx/preview").status_code == 422
+
+def test_render_deck_from_markdown(tmp_path):
+    """
+    Test rendering slide markdown to a .pptx with the default template.
+    """
+    from pptx import Presentation
+    import ppt_renderer
+
+    markdown = "# Title\nSubtitle\n\n---\n\n## Findings\n- **First**\n  - Nested\n- Second\n## Outlook\nPlain text"
+    output = ppt_renderer.render_deck(markdown, str(tmp_path / "deck.pptx"), template="missing-template")
+
+    slides = list(Presentation(output).slides)
+    assert [slide.shapes.title.text for slide in slides] == ["Title", "Findings", "Outlook"]
+    body = [shape for shape in slides[1].placeholders if shape.placeholder_format.idx != 0][0]
+    assert [(p.text, p.level) for p in body.text_frame.paragraphs] == [("First", 0), ("Nested", 1), ("Second", 0)]
+
+
+def test_deck_names_and_templates_stay_inside_their_directories(tmp_path, monkeypatch):
+    """
+    Test that API-supplied template names cannot leave the template directory, and that a deck named after a
+    free-text topic prompt is a single safe file name.
+    """
+    import ppt_files
+    import ppt_renderer
+
+    monkeypatch.setattr(ppt_renderer, "TEMPLATE_DIRECTORY", str(tmp_path / "templates"))
+    os.makedirs(tmp_path / "templates")
+    for name in ("clinic.pptx", "outside.pptx"):
+        (tmp_path / ("templates" if name == "clinic.pptx" else "") / name).write_bytes(b"")
+    assert ppt_renderer.template_path("clinic") == os.path.join(str(tmp_path / "templates"), "clinic.pptx")
+    assert ppt_renderer.template_path("../outside") is None
+    assert ppt_renderer.template_path(str(tmp_path / "outside")) is None
+
+    filename = ppt_files.deck_filename("PDL1/41BB 双抗\n在肺癌中的进展\n", "20250101")
+    assert filename == "PDL1_41BB 双抗 在肺癌中的进展_20250101.pptx"
+    assert ppt_files.deck_filename("x" * 500, "1") == "x" * 80 + "_1.pptx"
+
+def test_incremental_update_cycle(tmp_path, monkeypatch):
+    """
+    Test that update cycles only process literature after the topic's watermark.
+    """
+    from datetime import datetime
+    from database import SessionLocal
+    import models
+    import ppt_files
+
+    monkeypatch.setattr(ppt_files, "PPT_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(ppt_files, "PREVIEW_DIRECTORY", str(tmp_path / ".previews"))
+
+    topic_id = client.post("/topics/", json={"name": "Cycle Topic", "keywords": []}).json()["id"]
+    first_id = _add_literature(topic_id, datetime(2025, 1, 5), title="Trial A", literature_type="Clinical Trial")
+    _add_literature(topic_id, datetime(2025, 1, 6), title="Review A", literature_type="Review")
+
+    first = client.post(f"/topics/{topic_id}/update-cycle").json()
+    assert first["status"] == "success"
+    assert first["new_literature_count"] == 2
+    assert first["from_literature_id"] == 0
+
+    new_id = _add_literature(topic_id, datetime(2025, 2, 1), title="Trial B", literature_type="Clinical Trial")
+    second = client.post(f"/topics/{topic_id}/update-cycle").json()
+    assert second["new_literature_count"] == 1
+    assert second["from_literature_id"] == first["to_literature_id"] > first_id
+    assert second["to_literature_id"] == new_id
+    assert second["ppt_preview_link"] != first["ppt_preview_link"]
+
+    db = SessionLocal()
+    try:
+        sections = {s.section_key: s for s in db.query(models.ReportSection).filter_by(topic_id=topic_id)}
+        assert sections["Clinical Trial"].literature_count == 2
+        assert sections["Clinical Trial"].markdown.splitlines()[1].startswith("- Trial B")
+        assert sections["Review"].literature_count == 1
+        topic = db.query(models.Topic).get(topic_id)
+        assert topic.last_reported_literature_id == new_id
+        assert topic.last_reported_publication_date == datetime(2025, 2, 1)
+    finally:
+        db.close()
+
+    idle = client.post(f"/topics/{topic_id}/update-cycle").json()
+    assert idle["new_literature_count"] == 0
+    assert idle["ppt_preview_link"] == second["ppt_preview_link"]
+
+    history = client.get(f"/topics/{topic_id}/history").json()["updates"]
+    assert len(history) == 3
+    assert client.post("/topics/9999/update-cycle").status_code == 404
+
+def test_push_fan_out_to_email_and_webhook(monkeypatch):
+    """
+    Test pushing a deck to many recipients over a local SMTP server and webhook receiver.
+    """
+    import notifications
+    from stubs import LocalSMTPServer, LocalWebhookReceiver
+
+    topic = {"name": "Push Topic", "keywords": [], "settings": {"notification_channels": ["email", "app_push"]}}
+    topic_id = client.post("/topics/", json=topic).json()["id"]
+    recipients = [f"user{i}@example.com" for i in range(120)]
+
+    with LocalSMTPServer() as smtp, LocalWebhookReceiver(failures=[503]) as webhook:
+        settings = notifications.NotificationSettings(smtp_host=smtp.host, smtp_port=smtp.port, webhook_url=webhook.url,
+                                                      backoff_base=0.01)
+        monkeypatch.setattr(notifications.NotificationSettings, "from_env", classmethod(lambda cls: settings))
+
+        response = client.post(f"/topics/{topic_id}/push",
+                               json={"ppt_filename": "慢性淋巴细胞白血病最新研究进展_1-3月.pptx", "recipients": recipients})
+        assert response.status_code == 202
+        assert {record["status"] for record in response.json()} == {"pending"}
+
+        assert len(smtp.messages) == 3
+        assert sorted(smtp.recipients) == sorted(recipients)
+        assert len(webhook.requests) == 3
+        assert sorted(r for request in webhook.requests for r in request["recipients"]) == sorted(recipients)
+
+    pushed = [r for r in client.get("/ppt-history/").json() if r["topic_name"] == "Push Topic"]
+    assert sorted(r["channel"] for r in pushed) == ["app_push", "email"]
+    assert {r["status"] for r in pushed} == {"success"}
+
+    assert client.post(f"/topics/{topic_id}/push", json={"ppt_filename": "missing.pptx", "recipients": []}).status_code == 404
+
+
+def test_push_records_refused_recipients_and_keeps_connection(monkeypatch):
+    """
+    Test that recipients refused by the mail server are recorded and fail the push, and that the pooled SMTP
+    connection is reused after a batch whose recipients were all refused.
+    """
+    import notifications
+    from stubs import LocalSMTPServer
+
+    topic = {"name": "Refused Push Topic", "keywords": [], "settings": {"notification_channels": ["email"]}}
+    topic_id = client.post("/topics/", json=topic).json()["id"]
+    recipients = ["gone1@example.com", "gone2@example.com", "user1@example.com", "gone3@example.com",
+                  "user2@example.com", "user3@example.com"]
+    refused = ["gone1@example.com", "gone2@example.com", "gone3@example.com"]
+
+    with LocalSMTPServer(refused=refused) as smtp:
+        settings = notifications.NotificationSettings(smtp_host=smtp.host, smtp_port=smtp.port, smtp_pool_size=1,
+                                                      recipients_per_message=2, backoff_base=0.01)
+        monkeypatch.setattr(notifications.NotificationSettings, "from_env", classmethod(lambda cls: settings))
+        response = client.post(f"/topics/{topic_id}/push",
+                               json={"ppt_filename": "慢性淋巴细胞白血病最新研究进展_1-3月.pptx", "recipients": recipients})
+        assert response.status_code == 202
+        assert sorted(smtp.recipients) == ["user1@example.com", "user2@example.com", "user3@example.com"]
+        assert smtp.connections == 1
+
+    pushed = [r for r in client.get("/ppt-history/").json() if r["topic_name"] == "Refused Push Topic"]
+    assert [(r["status"], sorted(r["refused_recipients"])) for r in pushed] == [("failed", refused)]
+
+def test_push_statuses_written_when_server_dropped_idle_connection(monkeypatch):
+    """
+    Test that push records get their status even when the SMTP server already closed the pooled connection.
+    """
+    import notifications
+    from stubs import LocalSMTPServer
+
+    topic = {"name": "Dropped Push Topic", "keywords": [], "settings": {"notification_channels": ["email"]}}
+    topic_id = client.post("/topics/", json=topic).json()["id"]
+    with LocalSMTPServer(drop_idle=True) as smtp:
+        settings = notifications.NotificationSettings(smtp_host=smtp.host, smtp_port=smtp.port, smtp_pool_size=1)
+        monkeypatch.setattr(notifications.NotificationSettings, "from_env", classmethod(lambda cls: settings))
+        response = client.post(f"/topics/{topic_id}/push",
+                               json={"ppt_filename": "慢性淋巴细胞白血病最新研究进展_1-3月.pptx",
+                                     "recipients": ["user1@example.com"]})
+        assert response.status_code == 202
+        assert smtp.recipients == ["user1@example.com"]
+
+    pushed = [r for r in client.get("/ppt-history/").json() if r["topic_name"] == "Dropped Push Topic"]
+    assert [r["status"] for r in pushed] == ["success"]
+
+
+def test_topic_registry_write_through_and_coherence(monkeypatch):
+    """
+    Test that topic reads come from memory, stay in sync with API writes and pick up writes from other processes.
+    """
+    from datetime import datetime
+    from database import SessionLocal
+    import cache_bus
+    import models
+    import topic_registry
+
+    def write_from_other_worker(name):
+        db = SessionLocal()
+        try:
+            db.query(models.Topic).filter_by(id=topic_id).update({"name": name, "last_updated": datetime.utcnow()})
+            db.commit()
+        finally:
+            db.close()
+
+    monkeypatch.setattr(topic_registry, "COHERENCE_INTERVAL", 60.0)
+    topic_id = client.post("/topics/", json={"name": "Registry Topic", "keywords": []}).json()["id"]
+    assert client.get(f"/topics/{topic_id}").json()["name"] == "Registry Topic"
+
+    client.put(f"/topics/{topic_id}", json={"name": "Registry Renamed", "keywords": ["a"]})
+    assert client.get(f"/topics/{topic_id}").json()["name"] == "Registry Renamed"
+
+    # The invalidation bus makes a write from any connection visible to the next request
+    before = cache_bus.generation("topics")
+    write_from_other_worker("Other Worker")
+    assert cache_bus.generation("topics") > before
+    assert client.get(f"/topics/{topic_id}").json()["name"] == "Other Worker"
+
+    # Without the bus, the coherence check bounds staleness to COHERENCE_INTERVAL
+    monkeypatch.setattr(cache_bus, "generation", lambda table: None)
+    topic_registry.invalidate()
+    client.get("/topics/")
+    write_from_other_worker("Fallback")
+    assert client.get(f"/topics/{topic_id}").json()["name"] == "Other Worker"
+    monkeypatch.setattr(topic_registry, "COHERENCE_INTERVAL", 0.0)
+    assert client.get(f"/topics/{topic_id}").json()["name"] == "Fallback"
+    assert any(topic["id"] == topic_id for topic in client.get("/topics/").json())
+
+    assert client.delete(f"/topics/{topic_id}").status_code == 204
+    assert client.get(f"/topics/{topic_id}").status_code == 404
+    assert client.get(f"/topics/{topic_id}/trend").status_code == 404
+
+def test_literature_export_formats(monkeypatch):
+    """
+    Test streaming a topic's literature as CSV, NDJSON and Parquet across several chunks.
+    """
+    import csv
+    import io
+    import json
+    from datetime import datetime
+    import pyarrow.parquet as pq
+    import export
+
+    monkeypatch.setattr(export, "CHUNK_SIZE", 2)
+    topic_id = client.post("/topics/", json={"name": "Export Topic", "keywords": []}).json()["id"]
+    for day in range(1, 6):
+        _add_literature(topic_id, datetime(2025, 3, day), title=f"Paper, {day}", keywords=["cll", "btk"])
+
+    response = client.get(f"/topics/{topic_id}/literature/export?format=csv")
+    assert response.status_code == 200
+    assert "attachment" in response.headers["content-disposition"]
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["title"] for row in rows] == [f"Paper, {day}" for day in range(1, 6)]
+    assert rows[0]["keywords"] == "cll; btk"
+
+    lines = client.get(f"/topics/{topic_id}/literature/export?format=ndjson").text.splitlines()
+    assert [json.loads(line)["publication_date"] for line in lines][0] == "2025-03-01T00:00:00"
+
+    table = pq.read_table(io.BytesIO(client.get(f"/topics/{topic_id}/literature/export?format=parquet").content))
+    assert table.num_rows == 5
+    assert pq.ParquetFile(io.BytesIO(client.get(f"/topics/{topic_id}/literature/export?format=parquet").content)).num_row_groups == 3
+    assert table.column("keywords").to_pylist()[0] == ["cll", "btk"]
+
+    assert client.get(f"/topics/{topic_id}/literature/export?format=xml").status_code == 422
+    assert client.get("/topics/9999/literature/export").status_code == 404
+
+def test_similar_literature_across_topics(tmp_path, monkeypatch):
+    """
+    Test that similar papers are found across topics and that new papers are indexed incrementally.
+    """
+    from datetime import datetime
+    import similarity
+
+    monkeypatch.setattr(similarity, "INDEX_DIRECTORY", str(tmp_path / "index"))
+    monkeypatch.setattr(similarity, "MIN_TRAINING_SIZE", 4)
+    first = client.post("/topics/", json={"name": "Similar A", "keywords": []}).json()["id"]
+    second = client.post("/topics/", json={"name": "Similar B", "keywords": []}).json()["id"]
+
+    query_id = _add_literature(first, datetime(2025, 1, 1), title="Venetoclax plus obinutuzumab in untreated CLL",
+                               summary="Fixed-duration venetoclax obinutuzumab improves progression-free survival in CLL.",
+                               keywords=["venetoclax", "CLL"])
+    match_id = _add_literature(second, datetime(2025, 1, 2), title="Fixed-duration venetoclax obinutuzumab for CLL",
+                               summary="Long-term progression-free survival with venetoclax obinutuzumab in CLL.",
+                               keywords=["venetoclax", "CLL"])
+    _add_literature(second, datetime(2025, 1, 3), title="Gut microbiome and dietary fibre",
+                    summary="Dietary fibre shapes the gut microbiome in healthy adults.", keywords=["microbiome"])
+
+    response = client.get(f"/literature/{query_id}/similar?k=3")
+    assert response.status_code == 200
+    similar = response.json()
+    assert similar[0]["id"] == match_id
+    assert similar[0]["topic_id"] == second
+    assert query_id not in [paper["id"] for paper in similar]
+    assert similar[0]["similarity"] >= similar[-1]["similarity"]
+
+    newer_id = _add_literature(first, datetime(2025, 2, 1), title="Venetoclax obinutuzumab fixed-duration CLL update",
+                               summary="Venetoclax obinutuzumab progression-free survival in CLL.", keywords=["venetoclax"])
+    assert newer_id in [paper["id"] for paper in client.get(f"/literature/{query_id}/similar?k=10").json()]
+
+    assert client.get("/literature/999999/similar").status_code == 404
+
+
+def test_similarity_ingestion_only_appends(tmp_path, monkeypatch):
+    """
+    Test that ingestion only appends to the similarity index, and leaves the first build and retraining
+    to the background thread.
+    """
+    from datetime import datetime
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    import crud
+    import models
+    import similarity
+
+    monkeypatch.setattr(similarity, "INDEX_DIRECTORY", str(tmp_path / "index"))
+    monkeypatch.setattr(similarity, "MIN_TRAINING_SIZE", 4)
+    monkeypatch.setattr(similarity, "RETRAIN_GROWTH", 1)
+    engine = create_engine(f"sqlite:///{tmp_path / 'similar.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    scheduled = []
+    train_in_background = similarity.train_in_background
+    monkeypatch.setattr(similarity, "train_in_background", scheduled.append)
+    words = "narwhal tapir cohort signature venetoclax obinutuzumab".split()
+
+    def papers(count):
+        return [dict(title=f"{words[i % 6]} {words[(i + 1) % 6]} {words[(i + 3) % 6]}", summary="",
+                     keywords=[], publication_date=datetime(2025, 1, 1)) for i in range(count)]
+
+    db = sessionmaker(bind=engine)()
+    try:
+        topic = models.Topic(name="Index", keywords=[])
+        db.add(topic)
+        db.commit()
+        crud.create_literature_batch(db, papers(3), topic_id=topic.id)
+        index = similarity.get_index()
+        assert index.meta["count"] == 0 and scheduled == [engine]  # nothing built on the ingestion path
+        train_in_background(engine).join()
+        assert index.meta["count"] == 3 and len(index.centroids) == 1
+
+        crud.create_literature_batch(db, papers(2), topic_id=topic.id)
+        assert index.meta["count"] == 5 and index.meta["trained_count"] == 3  # appended to the old lists
+        assert len(scheduled) == 2
+        train_in_background(engine).join()
+        assert index.meta["trained_count"] == 5 and len(index.centroids) == 2
+        assert not index.training_due()
+    finally:
+        db.close()
+
+
+def test_delete_topic_purges_in_batches(tmp_path, monkeypatch):
+    """
+    Test that a deleted topic is hidden at once and its rows and index entries are purged batch by batch.
+    """
+    from datetime import datetime
+    from database import SessionLocal
+    import models
+    import ppt_files
+    import similarity
+    import topic_deletion
+
+    monkeypatch.setattr(ppt_files, "PPT_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(similarity, "INDEX_DIRECTORY", str(tmp_path / "index"))
+    monkeypatch.setattr(similarity, "MIN_TRAINING_SIZE", 4)
+    monkeypatch.setattr(topic_deletion, "PURGE_BATCH_SIZE", 2)
+    monkeypatch.setattr(topic_deletion, "BATCH_PAUSE", 0)
+    kept = client.post("/topics/", json={"name": "Purge Keep", "keywords": []}).json()["id"]
+    doomed = client.post("/topics/", json={"name": "Purge Me", "keywords": ["venetoclax"]}).json()["id"]
+
+    query_id = _add_literature(kept, datetime(2025, 1, 1), title="Quokka wombat marker panel",
+                               summary="Quokka wombat marker panel.", keywords=["quokka"])
+    doomed_ids = {
+        _add_literature(doomed, datetime(2025, 1, day), title="Quokka wombat marker panel",
+                        summary="Quokka wombat marker panel.", keywords=["quokka"])
+        for day in range(1, 6)
+    }
+    assert client.post(f"/topics/{doomed}/update-cycle").status_code == 200
+    similar_ids = lambda: {paper["id"] for paper in client.get(f"/literature/{query_id}/similar?k=5").json()}
+    assert similar_ids() == doomed_ids
+    indexed = similarity.get_index().meta["count"]
+
+    assert client.delete(f"/topics/{doomed}").status_code == 204
+    assert client.get(f"/topics/{doomed}").status_code == 404
+    assert doomed not in [topic["id"] for topic in client.get("/topics/?limit=1000").json()]
+    assert client.get(f"/topics/{doomed}/trend").status_code == 404
+    assert not similar_ids() & doomed_ids
+
+    db = SessionLocal()
+    try:
+        for model in (models.Topic, models.Literature, models.LiteratureDailyCount, models.UpdateRecord,
+                      models.ReportSection):
+            column = model.id if model is models.Topic else model.topic_id
+            assert db.query(model).filter(column == doomed).count() == 0
+    finally:
+        db.close()
+    assert similarity.get_index().meta["count"] == indexed - 5
+    assert similarity.get_index().meta["deleted"] == 0
+
+
+def test_topic_list_summary_counters(tmp_path, monkeypatch):
+    """
+    Test that the topic list carries literature count, last update, latest deck and last push time.
+    """
+    from datetime import datetime
+    from database import SessionLocal
+    import models
+    import ppt_files
+
+    monkeypatch.setattr(ppt_files, "PPT_DIRECTORY", str(tmp_path))
+    topic_id = client.post("/topics/", json={"name": "Summary Topic", "keywords": ["cll"]}).json()["id"]
+
+    def summary():
+        return next(topic for topic in client.get("/topics/?limit=1000").json() if topic["id"] == topic_id)
+
+    assert summary()["literature_count"] == 0
+    assert summary()["last_update_status"] is None
+    _add_literature(topic_id, datetime(2025, 3, 1))
+    paper_id = _add_literature(topic_id, datetime(2025, 3, 2))
+    assert summary()["literature_count"] == 2
+
+    record = client.post(f"/topics/{topic_id}/update-cycle").json()
+    topic = summary()
+    assert topic["last_update_status"] == "success"
+    assert topic["last_update_time"] == record["timestamp"]
+    assert topic["latest_ppt_link"] == record["ppt_preview_link"]
+
+    db = SessionLocal()
+    try:
+        pushed_at = datetime(2025, 3, 5, 8, 0)
+        db.add(models.PPTPushRecord(topic_id=topic_id, topic_name="Summary Topic", push_time=pushed_at,
+                                    ppt_filename="deck.pptx", recipients=[], channel="email", status="success"))
+        db.delete(db.get(models.Literature, paper_id))
+        db.commit()
+    finally:
+        db.close()
+    topic = summary()
+    assert topic["last_push_time"] == pushed_at.isoformat()
+    assert topic["literature_count"] == 1
+
+
+def test_llm_compare_map_reduce_with_retries_and_cache(tmp_path):
+    """
+    Test deck comparison against a local OpenAI-compatible stub: parallel chunk summaries, retries and the cache.
+    """
+    import asyncio
+    import compare_ppts
+    from llm_client import LLMClient, LLMSettings
+    from stubs import LocalOpenAIServer
+
+    deck_1 = "\n".join(f"Slide {i}: ibrutinib trial {i} reported response rate {i}%" for i in range(40))
+    deck_2 = "\n".join(f"Slide {i}: venetoclax trial {i} reported MRD negativity {i}%" for i in range(40))
+    chunks = len(compare_ppts.split_text(deck_1, 400)) + len(compare_ppts.split_text(deck_2, 400))
+    assert chunks > 4
+
+    async def compare(server, cache_path):
+        settings = LLMSettings(base_url=server.base_url, api_key="test", concurrency=4, requests_per_second=0,
+                               backoff_base=0.01, cache_path=str(cache_path))
+        async with LLMClient(settings) as llm:
+            return await compare_ppts.compare_ppt_content_async(llm, deck_1, deck_2, "a.pptx", "b.pptx", chunk_chars=800)
+
+    with LocalOpenAIServer(latency=0.05, failures=[429, 503]) as server:
+        summary = asyncio.run(compare(server, tmp_path / "llm_cache.db"))
+        assert summary.startswith("summary")
+        # One request per chunk plus the merge, and the two failed attempts that were retried
+        assert len(server.requests) == chunks + 1 + 2
+        assert 1 < server.max_active <= 4
+        merge_prompt = server.requests[-1]["messages"][-1]["content"]
+        assert "Slide 39" not in merge_prompt  # the merge sees chunk summaries, not the raw decks
+
+        # Same prompts from a new client: answered from the persistent cache
+        assert asyncio.run(compare(server, tmp_path / "llm_cache.db")) == summary
+        assert len(server.requests) == chunks + 3
+
+
+def test_diff_push_history_keeps_successful_pairs(tmp_path, monkeypatch):
+    """
+    Test that a pair whose deck cannot be read is never sent to the model, and that a failed comparison
+    does not cost the summaries of the other pairs.
+    """
+    import asyncio
+    from datetime import datetime
+    from pptx import Presentation
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    import compare_ppts
+    import models
+    from llm_client import LLMClient, LLMSettings
+    from stubs import LocalOpenAIServer
+
+    monkeypatch.setattr(compare_ppts, "PPT_DIRECTORY", str(tmp_path))
+    for name in ("a1", "b1", "b2", "c1", "c2"):
+        deck = Presentation()
+        deck.slides.add_slide(deck.slide_layouts[1]).shapes.title.text = f"Deck {name}"
+        deck.save(tmp_path / f"{name}.pptx")
+    (tmp_path / "a2.pptx").write_bytes(b"not a deck")
+    engine = create_engine(f"sqlite:///{tmp_path / 'diffs.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    for day, name in enumerate(("a1", "b1", "c1", "a2", "b2", "c2"), start=1):
+        db.add(models.PPTPushRecord(push_time=datetime(2025, 6, day), topic_name=name[0], ppt_filename=f"{name}.pptx",
+                                    recipients=[], channel="email", status="success"))
+    db.commit()
+
+    async def diff(server):
+        settings = LLMSettings(base_url=server.base_url, api_key="test", requests_per_second=0, attempts=1,
+                               cache_path=None)
+        async with LLMClient(settings) as llm:
+            return await compare_ppts.diff_push_history(db, llm)
+
+    try:
+        with LocalOpenAIServer(failures=[400]) as server:
+            assert asyncio.run(diff(server)) == 1
+            assert len(server.requests) == 2
+            assert not [r for r in server.requests if "Error reading" in r["messages"][-1]["content"]]
+            # The failed pair has no diff yet and is compared again on the next run
+            assert asyncio.run(diff(server)) == 1
+        assert sorted(diff.summary.startswith("summary") for diff in db.query(models.PPTDiff)) == [True, True]
+    finally:
+        db.close()
+
+
+def test_canonical_literature_types():
+    """
+    Test that free-text literature types are classified at ingestion and analysed by canonical type.
+    """
+    from datetime import datetime
+    import literature_types
+
+    assert literature_types.classify("Phase 3 trial") == literature_types.CLINICAL_TRIAL
+    assert literature_types.classify("Systematic Review and Meta-Analysis") == literature_types.META_ANALYSIS
+    assert literature_types.classify("Consensus Statement") == literature_types.GUIDELINE
+    assert literature_types.classify(None, "A retrospective cohort of 500 patients") == literature_types.REAL_WORLD
+    assert literature_types.classify("Supplemental Data", "Untitled") == literature_types.OTHER
+
+    topic_id = client.post("/topics/", json={"name": "Types Topic", "keywords": []}).json()["id"]
+    for literature_type in ("Clinical Trial", "Phase 3 trial", "Randomized Controlled Trial", "Meta-Analysis", "Review"):
+        _add_literature(topic_id, datetime(2025, 4, 1), literature_type=literature_type)
+
+    data = client.get(f"/topics/{topic_id}/literature-analysis").json()
+    assert data["stats"]["total_count"] == 5
+    assert data["stats"]["clinical_trial_count"] == 3
+    assert data["stats"]["meta_analysis_count"] == 1
+    assert data["distribution_data"] == [{"type": "Clinical Trial", "count": 3},
+                                         {"type": "Meta-analysis", "count": 1},
+                                         {"type": "Review", "count": 1}]
+
+def test_analysis_snapshots_frozen_per_cycle(tmp_path, monkeypatch):
+    """
+    Test that each successful update cycle freezes its analysis, and that snapshots can be diffed.
+    """
+    from datetime import datetime
+    from database import SessionLocal
+    import models
+    import ppt_files
+
+    monkeypatch.setattr(ppt_files, "PPT_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(ppt_files, "PREVIEW_DIRECTORY", str(tmp_path / ".previews"))
+
+    topic_id = client.post("/topics/", json={"name": "Snapshot Topic", "keywords": []}).json()["id"]
+    trial_id = _add_literature(topic_id, datetime(2025, 1, 5), literature_type="Phase 3 trial")
+    _add_literature(topic_id, datetime(2025, 1, 20), literature_type="Review")
+    client.post(f"/topics/{topic_id}/update-cycle")
+    meta_id = _add_literature(topic_id, datetime(2025, 3, 2), literature_type="Meta-Analysis")
+    client.post(f"/topics/{topic_id}/update-cycle")
+
+    # Live data changes after the cycles do not alter what they recorded
+    _add_literature(topic_id, datetime(2025, 3, 3), literature_type="Review")
+    db = SessionLocal()
+    try:
+        db.delete(db.query(models.Literature).get(trial_id))
+        db.commit()
+    finally:
+        db.close()
+
+    listed = client.get(f"/topics/{topic_id}/snapshots").json()
+    assert [s["literature_count"] for s in listed] == [3, 2]
+    second, first = listed
+
+    window = {"start_date": "2025-01-01", "end_date": "2025-03-31"}
+    frozen = client.get(f"/topics/{topic_id}/snapshots/{first['id']}",
+                        params={**window, "include_literature_ids": True}).json()
+    assert frozen["stats"]["total_count"] == 2
+    assert frozen["stats"]["clinical_trial_count"] == 1
+    assert frozen["trend_data"] == [{"date": "2025-01", "count": 2}, {"date": "2025-02", "count": 0},
+                                    {"date": "2025-03", "count": 0}]
+    assert trial_id in frozen["literature_ids"]
+    assert client.get(f"/topics/{topic_id}/snapshots/{second['id']}").json()["literature_ids"] is None
+
+    diff = client.get(f"/topics/{topic_id}/snapshots/{first['id']}/diff/{second['id']}", params=window).json()
+    assert diff["added_literature_ids"] == [meta_id]
+    assert diff["removed_literature_ids"] == []
+    stats = {change["key"]: change for change in diff["stats"]}
+    assert stats["total_count"]["change"] == 1
+    assert stats["meta_analysis_count"] == {"key": "meta_analysis_count", "before": 0, "after": 1, "change": 1}
+    assert diff["distribution_data"][0] == {"key": "Meta-analysis", "before": 0, "after": 1, "change": 1}
+    assert [change["change"] for change in diff["trend_data"]] == [0, 0, 1]
+
+    assert client.get(f"/topics/{topic_id}/snapshots/99999").status_code == 404
+    assert client.get(f"/topics/99999/snapshots").status_code == 404
+
+    db = SessionLocal()
+    try:
+        snapshot = db.query(models.AnalysisSnapshot).get(first["id"])
+        snapshot.literature_count = 0
+        with pytest.raises(ValueError):
+            db.commit()
+        db.rollback()
+    finally:
+        db.close()
+
+def test_pubmed_fetch_incremental(monkeypatch):
+    """
+    Test fetching a topic's papers from a local E-utilities server: split windows, batched efetch,
+    retries, per-host concurrency and an incremental second fetch.
+    """
+    from datetime import date, timedelta
+    import pubmed
+    from stubs import LocalEutilsServer
+
+    today = date.today()
+
+    def article(pmid, days_ago, title):
+        published = today - timedelta(days=days_ago + 30)
+        return {"pmid": str(pmid), "title": title, "abstract": "Outcomes in patients.", "journal": "Blood",
+                "publication_date": published, "entrez_date": today - timedelta(days=days_ago),
+                "authors": [("Hallek", "M"), ("Al-Sawaf", "OA")],
+                "publication_types": ["Journal Article", "Randomized Controlled Trial"], "keywords": ["CLL"]}
+
+    articles = [article(900000 + i, i % 20, f"Zanubrutinib in CLL cohort {i}") for i in range(40)]
+    articles += [article(910000 + i, i, f"Unrelated asthma paper {i}") for i in range(10)]
+    articles += [article(920000, 200, "Zanubrutinib long before the lookback window")]
+
+    topic_id = client.post("/topics/", json={"name": "Fetch Topic", "keywords": ["zanubrutinib"]}).json()["id"]
+    with LocalEutilsServer(articles, latency=0.01, failures=[503, 429]) as server:
+        settings = pubmed.EutilsSettings(base_url=server.base_url, requests_per_second=0, concurrency=2,
+                                         batch_size=7, insert_batch_size=10, max_window_results=12,
+                                         lookback_days=60, backoff_base=0.01)
+        monkeypatch.setattr(pubmed.EutilsSettings, "from_env", classmethod(lambda cls: settings))
+
+        first = client.post(f"/topics/{topic_id}/fetch").json()
+        assert first["found"] == first["fetched"] == first["inserted"] == 40
+        assert first["mindate"] == str(today - timedelta(days=60))
+        assert server.max_active <= 2
+        # Windows over 12 results were split by date before fetching
+        assert all(int(params["retstart"]) < 12 for utility, params in server.requests if utility == "efetch.fcgi")
+
+        new = article(930000, 0, "Zanubrutinib update")
+        server.articles.append(new)
+        server.by_pmid[new["pmid"]] = new
+        server.requests.clear()
+        second = client.post(f"/topics/{topic_id}/fetch").json()
+        assert second["mindate"] == str(today)
+        assert second["found"] == 3  # the two papers of the last fetched day again, and the new one
+        assert second["inserted"] == 1
+        assert {params["mindate"] for utility, params in server.requests if utility == "esearch.fcgi"} == \
+            {today.strftime("%Y/%m/%d")}
+
+    papers = client.get(f"/topics/{topic_id}/literature-analysis", params={"limit": 100}).json()
+    assert papers["stats"]["total_count"] == 41
+    assert papers["stats"]["clinical_trial_count"] == 41
+    stored = {paper["pmid"]: paper for paper in papers["literature"]}
+    assert stored["930000"]["authors"] == ["Hallek, M.", "Al-Sawaf, O.A."]
+    assert stored["930000"]["literature_type"] == "Randomized Controlled Trial"
+    assert client.post("/topics/99999/fetch").status_code == 404
+
+def test_pubmed_clients_share_host_limits():
+    """
+    Test that concurrent fetches through separate clients together stay within the host's concurrency limit.
+    """
+    import asyncio
+    from datetime import date
+    import pubmed
+    from stubs import LocalEutilsServer
+
+    with LocalEutilsServer([], latency=0.05) as server:
+        settings = pubmed.EutilsSettings(base_url=server.base_url, requests_per_second=0, concurrency=2)
+
+        async def fetch(client):
+            await asyncio.gather(*(client.esearch("cll", date(2025, 1, 1), date(2025, 1, 31)) for _ in range(4)))
+
+        async def fetch_concurrently():
+            async with pubmed.EutilsClient(settings) as first, pubmed.EutilsClient(settings) as second:
+                await asyncio.gather(fetch(first), fetch(second))
+
+        asyncio.run(fetch_concurrently())
+        assert len(server.requests) == 8
+        assert server.max_active <= 2
+
+
+def test_pubmed_baseline_import_resumes(tmp_path, monkeypatch):
+    """
+    Test importing baseline dumps in worker processes, skipping finished files and resuming a failed one.
+    """
+    import gzip
+    from datetime import date
+    from database import SessionLocal
+    import models
+    import pubmed_import
+    from stubs import pubmed_article_xml
+
+    monkeypatch.setattr(pubmed_import, "CHUNK_ARTICLES", 4)
+    topic_id = client.post("/topics/", json={"name": "Baseline Topic", "keywords": ["Okapi Syndrome"]}).json()["id"]
+
+    def dump(first_pmid):
+        articles = [pubmed_article_xml({
+            "pmid": str(first_pmid + i), "journal": "Blood", "publication_date": date(2020, 1 + i % 12, 1),
+            "title": f"{'Okapi syndrome' if i % 3 == 0 else 'Unrelated'} study {i}", "abstract": f"Methods and results {i}. " * 200,  # several parser reads per file
+        }) for i in range(30)]
+        return ("<?xml version='1.0'?>\n<PubmedArticleSet>" + "".join(articles) + "</PubmedArticleSet>").encode()
+
+    first, second = tmp_path / "pubmed25n0001.xml.gz", tmp_path / "pubmed25n0002.xml.gz"
+    first.write_bytes(gzip.compress(dump(700000)))
+    complete_second = gzip.compress(dump(800000))
+    second.write_bytes(complete_second[:len(complete_second) * 2 // 3])  # truncated download
+
+    paths = pubmed_import.expand_paths([str(tmp_path)])
+    result = pubmed_import.import_dumps(SessionLocal, paths, processes=2, topic_ids=[topic_id])
+    assert result.files == 1 and list(result.failed) == [str(second)]
+    db = SessionLocal()
+    try:
+        progress = db.query(models.ImportProgress).get("pubmed25n0002.xml.gz")
+        resumed_from = progress.articles_done
+        assert progress.completed_at is None and 0 < resumed_from < 30
+        imported = db.query(models.Literature).filter_by(topic_id=topic_id).count()
+        assert imported == 10 + (resumed_from + 2) // 3
+    finally:
+        db.close()
+
+    second.write_bytes(complete_second)
+    result = pubmed_import.import_dumps(SessionLocal, paths, processes=2, topic_ids=[topic_id])
+    assert (result.files, result.skipped_files, result.failed) == (1, 1, {})
+    assert result.articles == 30 - resumed_from
+    assert client.get(f"/topics/{topic_id}").json()["literature_count"] == 20
+
+
+def test_keyword_router_assigns_papers_to_topics():
+    """
+    Test routing papers to topics by keyword with case folding, plurals and synonyms, and following topic changes.
+    """
+    import keyword_router
+
+    router = keyword_router.KeywordRouter()
+    router.set_topic(1, ["CLL", "BTK inhibitor"])
+    router.set_topic(2, ["lung cancer"])
+    router.set_topic(3, ["chronic lymphocytic leukemia"])
+    assert router.route("Zanubrutinib versus ibrutinib in chronic lymphocytic leukaemia",
+                        "Outcomes with BTK inhibitors.") == [(3, 1.0), (1, (3 + 1) / 6)]
+    assert router.route("Small cell lung cancer", keywords=["lung", "cancer"]) == [(2, 1.0)]
+    assert router.route("Lung", keywords=["cancer"]) == []  # phrases do not span fields
+    assert router.rebuilds == 1
+
+    router.set_topic(2, ["CLL"])  # only known phrases: no rebuild
+    router.remove_topic(3)
+    assert router.route("Venetoclax for CLL") == [(2, 1.0), (1, 0.5)]
+    router.set_topic(4, ["venetoclax"])
+    assert [topic_id for topic_id, _ in router.route("Venetoclax for CLL")] == [2, 4, 1]
+    assert router.rebuilds == 2
+    assert list(router.route_many([{"title": "Nothing"}, {"title": "CLL", "summary": "", "keywords": []}],
+                                  min_score=0.6)) == [keyword_router.Assignment(1, 2, 1.0)]
+
+    topic_id = client.post("/topics/", json={"name": "Router Topic", "keywords": ["okapi syndrome", "giraffe"]}).json()["id"]
+    papers = [{"title": "Okapi Syndromes in the wild"}, {"title": "Other", "keywords": ["giraffe"], "summary": "Okapi syndrome"}]
+    response = client.post("/literature/route", json=papers)
+    assert response.status_code == 200
+    assert [item for item in response.json() if item["topic_id"] == topic_id] == [
+        {"paper": 0, "topic_id": topic_id, "score": 0.5},
+        {"paper": 1, "topic_id": topic_id, "score": 0.5},
+    ]
+    client.put(f"/topics/{topic_id}", json={"name": "Router Topic", "keywords": ["giraffe"]})
+    assert [item["paper"] for item in client.post("/literature/route", json=papers).json()
+            if item["topic_id"] == topic_id] == [1]
+
+
+def test_profiling_single_request(tmp_path):
+    """
+    Test profiling one request with stack samples and its SQL, guarded by the admin token.
+    """
+    import json
+    import profiling
+    from database import engine
+
+    assert not any(middleware.cls is profiling.ProfilingMiddleware for middleware in app.user_middleware)  # off by default
+    settings = profiling.ProfilingSettings(enabled=True, token="secret", directory=str(tmp_path))
+    profiled = TestClient(profiling.ProfilingMiddleware(app, engine, settings))
+    topic_id = client.post("/topics/", json={"name": "Profiled Topic", "keywords": ["okapi"]}).json()["id"]
+    url = f"/topics/{topic_id}/literature-analysis"
+
+    plain = profiled.get(url)
+    assert plain.status_code == 200 and "x-profile-id" not in plain.headers
+    assert profiled.get(url, params={"profile": 1}).status_code == 403
+    response = profiled.get(url, headers={"X-Profile": "1", "X-Profile-Token": "secret"})
+    assert response.status_code == 200 and response.json() == plain.json()
+    profile_id = response.headers["x-profile-id"]
+
+    assert profiled.get(f"/profiles/{profile_id}").status_code == 403
+    assert profiled.get("/profiles/missing", headers={"X-Profile-Token": "secret"}).status_code == 404
+    report = profiled.get(f"/profiles/{profile_id}", headers={"X-Profile-Token": "secret"}).json()
+    assert report == json.loads((tmp_path / f"{profile_id}.speedscope.json").read_text())
+    assert report["name"].startswith(f"GET {url} (200")
+    assert any("FROM literature" in statement["statement"] for statement in report["sql"])
+    assert all(statement["duration_ms"] >= 0 for statement in report["sql"])
+    sql_profile = report["profiles"][-1]
+    assert sql_profile["type"] == "evented" and len(sql_profile["events"]) == 2 * len(report["sql"])
+    assert {profile["type"] for profile in report["profiles"][:-1]} <= {"sampled"}
+
+
+def test_literature_sparse_fieldsets_and_detail(tmp_path, monkeypatch):
+    """
+    Test selecting literature fields, truncating summaries in list endpoints and loading one paper in full.
+    """
+    from datetime import datetime
+    import similarity
+
+    monkeypatch.setattr(similarity, "INDEX_DIRECTORY", str(tmp_path / "index"))
+    topic_id = client.post("/topics/", json={"name": "Sparse Topic", "keywords": ["cll"]}).json()["id"]
+    summary = "Venetoclax obinutuzumab in CLL. " * 20
+    first = _add_literature(topic_id, datetime(2025, 1, 1), title="First CLL paper", summary=summary, keywords=["cll"])
+    second = _add_literature(topic_id, datetime(2025, 2, 1), title="Second CLL paper", summary="Short.", keywords=["cll"])
+    url = f"/topics/{topic_id}/literature-analysis"
+
+    full = client.get(url).json()["literature"]
+    assert [paper["id"] for paper in full] == [second, first]
+    assert set(full[0]) == {"id", "title", "authors", "publication_date", "journal_name", "keywords", "summary",
+                            "literature_type", "relevance_score", "pmid"}
+
+    response = client.get(url, params={"fields": "title,publication_date", "summary_length": 10})
+    assert response.json()["literature"] == [
+        {"id": second, "title": "Second CLL paper", "publication_date": "2025-02-01T00:00:00"},
+        {"id": first, "title": "First CLL paper", "publication_date": "2025-01-01T00:00:00"},
+    ]
+    assert response.json()["stats"]["total_count"] == 2
+    rows = client.get(url, params={"fields": "summary", "summary_length": 10}).json()["literature"]
+    assert rows == [{"id": second, "summary": "Short.", "summary_truncated": False},
+                    {"id": first, "summary": summary[:10], "summary_truncated": True}]
+    assert client.get(url, params={"fields": "title,citations"}).status_code == 400
+    assert client.get(url, params={"summary_length": -1}).status_code == 422
+
+    similar = client.get(f"/literature/{second}/similar", params={"fields": "title"}).json()
+    assert similar and all(set(paper) == {"id", "title", "topic_id", "similarity"} for paper in similar)
+
+    detail = client.get(f"/literature/{first}")
+    assert detail.status_code == 200
+    assert detail.json()["summary"] == summary and detail.json()["topic_id"] == topic_id
+    assert client.get("/literature/999999").status_code == 404
+    client.delete(f"/topics/{topic_id}")
+    assert client.get(f"/literature/{first}").status_code == 404
+
+
+def test_identical_concurrent_requests_are_coalesced(monkeypatch):
+    """
+    Test that identical concurrent requests share one computation, and that the metrics count them.
+    """
+    import asyncio
+    import threading
+    import time
+    import crud
+    import singleflight
+
+    topic_id = client.post("/topics/", json={"name": "Coalesced Topic", "keywords": []}).json()["id"]
+    group = singleflight.group("trend")
+    before = group.stats()
+    release = threading.Event()
+    computed = []
+    original = crud.get_literature_trend
+
+    def slow_trend(db, **kwargs):
+        computed.append(kwargs)
+        release.wait(5)
+        return original(db, **kwargs)
+
+    monkeypatch.setattr(crud, "get_literature_trend", slow_trend)
+    url = f"/topics/{topic_id}/trend?granularity=year&start_date=2024-01-01&end_date=2025-12-31"
+    responses = []
+    threads = [threading.Thread(target=lambda: responses.append(TestClient(app).get(url))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while group.stats().calls < before.calls + 5 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert group.stats().in_flight == 1
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(computed) == 1
+    assert [response.json() for response in responses] == [[{"date": "2024", "count": 0}, {"date": "2025", "count": 0}]] * 5
+    metrics = {item["name"]: item for item in client.get("/metrics/coalescing").json()}["trend"]
+    assert (metrics["executions"] - before.executions, metrics["coalesced"] - before.coalesced) == (1, 4)
+    assert metrics["in_flight"] == 0
+
+    # Finished flights are not cached; failures reach every waiter
+    client.get(url)
+    assert len(computed) == 2
+
+    async def failing():
+        await asyncio.sleep(0.05)
+        raise ValueError("boom")
+
+    async def run_async():
+        flights = singleflight.Group("test")
+        results = await asyncio.gather(*(flights.do_async("key", failing) for _ in range(3)), return_exceptions=True)
+        return flights.stats(), results
+
+    stats, results = asyncio.run(run_async())
+    assert (stats.executions, stats.coalesced, stats.in_flight) == (1, 2, 0)
+    assert all(isinstance(result, ValueError) for result in results)
+
+def test_literature_context_packer():
+    """
+    Test packing a topic's most relevant papers of a period into the outline prompt under a token budget.
+    """
+    from datetime import date, datetime
+    from database import SessionLocal
+    import literature_context
+
+    topic_id = client.post("/topics/", json={"name": "Context Topic", "keywords": []}).json()["id"]
+    best = _add_literature(topic_id, datetime(2025, 3, 1), title="Zanubrutinib versus ibrutinib in relapsed CLL",
+                           pmid="101", relevance_score=0.9, literature_type="Randomized Controlled Trial",
+                           summary="Background text. Response rate was 83% vs 74% (P<0.05). "
+                                   "Conclusions: Zanubrutinib improved progression-free survival.")
+    _add_literature(topic_id, datetime(2025, 2, 1), title="Zanubrutinib vs ibrutinib relapsed CLL (erratum)",
+                    pmid="101", relevance_score=0.8)
+    _add_literature(topic_id, datetime(2025, 2, 1), title="Zanubrutinib versus ibrutinib in relapsed CLL.",
+                    relevance_score=0.7)
+    second = _add_literature(topic_id, datetime(2024, 12, 1), title="Venetoclax MRD kinetics",
+                             summary="We enrolled 80 patients. MRD negativity reached 62% and was associated with longer survival.")
+    _add_literature(topic_id, datetime(2023, 1, 1), title="Old paper outside the period", relevance_score=1.0)
+
+    db = SessionLocal()
+    try:
+        settings = literature_context.ContextSettings(token_budget=2000)
+        context = literature_context.pack_topic(db, topic_id, date(2024, 6, 1), date(2025, 5, 31), settings)
+        assert context.literature_ids == [best, second]
+        assert (context.candidates, context.duplicates, context.skipped) == (4, 2, 0)
+        assert context.tokens <= settings.token_budget
+        assert context.tokens >= literature_context.estimate_tokens(context.text)  # per-line estimates round up
+        lines = context.text.splitlines()
+        assert lines[1] == ("1. Zanubrutinib versus ibrutinib in relapsed CLL | Clinical Trial | Test Journal 2025 | PMID 101 | "
+                            "Zanubrutinib improved progression-free survival.")
+        assert lines[2].endswith("| MRD negativity reached 62% and was associated with longer survival.")
+
+        tight = literature_context.pack_topic(db, topic_id, date(2024, 6, 1), date(2025, 5, 31),
+                                              literature_context.ContextSettings(token_budget=sum(
+                                                  literature_context.estimate_tokens(line) + 1 for line in lines[:2])))
+        assert tight.literature_ids == [best] and (tight.duplicates, tight.skipped) == (0, 3)  # spent: stops early
+        empty = literature_context.pack_topic(db, topic_id, date(2020, 1, 1), date(2020, 12, 31), settings)
+        assert empty.text == "" and empty.literature_ids == []
+    finally:
+        db.close()
+
+    assert literature_context.outline_prompt("CLL", empty) == "CLL"
+    prompt = literature_context.outline_prompt("CLL", context)
+    assert prompt.startswith("CLL\n\n") and lines[1] in prompt
+    assert literature_context.estimate_tokens("肺癌 trial") == 2 + 2
+
+def test_literature_ids_not_reissued_after_purge(tmp_path, monkeypatch):
+    """
+    Test that papers added after the newest ones were purged get fresh ids and are indexed, and that a table
+    created before AUTOINCREMENT is rebuilt by the explicit migration step with its sequence above every
+    remembered id.
+    """
+    import json
+    import os
+    from datetime import datetime
+    from sqlalchemy import create_engine, text
+    from database import engine as app_engine
+    import migrations
+    import ppt_files
+    import similarity
+    import topic_deletion
+
+    monkeypatch.setattr(ppt_files, "PPT_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(similarity, "INDEX_DIRECTORY", str(tmp_path / "index"))
+    monkeypatch.setattr(similarity, "MIN_TRAINING_SIZE", 4)
+    monkeypatch.setattr(topic_deletion, "BATCH_PAUSE", 0)
+    if migrations.rebuild_literature_with_autoincrement(app_engine):  # the sample database predates it
+        migrations.upgrade(app_engine)
+    kept = client.post("/topics/", json={"name": "Reissue Keep", "keywords": []}).json()["id"]
+    doomed = client.post("/topics/", json={"name": "Reissue Purge", "keywords": []}).json()["id"]
+    query_id = _add_literature(kept, datetime(2025, 1, 1), title="Narwhal tapir cohort signature",
+                               summary="Narwhal tapir cohort signature.", keywords=["narwhal"])
+    doomed_ids = {_add_literature(doomed, datetime(2025, 1, day), title="Narwhal tapir cohort signature",
+                                  summary="Narwhal tapir cohort signature.", keywords=["narwhal"]) for day in range(1, 6)}
+    assert client.post(f"/topics/{doomed}/update-cycle").status_code == 200
+    similar_ids = lambda: {paper["id"] for paper in client.get(f"/literature/{query_id}/similar?k=5").json()}
+    assert similar_ids() == doomed_ids
+    assert client.delete(f"/topics/{doomed}").status_code == 204
+
+    new_id = _add_literature(kept, datetime(2025, 2, 1), title="Narwhal tapir cohort signature",
+                             summary="Narwhal tapir cohort signature.", keywords=["narwhal"])
+    assert new_id > max(doomed_ids)
+    assert new_id in similar_ids() and not similar_ids() & doomed_ids
+
+    legacy = tmp_path / "legacy"
+    os.makedirs(legacy / "index")
+    with open(legacy / "index" / "meta.json", "w") as f:
+        json.dump({"watermark": 3}, f)
+    monkeypatch.setattr(similarity, "INDEX_DIRECTORY", str(legacy / "index"))
+    engine = create_engine(f"sqlite:///{legacy / 'legacy.db'}")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE literature (id INTEGER NOT NULL PRIMARY KEY, topic_id INTEGER, title VARCHAR)"))
+        connection.execute(text("INSERT INTO literature (id, topic_id, title) VALUES (1, 1, 'a'), (2, 1, 'b')"))
+    migrations.upgrade(engine)
+    with engine.connect() as connection:  # startup only warns
+        assert "AUTOINCREMENT" not in connection.execute(text("SELECT sql FROM sqlite_master WHERE name = 'literature'")).scalar()
+    assert migrations.rebuild_literature_with_autoincrement(engine)
+    migrations.upgrade(engine)
+    assert not migrations.rebuild_literature_with_autoincrement(engine)
+    with engine.begin() as connection:
+        assert "AUTOINCREMENT" in connection.execute(text("SELECT sql FROM sqlite_master WHERE name = 'literature'")).scalar()
+        assert connection.execute(text("SELECT title FROM literature ORDER BY id")).scalars().all() == ["a", "b"]
+        connection.execute(text("INSERT INTO literature (topic_id, title) VALUES (1, 'c')"))
+        assert connection.execute(text("SELECT MAX(id) FROM literature")).scalar() == 4
+        assert connection.execute(text("SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger'")).scalar() > 0
+
+
+def test_literature_archive_tiers(tmp_path, monkeypatch):
+    """
+    Test moving old literature to the attached archive in batches, and reading recent windows from the hot
+    table alone while older or unbounded queries see both tiers.
+    """
+    from datetime import date, datetime
+    from sqlalchemy import create_engine, event, func, select
+    from sqlalchemy.orm import sessionmaker
+    import crud
+    import literature_archive
+    import literature_context
+    import migrations
+    import models
+    import relevance
+    import similarity
+    import topic_deletion
+
+    monkeypatch.setattr(literature_archive, "BATCH_PAUSE", 0)
+    monkeypatch.setattr(topic_deletion, "BATCH_PAUSE", 0)
+    monkeypatch.setattr(similarity, "INDEX_DIRECTORY", str(tmp_path / "index"))
+    engine = create_engine(f"sqlite:///{tmp_path / 'hot.db'}")
+    settings = literature_archive.ArchiveSettings(str(tmp_path / "archive.db"), hot_days=365, batch_size=2)
+    literature_archive.attach(engine, settings.path)
+    migrations.upgrade(engine)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, sql, *args: statements.append(sql))
+    Session = sessionmaker(bind=engine)
+
+    db = Session()
+    topic = models.Topic(name="Tiered", keywords=["cll"])
+    db.add(topic)
+    db.flush()
+    papers = [models.Literature(topic_id=topic.id, title=f"Paper {day}", publication_date=day, relevance_score=score,
+                                literature_type="Clinical Trial" if score > 0.5 else "Review")
+              for day, score in [(datetime(2020, 1, 5), 0.9), (datetime(2021, 3, 1), 0.2), (datetime(2025, 6, 1), 0.6),
+                                 (datetime(2023, 8, 1), 0.1), (datetime(2025, 5, 1), 0.5), (datetime(2025, 4, 1), 0.4),
+                                 (datetime(2019, 2, 1), 0.3)]]  # the newest id is an old backfilled paper
+    db.add_all(papers)
+    db.commit()
+    ids, topic_id = [paper.id for paper in papers], topic.id
+    db.close()
+    assert literature_archive.archive_literature(engine, settings, today=date(2025, 6, 30)) == \
+        literature_archive.ArchiveResult(4, 2, models.to_day_number(date(2024, 6, 30)))
+    assert literature_archive.archive_literature(engine, settings, today=date(2025, 6, 30)).moved == 0
+
+    db = Session()
+    topic = db.get(models.Topic, topic_id)
+    try:
+        archived = {row.id for row in db.execute(select(literature_archive.archived.c.id))}
+        assert archived == {ids[0], ids[1], ids[3], ids[6]}
+        assert db.query(func.count(models.Literature.id)).scalar() == 3
+
+        statements.clear()
+        analysis = crud.get_literature_analysis(db, topic.id, limit=3)
+        assert [item.id for item in analysis.literature] == [ids[2], ids[4], ids[5]]
+        assert analysis.stats.total_count == 7 and analysis.stats.clinical_trial_count == 2
+        assert not [sql for sql in statements if "archive." in sql and "type_code" not in sql]
+        assert [item.id for item in crud.get_literature_analysis(db, topic.id, limit=5).literature] == \
+            [ids[2], ids[4], ids[5], ids[3], ids[1]]
+        assert [item.id for item in crud.get_literature_analysis(db, topic.id, limit=10, order_by="relevance").literature] == \
+            [ids[0], ids[2], ids[4], ids[5], ids[6], ids[1], ids[3]]
+        assert crud.get_literature(db, ids[0]).title == "Paper 2020-01-05 00:00:00"
+        assert sum(point.count for point in crud.get_literature_trend(
+            db, topic.id, granularity="year", start_date=date(2019, 1, 1), end_date=date(2025, 12, 31))) == 7
+
+        statements.clear()
+        recent = literature_context.pack_topic(db, topic.id, date(2025, 1, 1), date(2025, 6, 30))
+        assert recent.literature_ids == [ids[2], ids[4], ids[5]]
+        assert not [sql for sql in statements if "archive." in sql]
+        assert literature_context.pack_topic(db, topic.id, date(2020, 1, 1), date(2021, 12, 31)).literature_ids == \
+            [ids[0], ids[1]]
+
+        db.add(models.Literature(topic_id=topic.id, title="New", publication_date=datetime(2025, 6, 20)))
+        db.commit()
+        assert db.query(func.max(models.Literature.id)).scalar() > max(ids)
+        topic.deleted_at = datetime(2025, 7, 1)
+        db.commit()
+    finally:
+        db.close()
+
+    with engine.begin() as connection:
+        relevance.rescore_topic(connection, topic_id)  # no keyword in any title: every score drops to 0
+        assert {score for score, in connection.execute(select(literature_archive.archived.c.relevance_score))} == {0.0}
+    assert topic_deletion.purge_topic(engine, topic_id)
+    with engine.connect() as connection:
+        assert [table.name for table in literature_archive.tables(connection)] == ["literature", "literature"]
+        assert literature_archive.tables(connection, since=date(2024, 6, 30)) == [models.Literature.__table__]
+        assert connection.execute(select(func.count()).select_from(literature_archive.literature_table(connection))).scalar() == 0
+
+
+def test_literature_archive_readers_keep_their_snapshot(tmp_path, monkeypatch):
+    """
+    Test that a reader which picked the hot table alone still sees every paper while the first archive run
+    raises the boundary and moves them, and that the same session can write afterwards.
+    """
+    import threading
+    import time
+    from datetime import date, datetime
+    from sqlalchemy import create_engine, func, select
+    from sqlalchemy.orm import sessionmaker
+    import literature_archive
+    import migrations
+    import models
+
+    monkeypatch.setattr(literature_archive, "BATCH_PAUSE", 0)
+    engine = create_engine(f"sqlite:///{tmp_path / 'hot.db'}")
+    settings = literature_archive.ArchiveSettings(str(tmp_path / "archive.db"), hot_days=365, batch_size=2)
+    literature_archive.attach(engine, settings.path)
+    migrations.upgrade(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        topic = models.Topic(name="Snapshot", keywords=[])
+        db.add(topic)
+        db.flush()
+        db.add_all([models.Literature(topic_id=topic.id, title="Paper", publication_date=datetime(2020, month, 1))
+                    for month in range(1, 6)])
+        db.commit()
+        topic_id = topic.id
+
+    with Session() as reader:
+        entity = literature_archive.literature_entity(reader)
+        assert entity is models.Literature  # nothing archived yet
+        results = []
+        archiver = threading.Thread(target=lambda: results.append(
+            literature_archive.archive_literature(engine, settings, today=date(2025, 6, 30))))
+        archiver.start()
+        time.sleep(0.3)
+        assert reader.query(func.count(entity.id)).scalar() == 5
+        reader.add(models.Literature(topic_id=topic_id, title="New", publication_date=datetime(2025, 6, 1)))
+        reader.commit()
+        archiver.join()
+    assert results[0].moved == 5
+    with engine.connect() as connection:
+        assert connection.execute(select(func.count()).select_from(literature_archive.literature_table(connection))).scalar() == 6
+
+
+def test_literature_archive_after_purging_newest_topic(tmp_path, monkeypatch):
+    """
+    Test that after the topic holding the newest ids is purged, new papers get fresh ids and archiving them
+    never collides with ids already in the archive.
+    """
+    from datetime import date, datetime
+    from sqlalchemy import create_engine, func, select
+    from sqlalchemy.orm import sessionmaker
+    import literature_archive
+    import migrations
+    import models
+    import similarity
+    import topic_deletion
+
+    monkeypatch.setattr(literature_archive, "BATCH_PAUSE", 0)
+    monkeypatch.setattr(topic_deletion, "BATCH_PAUSE", 0)
+    monkeypatch.setattr(similarity, "INDEX_DIRECTORY", str(tmp_path / "index"))
+    engine = create_engine(f"sqlite:///{tmp_path / 'hot.db'}")
+    settings = literature_archive.ArchiveSettings(str(tmp_path / "archive.db"), hot_days=365, batch_size=2)
+    literature_archive.attach(engine, settings.path)
+    migrations.upgrade(engine)
+    Session = sessionmaker(bind=engine)
+
+    def add(topic_id, *days):
+        with Session() as db:
+            papers = [models.Literature(topic_id=topic_id, title="Paper", publication_date=day) for day in days]
+            db.add_all(papers)
+            db.commit()
+            return [paper.id for paper in papers]
+
+    with Session() as db:
+        kept, doomed = models.Topic(name="Kept", keywords=[]), models.Topic(name="Doomed", keywords=[])
+        db.add_all([kept, doomed])
+        db.commit()
+        kept_id, doomed_id = kept.id, doomed.id
+    old = add(kept_id, datetime(2020, 1, 1), datetime(2020, 2, 1))
+    purged = add(doomed_id, datetime(2020, 3, 1), datetime(2025, 6, 1))
+    assert literature_archive.archive_literature(engine, settings, today=date(2025, 6, 30)).moved == 3
+
+    with Session() as db:
+        db.get(models.Topic, doomed_id).deleted_at = datetime(2025, 6, 30)
+        db.commit()
+    assert topic_deletion.purge_topic(engine, doomed_id)
+    added = add(kept_id, datetime(2021, 1, 1), datetime(2021, 2, 1))
+    assert min(added) > max(purged)
+    assert literature_archive.archive_literature(engine, settings, today=date(2025, 6, 30)).moved == 2
+
+    with engine.connect() as connection:
+        archived = connection.execute(select(literature_archive.archived.c.id).order_by(literature_archive.archived.c.id))
+        assert archived.scalars().all() == old + added
+        assert connection.execute(select(func.count()).select_from(models.Literature.__table__)).scalar() == 0
+
+
+def test_publication_day_backfill_matches_day_number():
+    """
+    Test that the publication_day backfill agrees with models.to_day_number, including times before 1970.
+    """
+    from datetime import datetime
+    from sqlalchemy import create_engine, text
+    import migrations
+    import models
+
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind=engine)
+    dates = [datetime(1969, 12, 31, 18), datetime(1899, 3, 4, 12), datetime(1970, 1, 1, 23, 59), datetime(2025, 1, 1)]
+    with engine.begin() as connection:
+        connection.execute(models.Literature.__table__.insert(), [{"title": "Paper", "publication_date": day}
+                                                                  for day in dates])
+        connection.execute(text(migrations.BACKFILLS[0]))
+        days = connection.execute(text("SELECT publication_day FROM literature ORDER BY id")).scalars().all()
+    assert days == [models.to_day_number(day) for day in dates]
+
+
+def test_incremental_vacuum_is_an_explicit_step(tmp_path):
+    """
+    Test that upgrade() never rewrites an existing database with VACUUM, while new databases start incremental.
+    """
+    from sqlalchemy import create_engine, event, text
+    import migrations
+    import topic_deletion
+
+    fresh = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    migrations.upgrade(fresh)
+    existing = create_engine(f"sqlite:///{tmp_path / 'existing.db'}")
+    with existing.begin() as connection:
+        connection.execute(text("CREATE TABLE legacy (id INTEGER PRIMARY KEY)"))
+    statements = []
+    event.listen(existing, "before_cursor_execute", lambda conn, cursor, sql, *args: statements.append(sql))
+    migrations.upgrade(existing)
+
+    def auto_vacuum(engine):
+        with engine.connect() as connection:
+            return connection.execute(text("PRAGMA auto_vacuum")).scalar()
+
+    assert (auto_vacuum(fresh), auto_vacuum(existing)) == (2, 0)
+    assert "VACUUM" not in statements
+
+    topic_deletion.enable_incremental_vacuum(existing)
+    statements.clear()
+    topic_deletion.enable_incremental_vacuum(existing)
+    assert auto_vacuum(existing) == 2 and "VACUUM" not in statements
+
+
+def test_keyword_matrix_refresh_does_not_block_other_topics(monkeypatch):
+    """
+    Test that a topic whose keyword matrix is being refreshed does not hold up requests for another topic.
+    """
+    import threading
+    from database import SessionLocal
+    import keyword_trends
+
+    slow = client.post("/topics/", json={"name": "Slow Matrix", "keywords": []}).json()["id"]
+    fast = client.post("/topics/", json={"name": "Fast Matrix", "keywords": []}).json()["id"]
+    keyword_trends.invalidate()
+    started, release = threading.Event(), threading.Event()
+    refresh = keyword_trends.KeywordMatrix.refresh
+
+    def blocking_refresh(self, db):
+        if self.topic_id == slow:
+            started.set()
+            assert release.wait(5)
+        refresh(self, db)
+
+    monkeypatch.setattr(keyword_trends.KeywordMatrix, "refresh", blocking_refresh)
+
+    def load(topic_id):
+        db = SessionLocal()
+        try:
+            keyword_trends.get_keyword_matrix(db, topic_id)
+        finally:
+            db.close()
+
+    waiting = threading.Thread(target=load, args=(slow,))
+    waiting.start()
+    try:
+        assert started.wait(5)
+        other = threading.Thread(target=load, args=(fast,))
+        other.start()
+        other.join(2)
+        assert not other.is_alive()
+    finally:
+        release.set()
+        waiting.join()
+
+
+def test_llm_identical_prompt_survives_cancelled_caller():
+    """
+    Test that an identical prompt in flight is sent once, and cancelling the caller that sent it does not
+    cancel the other callers waiting for the same answer.
+    """
+    import asyncio
+    from llm_client import LLMClient, LLMSettings
+    from stubs import LocalOpenAIServer
+
+    async def ask(server):
+        settings = LLMSettings(base_url=server.base_url, api_key="test", requests_per_second=0, cache_path=None)
+        async with LLMClient(settings) as llm:
+            messages = [{"role": "user", "content": "Summarize the CLL decks"}]
+            first = asyncio.ensure_future(llm.complete(messages))
+            await asyncio.sleep(0.01)
+            second = asyncio.ensure_future(llm.complete(messages))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            return await second, first.cancelled()
+
+    with LocalOpenAIServer(latency=0.1) as server:
+        answer, cancelled = asyncio.run(ask(server))
+        assert answer.startswith("summary") and cancelled
+        assert len(server.requests) == 1
+
+
+def test_keyword_matrix_copy_on_write_and_replaced_papers():
+    """
+    Test that a keyword matrix already handed out is never modified by a refresh, and that deleting a paper
+    while adding another (same count) rebuilds the matrix.
+    """
+    from datetime import datetime
+    from database import SessionLocal
+    import keyword_trends
+    import models
+
+    topic_id = client.post("/topics/", json={"name": "Copy On Write", "keywords": []}).json()["id"]
+    first = _add_literature(topic_id, datetime(2025, 1, 1), keywords=["alpha", "beta"])
+    _add_literature(topic_id, datetime(2025, 1, 2), keywords=["alpha", "gamma"])
+
+    def load():
+        db = SessionLocal()
+        try:
+            return keyword_trends.get_keyword_matrix(db, topic_id)
+        finally:
+            db.close()
+
+    before = load()
+    rows, terms = before.matrix.shape
+    _add_literature(topic_id, datetime(2025, 1, 3), keywords=["delta"])
+    after = load()
+    assert after is not before and after.paper_count == 3
+    assert before.matrix.shape == (rows, terms) and before.paper_count == 2
+
+    db = SessionLocal()
+    try:
+        db.delete(db.get(models.Literature, first))
+        db.commit()
+    finally:
+        db.close()
+    _add_literature(topic_id, datetime(2025, 1, 4), keywords=["epsilon"])
+    replaced = load()
+    assert replaced.paper_count == 3 and "beta" not in replaced.vocabulary
@@ -0,0 +1,144 @@
+# 主题删除流水线
+# crud.delete_topic 只设置 topics.deleted_at (一条 UPDATE)，主题立即从所有查询中隐藏;
+# 随后在后台按批删除它的文献、每日计数、分析快照、更新记录和报告章节，每批一个短事务 (PURGE_BATCH_SIZE 行)，
+# 批与批之间让出写锁，因此同时进行的写入最多只需等待一批的时间 (几毫秒)。
+# 热库和归档库中的文献都会删除，并同时从相似文献索引中移除 (墓碑)，最后删除主题行并回收空间:
+# SQLite 切换为 auto_vacuum=INCREMENTAL 后，用 PRAGMA incremental_vacuum 分步归还空闲页，索引文件则压缩重写。
+# PPT 推送记录作为推送历史保留。进程在清理途中退出时，下次启动由 purge_pending 继续。
+import logging
+import threading
+import time
+from typing import List, Optional
+
+from sqlalchemy import select, text
+from sqlalchemy.engine import Engine
+
+import keyword_trends
+import literature_archive
+import models
+import similarity
+
+logger = logging.getLogger(__name__)
+
+PURGE_BATCH_SIZE = 250  # ~4 ms per batch transaction on a laptop SSD
+BATCH_PAUSE = 0.005  # seconds between batches, lets waiting writers in
+VACUUM_PAGES = 1000  # free pages returned to the file system per step
+
+_topics = models.Topic.__table__
+_daily_counts = models.LiteratureDailyCount.__table__
+_update_records = models.UpdateRecord.__table__
+_snapshots = models.AnalysisSnapshot.__table__
+_report_sections = models.ReportSection.__table__
+
+
+def _delete_in_batches(engine: Engine, table, condition, key_column, deleted_keys: Optional[List] = None) -> int:
+    """Delete rows matching condition, at most PURGE_BATCH_SIZE per transaction; returns the row count."""
+    deleted = 0
+    while True:
+        with engine.begin() as connection:
+            keys = connection.execute(
+                select(key_column).where(condition).limit(PURGE_BATCH_SIZE)  # index order, no sort
+            ).scalars().all()
+            if not keys:
+                return deleted
+            connection.execute(table.delete().where(condition).where(key_column.in_(keys)))
+        if deleted_keys is not None:
+            deleted_keys.extend(keys)
+        deleted += len(keys)
+        time.sleep(BATCH_PAUSE)
+
+
+def _unindex(literature_ids: List[int]):
+    # One tombstone write for the whole topic; until then queries skip the missing rows
+    try:
+        similarity.get_index().remove(literature_ids)
+    except Exception:
+        logger.exception("Could not remove deleted literature from the similarity index")
+
+
+def purge_topic(engine: Engine, topic_id: int) -> bool:
+    """Remove everything stored for a topic marked deleted; returns False if it is not marked deleted."""
+    with engine.connect() as connection:
+        deleted_at = connection.execute(select(_topics.c.deleted_at).where(_topics.c.id == topic_id)).scalar()
+    if deleted_at is None:
+        return False
+
+    started = time.perf_counter()
+    with engine.connect() as connection:
+        tiers = literature_archive.tables(connection)
+    literature_ids = []
+    literature = sum(_delete_in_batches(engine, table, table.c.topic_id == topic_id, table.c.id, literature_ids)
+                     for table in tiers)
+    _unindex(literature_ids)
+    # Core deletes bypass the rollup mapper events; the topic's rollup rows go as a whole instead
+    _delete_in_batches(engine, _daily_counts, _daily_counts.c.topic_id == topic_id, _daily_counts.c.publication_day)
+    _delete_in_batches(engine, _snapshots, _snapshots.c.topic_id == topic_id, _snapshots.c.id)
+    _delete_in_batches(engine, _update_records, _update_records.c.topic_id == topic_id, _update_records.c.id)
+    _delete_in_batches(engine, _report_sections, _report_sections.c.topic_id == topic_id,
+                       _report_sections.c.section_key)
+    with engine.begin() as connection:
+        connection.execute(_topics.delete().where(_topics.c.id == topic_id))
+    keyword_trends.invalidate(topic_id)
+    logger.info("Purged topic %s (%s papers) in %.1f s", topic_id, literature, time.perf_counter() - started)
+
+    reclaim_space(engine)
+    return True
+
+
+def purge_pending(engine: Engine):
+    """Finish purges interrupted by a restart."""
+    with engine.connect() as connection:
+        topic_ids = connection.execute(select(_topics.c.id).where(_topics.c.deleted_at.is_not(None))).scalars().all()
+    for topic_id in topic_ids:
+        try:
+            purge_topic(engine, topic_id)
+        except Exception:
+            logger.exception("Purging topic %s failed; it is retried on the next start", topic_id)
+
+
+def start_pending_purges(engine: Engine) -> threading.Thread:
+    thread = threading.Thread(target=purge_pending, args=(engine,), name="topic-purge", daemon=True)
+    thread.start()
+    return thread
+
+
+# --- space reclamation ---
+
+def enable_incremental_vacuum(engine: Engine):
+    """
+    Switch SQLite to auto_vacuum=INCREMENTAL so freed pages can be returned in small steps.
+    Changing the mode rewrites the file once with VACUUM; later calls do nothing.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        # A pooled connection reports the mode it read when it opened the file until it next reads the schema
+        connection.execute(text("SELECT COUNT(*) FROM sqlite_master"))
+        if connection.execute(text("PRAGMA auto_vacuum")).scalar() == 2:
+            return
+        connection.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+        connection.execute(text("VACUUM"))
+
+
+def reclaim_space(engine: Engine) -> int:
+    """Return free database pages to the file system and compact the similarity index; returns pages freed."""
+    freed = 0
+    if engine.dialect.name == "sqlite":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text("SELECT COUNT(*) FROM sqlite_master"))  # see enable_incremental_vacuum
+            if connection.execute(text("PRAGMA auto_vacuum")).scalar() == 2:
+                while True:
+                    free_pages = connection.execute(text("PRAGMA freelist_count")).scalar()
+                    if not free_pages:
+                        break
+                    # Each step is its own short write transaction. executescript runs the pragma to
+                    # completion; a plain execute steps it once and frees a single page
+                    connection.connection.driver_connection.executescript(
+                        f"PRAGMA incremental_vacuum({VACUUM_PAGES});")
+                    freed += min(free_pages, VACUUM_PAGES)
+                    time.sleep(BATCH_PAUSE)
+    try:
+        similarity.get_index().compact()
+    except Exception:
+        logger.exception("Compacting the similarity index failed")
+    return freed
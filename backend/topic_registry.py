@@ -0,0 +1,118 @@
+# 进程内主题注册表
+# 主题数量少且很少修改，启动时一次性加载到内存；crud 中的创建/更新/删除在提交后同步写入 (write-through)。
+# 存在性检查和主题列表直接从内存返回。多个 uvicorn worker 时，其他进程的写入由 cache_bus 发现:
+# topics 表的写入计数变化时重新加载。没有失效总线时 (非 SQLite 数据库) 退回到一致性检查:
+# 距离上次检查超过 COHERENCE_INTERVAL 秒时，用一条聚合查询比较 topics 表的指纹，变化则重新加载，
+# 因此任何 worker 返回过期主题的时间不超过 COHERENCE_INTERVAL。
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import cache_bus
+import models
+import schemas
+
+COHERENCE_INTERVAL = 1.0  # seconds
+
+_topics: Dict[int, schemas.Topic] = {}
+_fingerprint: Optional[Tuple] = None
+_generation: Optional[int] = None
+_checked_at: Optional[float] = None  # None until loaded
+_lock = threading.RLock()
+
+
+def _snapshot(topic: models.Topic) -> schemas.Topic:
+    return schemas.Topic.model_validate(topic)
+
+
+def fingerprint(db: Session) -> Tuple:
+    """Changes on every insert, delete or update of a topic (updates always bump last_updated) or its summary."""
+    return tuple(db.query(func.count(models.Topic.id), func.max(models.Topic.id),
+                          func.max(models.Topic.last_updated), func.sum(models.Topic.literature_count),
+                          func.max(models.Topic.last_update_time), func.max(models.Topic.last_push_time)).one())
+
+
+def load(db: Session, generation: Optional[int] = None):
+    global _topics, _fingerprint, _generation, _checked_at
+    # Read the fingerprint first: a write racing with the load then shows up at the next check
+    current = fingerprint(db)
+    topics = {topic.id: _snapshot(topic) for topic in db.query(models.Topic).filter(models.Topic.deleted_at.is_(None)).order_by(models.Topic.id)}
+    with _lock:
+        _topics, _fingerprint, _generation, _checked_at = topics, current, generation, time.monotonic()
+
+
+def refresh(db: Session):
+    """Load on first use, then reload whenever another process has changed the topics table."""
+    global _checked_at
+    generation = cache_bus.generation("topics")
+    if generation is not None:
+        if _checked_at is None or generation != _generation:
+            load(db, generation)
+        return
+
+    if _checked_at is not None and time.monotonic() - _checked_at < COHERENCE_INTERVAL:
+        return
+    if _checked_at is None or fingerprint(db) != _fingerprint:
+        load(db)
+    else:
+        with _lock:
+            _checked_at = time.monotonic()
+
+
+def invalidate():
+    """Force a reload on the next access."""
+    global _checked_at
+    with _lock:
+        _checked_at = None
+
+
+def put(topic: models.Topic):
+    """Write-through after a committed create or update."""
+    snapshot = _snapshot(topic)
+    with _lock:
+        topics = dict(_topics)
+        topics[snapshot.id] = snapshot
+        _replace(topics)
+
+
+def remove(topic_id: int):
+    """Write-through after a committed delete."""
+    with _lock:
+        topics = dict(_topics)
+        topics.pop(topic_id, None)
+        _replace(topics)
+
+
+def _replace(topics: Dict[int, schemas.Topic]):
+    global _topics
+    # Keep id order, which is the order the database lists topics in
+    _topics = dict(sorted(topics.items()))
+
+
+def get(db: Session, topic_id: int) -> Optional[schemas.Topic]:
+    refresh(db)
+    return _topics.get(topic_id)
+
+
+def exists(db: Session, topic_id: int) -> bool:
+    return get(db, topic_id) is not None
+
+
+def all_exist(db: Session, topic_ids: Sequence[int]) -> bool:
+    refresh(db)
+    topics = _topics
+    return all(topic_id in topics for topic_id in topic_ids)
+
+
+def list_topics(db: Session, skip: int = 0, limit: int = 100) -> List[schemas.Topic]:
+    refresh(db)
+    return list(_topics.values())[skip:skip + limit]
+
+
+def all_topics(db: Session) -> Dict[int, schemas.Topic]:
+    """The live topics by id. The mapping is replaced, never mutated, on every change; do not modify it."""
+    refresh(db)
+    return _topics
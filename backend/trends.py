@@ -0,0 +1,109 @@
+# 文献发表趋势的时间分桶
+# 数据库只维护按天的计数 (literature_daily_counts)，这里把日计数合并成周/月/季/年，并补齐没有文献的空桶
+from datetime import date, timedelta
+from typing import Iterable, List, Optional, Sequence, Tuple
+from sqlalchemy import bindparam, text
+from models import EPOCH
+
+GRANULARITIES = ("day", "week", "month", "quarter", "year")
+DEFAULT_TREND_DAYS = 180
+
+
+def bucket_start(day: date, granularity: str) -> date:
+    """Return the first day of the bucket containing `day`."""
+    if granularity == "day":
+        return day
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    if granularity == "quarter":
+        return date(day.year, 3 * ((day.month - 1) // 3) + 1, 1)
+    if granularity == "year":
+        return date(day.year, 1, 1)
+    raise ValueError(f"Unknown granularity: {granularity}")
+
+
+def next_bucket(start: date, granularity: str) -> date:
+    if granularity == "day":
+        return start + timedelta(days=1)
+    if granularity == "week":
+        return start + timedelta(days=7)
+    if granularity == "year":
+        return date(start.year + 1, 1, 1)
+    months = 1 if granularity == "month" else 3
+    month_index = start.month - 1 + months
+    return date(start.year + month_index // 12, month_index % 12 + 1, 1)
+
+
+def bucket_label(start: date, granularity: str) -> str:
+    if granularity == "day":
+        return start.isoformat()
+    if granularity == "week":
+        iso_year, iso_week, _ = start.isocalendar()
+        return f"{iso_year}-W{iso_week:02d}"
+    if granularity == "month":
+        return start.strftime("%Y-%m")
+    if granularity == "quarter":
+        return f"{start.year}-Q{(start.month - 1) // 3 + 1}"
+    return str(start.year)
+
+
+class BucketLayout:
+    """
+    The gap-filled buckets of one window, plus a lookup from day offset to bucket index.
+    Built once and reused when folding the day counts of many topics over the same window.
+    """
+
+    def __init__(self, start: date, end: date, granularity: str):
+        self.first_day = (start - EPOCH).days
+        self.labels: List[str] = []
+        self.day_to_bucket: List[int] = []
+        cursor = bucket_start(start, granularity)
+        while cursor <= end:
+            following = next_bucket(cursor, granularity)
+            self.labels.append(bucket_label(cursor, granularity))
+            days_in_window = (min(following - timedelta(days=1), end) - max(cursor, start)).days + 1
+            self.day_to_bucket.extend([len(self.labels) - 1] * days_in_window)
+            cursor = following
+
+    def fold(self, day_counts: Iterable[Tuple[int, int]]) -> List[Tuple[str, int]]:
+        counts = [0] * len(self.labels)
+        for day_number, count in day_counts:
+            offset = day_number - self.first_day
+            if 0 <= offset < len(self.day_to_bucket):
+                counts[self.day_to_bucket[offset]] += count
+        return list(zip(self.labels, counts))
+
+
+def bucket_counts(day_counts: Iterable[Tuple[int, int]], start: date, end: date, granularity: str) -> List[Tuple[str, int]]:
+    """
+    Fold (day_number, count) rows into gap-filled buckets covering [start, end].
+    """
+    return BucketLayout(start, end, granularity).fold(day_counts)
+
+
+def rebuild_daily_counts(connection, topic_ids: Optional[Sequence[int]] = None):
+    """
+    Recompute literature_daily_counts from the literature table.
+    Needed after bulk writes that bypass the ORM events, e.g. Core inserts in importers.
+    """
+    where = ""
+    params = {}
+    if topic_ids is not None:
+        where = "WHERE topic_id IN :topic_ids"
+        params = {"topic_ids": list(topic_ids)}
+
+    def run(sql):
+        statement = text(sql)
+        if params:
+            statement = statement.bindparams(bindparam("topic_ids", expanding=True))
+        connection.execute(statement, params)
+
+    run(f"DELETE FROM literature_daily_counts {where}")
+    run(f"""
+        INSERT INTO literature_daily_counts (topic_id, publication_day, count)
+        SELECT topic_id, publication_day, COUNT(*) FROM literature
+        {where + " AND" if where else "WHERE"} topic_id IS NOT NULL AND publication_day IS NOT NULL
+        GROUP BY topic_id, publication_day
+    """)
@@ -0,0 +1,141 @@
+# 增量更新周期
+# 每个主题记录上一次成功周期的高水位 (最后纳入报告的文献 id 与最新发表日期)。
+# 一个周期只读取水位之后的新文献，只重建有新文献的章节，再用缓存的章节拼出完整 PPT；
+# 新的水位、章节、UpdateRecord 和分析快照 (snapshots.py) 在同一个事务中提交，失败时水位保持不变。
+import logging
+import os
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+import literature_archive
+import models
+import ppt_files
+import ppt_renderer
+import snapshots
+import topic_registry
+
+logger = logging.getLogger(__name__)
+
+MAX_ITEMS_PER_SECTION = 8
+
+# (topic, section_key, previous markdown or None, new papers of that section) -> section markdown
+SectionBuilder = Callable[[models.Topic, str, Optional[str], List[models.Literature]], str]
+
+
+def section_key(literature: models.Literature) -> str:
+    return literature.literature_type or "Other"
+
+
+def _paper_line(literature: models.Literature) -> str:
+    published = literature.publication_date.strftime("%Y-%m-%d") if literature.publication_date else ""
+    return f"- {literature.title}（{literature.journal_name or ''}, {published}）"
+
+
+def default_section_builder(topic, key, previous, papers):
+    """Newest papers first, keeping at most MAX_ITEMS_PER_SECTION bullets from the previous version."""
+    previous_lines = [line for line in (previous or "").splitlines() if line.startswith("- ")]
+    new_lines = [_paper_line(p) for p in sorted(papers, key=lambda p: p.publication_date or datetime.min, reverse=True)]
+    lines = (new_lines + previous_lines)[:MAX_ITEMS_PER_SECTION]
+    return "\n".join([f"## {key}"] + lines)
+
+
+def pending_literature(db: Session, topic: models.Topic) -> List[models.Literature]:
+    """Literature attached after the topic's watermark, in id order."""
+    watermark = topic.last_reported_literature_id or 0
+    literature = literature_archive.literature_entity(db)  # old papers can be archived before a cycle sees them
+    return (
+        db.query(literature)
+        .filter(literature.topic_id == topic.id)
+        .filter(literature.id > watermark)
+        .order_by(literature.id)
+        .all()
+    )
+
+
+def _deck_markdown(topic: models.Topic, sections: Dict[str, str], new_count: int, now: datetime) -> str:
+    title = f"# {topic.name}\n更新于 {now:%Y-%m-%d}，新增文献 {new_count} 篇"
+    return "\n\n---\n\n".join([title] + [sections[key] for key in sorted(sections)])
+
+
+def run_update_cycle(db: Session, topic_id: int, section_builder: SectionBuilder = default_section_builder,
+                     now: Optional[datetime] = None) -> Optional[models.UpdateRecord]:
+    """
+    Run one incremental cycle for a topic and return its UpdateRecord (None if the topic does not exist).
+    A cycle without new literature records a success that reuses the previous deck.
+    """
+    now = now or datetime.utcnow()
+    topic = db.query(models.Topic).filter(models.Topic.id == topic_id, models.Topic.deleted_at.is_(None)).first()
+    if topic is None:
+        return None
+
+    from_id = topic.last_reported_literature_id or 0
+    new_papers = pending_literature(db, topic)
+    new_count = len(new_papers)
+    record = models.UpdateRecord(topic_id=topic.id, timestamp=now, from_literature_id=from_id,
+                                 to_literature_id=from_id, new_literature_count=new_count)
+    try:
+        if not new_papers:
+            previous = (
+                db.query(models.UpdateRecord)
+                .filter(models.UpdateRecord.topic_id == topic.id, models.UpdateRecord.status == "success")
+                .order_by(models.UpdateRecord.timestamp.desc())
+                .first()
+            )
+            record.status = "success"
+            record.ppt_preview_link = previous.ppt_preview_link if previous else None
+        else:
+            grouped: "OrderedDict[str, List[models.Literature]]" = OrderedDict()
+            for paper in new_papers:
+                grouped.setdefault(section_key(paper), []).append(paper)
+
+            stored = {
+                section.section_key: section
+                for section in db.query(models.ReportSection).filter(models.ReportSection.topic_id == topic.id)
+            }
+            for key, papers in grouped.items():
+                section = stored.get(key)
+                markdown = section_builder(topic, key, section.markdown if section else None, papers)
+                if section is None:
+                    section = stored[key] = models.ReportSection(topic_id=topic.id, section_key=key, markdown=markdown,
+                                                                 literature_count=0)
+                    db.add(section)
+                section.markdown = markdown
+                section.literature_count += len(papers)
+                section.updated_at = now
+
+            # Named after the last included literature id, so every deck state gets its own file
+            ppt_filename = f"{topic.name.replace(os.sep, '_')}_{new_papers[-1].id}.pptx"
+            ppt_path = os.path.join(ppt_files.PPT_DIRECTORY, ppt_filename)
+            deck = _deck_markdown(topic, {key: s.markdown for key, s in stored.items()}, new_count, now)
+            ppt_renderer.render_deck(deck, ppt_path, topic.template or ppt_renderer.DEFAULT_TEMPLATE)
+            ppt_files.build_preview(ppt_path)
+
+            # Advance the watermarks; committed together with the record and sections below
+            latest_date = max((p.publication_date for p in new_papers if p.publication_date), default=None)
+            topic.last_reported_literature_id = new_papers[-1].id
+            if latest_date and (topic.last_reported_publication_date is None
+                                or latest_date > topic.last_reported_publication_date):
+                topic.last_reported_publication_date = latest_date
+            topic.last_updated = now
+            record.status = "success"
+            record.to_literature_id = new_papers[-1].id
+            record.ppt_preview_link = f"/PPT/{ppt_filename}"
+
+        db.add(record)
+        db.flush()
+        snapshots.capture(db, record)
+        db.commit()
+        topic_registry.put(topic)
+    except Exception:
+        logger.exception("Update cycle failed for topic %s", topic_id)
+        db.rollback()
+        record = models.UpdateRecord(topic_id=topic_id, timestamp=now, status="failed",
+                                     from_literature_id=from_id, to_literature_id=from_id, new_literature_count=new_count)
+        db.add(record)
+        db.commit()
+
+    db.refresh(record)
+    return record
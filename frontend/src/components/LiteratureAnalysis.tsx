@@ -18,9 +18,11 @@ interface Literature {
   publication_date: string;
   journal_name: string;
   literature_type: string;
-  summary: string;
 }
 
+// Collapsed rows need only these; the summary is loaded from /literature/{id} when a row is expanded
+const LIST_FIELDS = 'title,authors,publication_date,journal_name,literature_type';
+
 interface LiteratureAnalysisData {
   stats: {
     total_count: number;
@@ -40,8 +42,23 @@ const LiteratureAnalysis = () => {
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [expandedIds, setExpandedIds] = useState<Set<number>>(new Set());
+  const [summaries, setSummaries] = useState<Record<number, string>>({});
+
+  const loadSummary = async (id: number) => {
+    try {
+      const response = await fetch(`${API_URL}/literature/${id}`);
+      if (!response.ok) throw new Error(`Failed to fetch literature ${id}`);
+      const data: { summary: string } = await response.json();
+      setSummaries(prev => ({ ...prev, [id]: data.summary }));
+    } catch (err) {
+      setSummaries(prev => ({ ...prev, [id]: err instanceof Error ? err.message : 'Could not load summary' }));
+    }
+  };
 
   const toggleSummary = (id: number) => {
+    if (!expandedIds.has(id) && !(id in summaries)) {
+      loadSummary(id);
+    }
     setExpandedIds(prev => {
       const newSet = new Set(prev);
       if (newSet.has(id)) {
@@ -79,7 +96,7 @@ const LiteratureAnalysis = () => {
       setIsLoading(true);
       setError(null);
       try {
-        const response = await fetch(`${API_URL}/topics/${selectedTopicId}/literature-analysis`);
+        const response = await fetch(`${API_URL}/topics/${selectedTopicId}/literature-analysis?fields=${LIST_FIELDS}`);
         if (!response.ok) throw new Error(`Failed to fetch analysis for topic ${selectedTopicId}`);
         const data: LiteratureAnalysisData = await response.json();
         setAnalysisData(data);
@@ -178,7 +195,7 @@ const LiteratureAnalysis = () => {
                             <FileText className="h-4 w-4 mr-2 flex-shrink-0" />
                             <span>中英文介绍</span>
                           </div>
-                          <p className="text-sm text-gray-700 pl-6">{paper.summary}</p>
+                          <p className="text-sm text-gray-700 pl-6">{summaries[paper.id] ?? '加载中…'}</p>
                         </div>
                       )}
                       <div className="flex items-center space-x-4 text-sm text-gray-500">
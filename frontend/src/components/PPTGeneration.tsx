@@ -24,6 +24,15 @@ interface PPTPushRecord {
   diff_summary?: string;
 }
 
+interface PPTPreview {
+  filename: string;
+  content_hash: string;
+  size_bytes: number;
+  slide_count: number;
+  download_url: string;
+  slides: { index: number; title: string; lines: string[] }[];
+}
+
 const PPTGeneration = () => {
   const [records, setRecords] = useState<PPTPushRecord[]>([]);
   const [topics, setTopics] = useState<string[]>([]);
@@ -31,6 +40,8 @@ const PPTGeneration = () => {
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const [selectedRecord, setSelectedRecord] = useState<PPTPushRecord | null>(null);
+  const [preview, setPreview] = useState<PPTPreview | null>(null);
+  const [previewError, setPreviewError] = useState<string | null>(null);
 
   useEffect(() => {
     const fetchHistory = async () => {
@@ -57,6 +68,20 @@ const PPTGeneration = () => {
     fetchHistory();
   }, []);
 
+  useEffect(() => {
+    if (!selectedRecord) return;
+    setPreview(null);
+    setPreviewError(null);
+    // 预览只请求文本大纲，不下载整个 PPT 文件
+    fetch(`${API_URL}/ppt/${encodeURIComponent(selectedRecord.ppt_filename)}/preview`)
+      .then(response => {
+        if (!response.ok) throw new Error('Failed to load preview.');
+        return response.json();
+      })
+      .then(setPreview)
+      .catch(err => setPreviewError(err instanceof Error ? err.message : 'An unknown error occurred'));
+  }, [selectedRecord]);
+
   const getStatusIndicator = (status: PPTPushRecord['status']) => {
     switch (status) {
       case 'success':
@@ -78,15 +103,27 @@ const PPTGeneration = () => {
             <h3 className="text-lg font-bold text-gray-900">预览: {selectedRecord.ppt_filename}</h3>
             <button onClick={() => setSelectedRecord(null)} className="p-2 rounded-full hover:bg-gray-200"><X className="h-5 w-5" /></button>
           </div>
-          <div className="p-6 flex-grow flex items-center justify-center bg-gray-100">
-            <div className="text-center">
-              <Presentation className="h-24 w-24 text-gray-400 mx-auto" />
-              <p className="mt-4 text-gray-600">PPT 预览区</p>
-              <p className="text-sm text-gray-500">实际应用中可嵌入PPT预览插件</p>
-            </div>
+          <div className="p-6 flex-grow overflow-y-auto bg-gray-100">
+            {preview ? (
+              <div className="space-y-4">
+                {preview.slides.map(slide => (
+                  <div key={slide.index} className="bg-white rounded-lg p-4 shadow-sm">
+                    <h4 className="font-semibold text-gray-900">{slide.index}. {slide.title}</h4>
+                    <ul className="mt-2 space-y-1 text-sm text-gray-600 list-disc list-inside">
+                      {slide.lines.map((line, i) => <li key={i}>{line}</li>)}
+                    </ul>
+                  </div>
+                ))}
+              </div>
+            ) : (
+              <div className="text-center py-12">
+                <Presentation className="h-24 w-24 text-gray-400 mx-auto" />
+                <p className="mt-4 text-gray-600">{previewError ?? '正在加载预览...'}</p>
+              </div>
+            )}
           </div>
           <div className="p-4 bg-gray-50 border-t flex justify-end">
-            <a href={`${API_URL}/PPT/${selectedRecord.ppt_filename}`} download={selectedRecord.ppt_filename} className="bg-blue-600 hover:bg-blue-700 text-white px-4 py-2 rounded-lg flex items-center space-x-2">
+            <a href={preview ? `${API_URL}${preview.download_url}` : `${API_URL}/PPT/${selectedRecord.ppt_filename}`} download={selectedRecord.ppt_filename} className="bg-blue-600 hover:bg-blue-700 text-white px-4 py-2 rounded-lg flex items-center space-x-2">
               <Download className="h-4 w-4" />
               <span>下载文件</span>
             </a>
@@ -29,6 +29,11 @@ interface Topic {
   detection_time: string;
   notification_channels: string[];
   template: string;
+  literature_count: number;
+  last_update_status: 'success' | 'failed' | null;
+  last_update_time: string | null;
+  latest_ppt_link: string | null;
+  last_push_time: string | null;
 }
 
 interface TopicUpdate {
@@ -178,6 +183,18 @@ const TopicSettings = () => {
               <p className="text-xs text-gray-400 mt-1">
                 上次更新: {new Date(topic.last_updated).toLocaleString()}
               </p>
+              <p className="text-xs text-gray-400 mt-1 flex items-center space-x-3">
+                <span>文献: {topic.literature_count}</span>
+                {topic.last_update_time && (
+                  <span className={topic.last_update_status === 'success' ? 'text-green-600' : 'text-red-600'}>
+                    最近一次周期: {new Date(topic.last_update_time).toLocaleString()} ({topic.last_update_status})
+                  </span>
+                )}
+                {topic.last_push_time && <span>最近推送: {new Date(topic.last_push_time).toLocaleString()}</span>}
+                {topic.latest_ppt_link && (
+                  <a href={`${API_URL}${topic.latest_ppt_link}`} className="text-blue-600 hover:underline">最新 PPT</a>
+                )}
+              </p>
             </div>
             <div className="flex items-center space-x-2 ml-4">
               <button onClick={() => handleShowHistory(topic.id)} className="p-2 hover:bg-gray-200 rounded-full" title="更新历史"><History className="h-4 w-4 text-gray-600" /></button>